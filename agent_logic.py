@@ -1,75 +1,111 @@
 import os
+import json
 import asyncio
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from data_models import PresentationStructure
-
-# MCP Client Imports
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.sse import sse_client
-
-load_dotenv()
-api_key = os.environ.get("GOOGLE_API_KEY")
-mcp_server_url = os.environ.get("MCP_SERVER_URL", "http://mcp-server:8000/sse")
-
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash", 
-    temperature=0.2,
-    google_api_key=api_key
+from pydantic import ValidationError
+from data_models import (
+    PresentationStructure, PresentationOutline, CustomerSlide, Source, SlideText, SlideTextBatch,
 )
+from json_stream import IncrementalArrayParser
+from prompt_builder import PromptBuilder, DEFAULT_MAX_PROMPT_TOKENS
+from llm_usage import ainvoke_llm, stream_llm, usage_job, usage_job_iter
+from llm_clients import get_llm, load_env
+from doc_index import (
+    DocumentIndex, document_hash, chunk_document, load_chunks, save_chunks, render_chunks,
+    load_summary, save_summary,
+)
+from singleflight import SingleFlight
+
+load_env()
+
+# MCP Client (Streamable HTTP wenn verfügbar, sonst SSE)
+from mcp_client import open_tool_session
+
+# "structured" liefert Abschnitte mit Seitenspannen ohne Kopf-/Fusszeilen und
+# Literaturliste (deutlich kürzerer Prompt), "raw" den ungefilterten PDF-Text
+PDF_EXTRACTION_MODE = os.environ.get("PDF_EXTRACTION_MODE", "structured")
+
+# Token-Budget für den Dokumentinhalt im Planungs-Prompt. Passt alles hinein,
+# wird in einem Schritt geplant; sonst Gliederung + Retrieval pro Folie.
+PLANNING_TOKEN_BUDGET = int(os.environ.get("PLANNING_TOKEN_BUDGET", 60000))
+OUTLINE_BUDGET_SHARE = 0.25
+SOURCES_PER_SLIDE = 3
+
+# Mehrsprachen-Modus: Folien pro Übersetzungsaufruf und gleichzeitige Aufrufe
+TRANSLATION_BATCH_SLIDES = int(os.environ.get("TRANSLATION_BATCH_SLIDES", 8))
+TRANSLATION_WORKERS = int(os.environ.get("TRANSLATION_WORKERS", 4))
+
+# Laufende Zusammenfassungen pro Dokument-Hash (über Sessions und Event-Loops hinweg)
+summary_flight = SingleFlight("summaries")
 
-async def fetch_pdf_content_via_mcp(filenames):
+async def fetch_pdf_content_via_mcp(filenames, mode=PDF_EXTRACTION_MODE):
     """
     Verbindet sich mit dem MCP Server und ruft das Tool 'read_pdf_file' auf.
     """
     combined_text = ""
     
-    # Verbindung zum MCP Server aufbauen (SSE)
-    async with sse_client(mcp_server_url) as streams:
-        async with ClientSession(streams[0], streams[1]) as session:
-            # Initialisierung
-            await session.initialize()
-            
-            # (Optional) Wir könnten fragen: Welche Tools hast du?
-            # tools = await session.list_tools()
-            
-            for fname in filenames:
-                filename_only = os.path.basename(fname)
-                print(f"--> MCP Client: Frage Server nach {filename_only}...")
-                
-                try:
-                    # HIER passiert der Zugriff: Wir rufen das Tool auf dem Server
-                    result = await session.call_tool(
-                        "read_pdf_file", 
-                        arguments={"filename": filename_only}
-                    )
-                    
-                    # Das Ergebnis ist eine Liste von Content-Blöcken
-                    if result.content:
-                        combined_text += result.content[0].text + "\n"
-                        
-                except Exception as e:
-                    combined_text += f"\nFehler bei MCP Abruf für {fname}: {e}\n"
+    # Verbindung zum MCP Server aufbauen (HTTP oder SSE)
+    async with open_tool_session() as session:
+        for fname in filenames:
+            filename_only = os.path.basename(fname)
+            print(f"--> MCP Client: Frage Server nach {filename_only}...")
+
+            try:
+                # HIER passiert der Zugriff: Wir rufen das Tool auf dem Server
+                text = await session.call_tool(
+                    "read_pdf_file",
+                    arguments={"filename": filename_only, "mode": mode}
+                )
+
+                if text:
+                    combined_text += text + "\n"
+
+            except Exception as e:
+                combined_text += f"\nFehler bei MCP Abruf für {fname}: {e}\n"
                     
     return combined_text
 
-def analyze_pdf_and_plan_ppt(pdf_paths_list, num_slides, language):
+async def fetch_document_chunks(pdf_paths_list):
     """
-    Synchrone Wrapper-Funktion für Streamlit.
+    Liefert die Retrieval-Chunks aller Dokumente. Pro Dokument-Hash wird nur
+    einmal über MCP (read_pdf_file, mode="json") extrahiert und zerlegt.
     """
-    
-    # 1. Inhalt via MCP holen (Async Code in Sync ausführen)
-    print("--> Starte MCP Client Verbindung...")
-    try:
-        combined_text = asyncio.run(fetch_pdf_content_via_mcp(pdf_paths_list))
-    except Exception as e:
-        print(f"MCP Critical Error: {e}")
-        combined_text = "Kritischer Fehler: Konnte MCP Server nicht erreichen."
+    all_chunks = []
+    missing = []
+    for path in pdf_paths_list:
+        doc_hash = document_hash(path)
+        chunks = load_chunks(doc_hash)
+        if chunks is None:
+            missing.append((path, doc_hash))
+        else:
+            all_chunks += [dict(c, doc=os.path.basename(path)) for c in chunks]
 
-    # 2. Gemini beauftragen (wie gehabt)
-    structured_llm = llm.with_structured_output(PresentationStructure)
-    
-    prompt = f"""
+    if missing:
+        async with open_tool_session() as session:
+            for path, doc_hash in missing:
+                filename_only = os.path.basename(path)
+                print(f"--> Index: Zerlege {filename_only}...")
+                text = await session.call_tool(
+                    "read_pdf_file",
+                    arguments={"filename": filename_only, "mode": "json"}
+                )
+                if not text.startswith("{"):
+                    raise RuntimeError(text or f"Keine Antwort für {filename_only}")
+                chunks = chunk_document(json.loads(text))
+                save_chunks(doc_hash, chunks)
+                all_chunks += [dict(c, doc=filename_only) for c in chunks]
+
+    return all_chunks
+
+def build_document_index(pdf_paths_list):
+    """Synchroner Wrapper (Streamlit): Index direkt nach dem Upload aufbauen."""
+    return asyncio.run(abuild_document_index(pdf_paths_list))
+
+async def abuild_document_index(pdf_paths_list):
+    return DocumentIndex(await fetch_document_chunks(pdf_paths_list))
+
+def _plan_prompt(num_slides, language, content, extra_rules="", budget=DEFAULT_MAX_PROMPT_TOKENS):
+    builder = PromptBuilder(budget)
+    builder.add("instructions", f"""
     Du bist ein Experte für professionelle Präsentationen.
     Erstelle eine Struktur für {num_slides} Folien.
     
@@ -78,10 +114,305 @@ def analyze_pdf_and_plan_ppt(pdf_paths_list, num_slides, language):
     REGELN:
     1. Fasse dich extrem kurz (Max 3-4 Bullets, max 10 Wörter).
     2. 'unsplashSearchTerms': 3 englische Begriffe.
-    
+    {extra_rules}
     INHALT VOM MCP SERVER:
-    {combined_text[:1000000]}
+    """, required=True)
+    builder.add("content", content, truncatable=True)
+    return builder.build()
+
+async def _retrieved_context(index, num_slides, language):
     """
-    
+    Zweistufige Planung für grosse Dokumentmengen: erst eine Gliederung aus der
+    Abschnittsübersicht, dann pro Folie die relevantesten Chunks im Budget.
+    """
+    outline_budget = int(PLANNING_TOKEN_BUDGET * OUTLINE_BUDGET_SHARE)
+    outline_prompt = f"""
+    Du planst eine Präsentation mit {num_slides} Folien (Sprache: {language}).
+    Unten steht die Gliederung der Quelldokumente (Abschnitte mit Seiten und Textanfang).
+    Lege für jede Folie einen Arbeitstitel und Suchbegriffe fest, mit denen die
+    passenden Textstellen in den Dokumenten gefunden werden.
+
+    GLIEDERUNG:
+    {index.outline(outline_budget)}
+    """
+    print("--> Planung Stufe 1: Gliederung...")
+    outline = await ainvoke_llm(get_llm("planner"), outline_prompt, call="plan_outline", schema=PresentationOutline)
+
+    per_slide_budget = (PLANNING_TOKEN_BUDGET - outline_budget) // max(1, len(outline.slides))
+    blocks = []
+    for i, slide in enumerate(outline.slides, start=1):
+        chunks = index.search(f"{slide.title} {slide.searchQuery}", k=8, token_budget=per_slide_budget)
+        blocks.append(f"=== FOLIE {i}: {slide.title} ===\n{render_chunks(chunks)}")
+    print(f"--> Planung Stufe 2: {len(blocks)} Folien mit je max. {per_slide_budget} Tokens Kontext")
+    return "\n\n".join(blocks)
+
+def attach_slide_sources(slide, index):
+    """Quellenangaben aus den Chunks, die am besten zum Folieninhalt passen (echte Seitenzahlen)."""
+    query = " ".join([slide.title] + [b.bullet for b in slide.bullets])
+    sources = []
+    for chunk in index.search(query, k=SOURCES_PER_SLIDE):
+        source = Source(documentId=chunk["doc"], pageNumber=str(chunk["page"]))
+        if source not in sources:
+            sources.append(source)
+    if sources:
+        slide.sources = sources
+    return slide
+
+def attach_sources(plan, index):
+    for slide in plan.slides:
+        attach_slide_sources(slide, index)
+    return plan
+
+async def _prepare_plan_prompt(pdf_paths_list, num_slides, language, extra_rules=""):
+    """
+    Baut den Planungs-Prompt - bevorzugt über den Retrieval-Index.
+
+    Returns:
+        (prompt, index) - index ist None, wenn auf den Volltext ausgewichen wurde
+    """
+    # 1. Inhalt via MCP holen - bevorzugt über den Retrieval-Index
+    print("--> Starte MCP Client Verbindung...")
+    index = None
+    try:
+        index = await abuild_document_index(pdf_paths_list)
+    except Exception as e:
+        print(f"  ⚠ Retrieval-Index nicht verfügbar ({e}) - verwende Volltext")
+
+    if index is not None and index.chunks:
+        if index.total_tokens <= PLANNING_TOKEN_BUDGET:
+            return _plan_prompt(num_slides, language, render_chunks(index.chunks), extra_rules), index
+        rules = "3. Halte dich an die vorgegebene Folienreihenfolge und nutze pro Folie ihren Kontext.\n" + extra_rules
+        context = await _retrieved_context(index, num_slides, language)
+        return _plan_prompt(num_slides, language, context, rules), index
+
+    # 2. Fallback: gesamter Text in einem Prompt (wie bisher)
+    try:
+        combined_text = await fetch_pdf_content_via_mcp(pdf_paths_list)
+    except Exception as e:
+        print(f"MCP Critical Error: {e}")
+        combined_text = "Kritischer Fehler: Konnte MCP Server nicht erreichen."
+
+    return _plan_prompt(num_slides, language, combined_text, extra_rules), None
+
+@usage_job("plan")
+def analyze_pdf_and_plan_ppt(pdf_paths_list, num_slides, language):
+    """
+    Synchrone Wrapper-Funktion für Streamlit.
+    """
+    return asyncio.run(aanalyze_pdf_and_plan_ppt(pdf_paths_list, num_slides, language))
+
+async def aanalyze_pdf_and_plan_ppt(pdf_paths_list, num_slides, language):
+    """Asynchroner Kern von analyze_pdf_and_plan_ppt."""
+    prompt, index = await _prepare_plan_prompt(pdf_paths_list, num_slides, language)
+
     print(f"--> Sende Anfrage an Gemini...")
-    return structured_llm.invoke(prompt)
\ No newline at end of file
+    plan = await ainvoke_llm(get_llm("planner"), prompt, call="plan", schema=PresentationStructure)
+    return attach_sources(plan, index) if index is not None else plan
+
+def stream_plan_slides(pdf_paths_list, num_slides, language):
+    """
+    Streaming-Variante von analyze_pdf_and_plan_ppt: liefert jede CustomerSlide,
+    sobald sie im gestreamten JSON vollständig ist. So kann Agent 2 Layout, Stil
+    und Bild der ersten Folien bearbeiten, während der Rest noch generiert wird.
+
+    Alle Aufrufe des Generators (Prompt, Stream, Fallback) zählen zum Job "plan",
+    auch wenn er innerhalb des "build"-Jobs von generate_ppt_from_stream läuft.
+    """
+    return usage_job_iter("plan", _stream_plan_slides(pdf_paths_list, num_slides, language))
+
+def _stream_plan_slides(pdf_paths_list, num_slides, language):
+    schema = json.dumps(PresentationStructure.model_json_schema(), ensure_ascii=False)
+    json_rules = (
+        "FORMAT: Antworte NUR mit JSON nach diesem Schema (kein Markdown, keine Erklärung), "
+        f"Folien in Präsentationsreihenfolge:\n    {schema}\n"
+    )
+    prompt, index = asyncio.run(_prepare_plan_prompt(pdf_paths_list, num_slides, language,
+                                                     extra_rules=json_rules))
+
+    print(f"--> Sende Streaming-Anfrage an Gemini...")
+    parser = IncrementalArrayParser("slides")
+    streamed = 0
+    for text in stream_llm(get_llm("planner"), prompt, call="plan_stream"):
+        for obj in parser.feed(text):
+            try:
+                slide = CustomerSlide.model_validate(obj)
+            except ValidationError as e:
+                print(f"  ⚠ Ungültige Folie im Stream übersprungen: {e}")
+                continue
+            streamed += 1
+            print(f"--> Folie {streamed} aus dem Stream: {slide.title}")
+            yield attach_slide_sources(slide, index) if index is not None else slide
+
+    if streamed == 0:
+        # Modell hat kein verwertbares JSON gestreamt - einmal klassisch nachplanen
+        print("  ⚠ Kein Folien-JSON im Stream erkannt - Fallback auf Structured Output")
+        plan = asyncio.run(ainvoke_llm(get_llm("planner"), prompt, call="plan", schema=PresentationStructure))
+        if index is not None:
+            attach_sources(plan, index)
+        yield from plan.slides
+
+# -----------------------------------------------------------------------------
+# Inkrementelle Planung
+# -----------------------------------------------------------------------------
+def document_fingerprints(pdf_paths_list):
+    """{dokument_hash: dateiname} - damit erkennt die nächste Planung geänderte Dokumente."""
+    return {document_hash(path): os.path.basename(path) for path in pdf_paths_list}
+
+async def summarize_document(doc_hash, filename, index):
+    """Stichpunkt-Zusammenfassung eines Dokuments mit Seitenangaben (pro Hash gecacht)."""
+    summary = load_summary(doc_hash)
+    if summary:
+        return summary
+    # Dasselbe Dokument in mehreren Sessions gleichzeitig: nur einmal zusammenfassen
+    return await summary_flight.ado(doc_hash, lambda: _summarize(doc_hash, filename, index))
+
+async def _summarize(doc_hash, filename, index):
+    chunks = [chunk for chunk in index.chunks if chunk["doc"] == filename]
+
+    print(f"--> Fasse {filename} zusammen...")
+    builder = PromptBuilder(PLANNING_TOKEN_BUDGET)
+    builder.add("instructions", f"""
+    Fasse das folgende Dokument in höchstens 15 Stichpunkten zusammen.
+    Jeder Stichpunkt endet mit der Seitenangabe in der Form [S. x].
+    Behalte die Sprache des Dokuments bei.
+
+    DOKUMENT {filename}:
+    """, required=True)
+    builder.add("document", render_chunks(chunks), truncatable=True)
+    summary = (await ainvoke_llm(get_llm("planner"), builder.build(), call="summarize")).content
+    if isinstance(summary, list):
+        summary = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in summary)
+    save_summary(doc_hash, summary)
+    return summary
+
+@usage_job("replan")
+def update_plan_incrementally(previous_plan, previous_docs, pdf_paths_list, num_slides, language,
+                              previous_language=None):
+    """Synchroner Wrapper um aupdate_plan_incrementally (Streamlit)."""
+    return asyncio.run(aupdate_plan_incrementally(previous_plan, previous_docs, pdf_paths_list, num_slides,
+                                                  language, previous_language))
+
+async def aupdate_plan_incrementally(previous_plan, previous_docs, pdf_paths_list, num_slides, language,
+                                     previous_language=None):
+    """
+    Überarbeitet einen bestehenden Plan, statt neu zu planen: nur hinzugekommene
+    Dokumente werden (als Zusammenfassung) gelesen, entfernte nur benannt.
+
+    Args:
+        previous_plan: PresentationStructure der letzten Planung
+        previous_docs: document_fingerprints() der letzten Planung
+        previous_language: Sprache des letzten Plans (None = unverändert)
+    Returns:
+        (PresentationStructure, aktuelle document_fingerprints)
+    """
+    current_docs = document_fingerprints(pdf_paths_list)
+    added = {h: name for h, name in current_docs.items() if h not in previous_docs}
+    removed = {h: name for h, name in previous_docs.items() if h not in current_docs}
+
+    if previous_plan is None:
+        return await aanalyze_pdf_and_plan_ppt(pdf_paths_list, num_slides, language), current_docs
+    unchanged_settings = len(previous_plan.slides) == num_slides and previous_language in (None, language)
+    if not added and not removed and unchanged_settings:
+        print("--> Dokumente unverändert - bestehender Plan wird wiederverwendet")
+        return previous_plan, current_docs
+
+    print(f"--> Inkrementelle Planung: +{len(added)} / -{len(removed)} Dokument(e)")
+    index = await abuild_document_index(pdf_paths_list)
+
+    # Neue Dokumente gleichzeitig zusammenfassen (ein Task pro Dokument)
+    added_summaries = await asyncio.gather(*(summarize_document(h, name, index) for h, name in added.items()))
+    summaries = "\n\n".join(
+        f"=== {name} ===\n{summary}" for name, summary in zip(added.values(), added_summaries)
+    ) or "(keine)"
+    removed_names = ", ".join(removed.values()) or "(keine)"
+
+    builder = PromptBuilder(PLANNING_TOKEN_BUDGET)
+    builder.add("instructions", f"""
+    Du bist ein Experte für professionelle Präsentationen.
+    Überarbeite den bestehenden Präsentationsplan, statt ihn neu zu erstellen.
+
+    SPRACHE: {language}
+    ZIEL: {num_slides} Folien
+
+    REGELN:
+    1. Behalte Folien, die weiterhin passen, möglichst unverändert bei.
+    2. Arbeite die Inhalte der neuen Dokumente ein (ergänzen, zusammenführen oder ersetzen).
+    3. Entferne oder überarbeite Folien, die nur auf entfernten Dokumenten beruhen.
+    4. Fasse dich extrem kurz (Max 3-4 Bullets, max 10 Wörter).
+    5. 'unsplashSearchTerms': 3 englische Begriffe.
+
+    BESTEHENDER PLAN (JSON):
+    {previous_plan.model_dump_json()}
+    """, required=True)
+    builder.add("summaries", f"""
+    NEUE DOKUMENTE (Zusammenfassungen):
+    {summaries}
+    """, truncatable=True)
+    builder.add("removed", f"""
+    ENTFERNTE DOKUMENTE:
+    {removed_names}
+    """, priority=1, required=True)
+    print(f"--> Sende Überarbeitung an Gemini...")
+    plan = await ainvoke_llm(get_llm("planner"), builder.build(), call="replan", schema=PresentationStructure)
+    return attach_sources(plan, index), current_docs
+
+# -----------------------------------------------------------------------------
+# Mehrsprachen-Modus: einmal planen, Texte übersetzen
+# -----------------------------------------------------------------------------
+async def _translate_batch(slides, source_language, target_language):
+    """Übersetzt Titel und Bullets einer Gruppe von Folien in einem LLM-Aufruf."""
+    texts = [SlideText(title=s.title, bullets=s.bullets) for s in slides]
+    prompt = f"""
+    Übersetze die folgenden Präsentationsfolien von {source_language} nach {target_language}.
+
+    REGELN:
+    1. Gleiche Anzahl Folien, gleiche Reihenfolge, gleiche Anzahl Bullets und Unterpunkte.
+    2. Kurz und präsentationstauglich bleiben, nichts hinzufügen oder weglassen.
+    3. Eigennamen, Zahlen und Fachbegriffe ohne gängige Übersetzung unverändert lassen.
+
+    FOLIEN (JSON):
+    {SlideTextBatch(slides=texts).model_dump_json()}
+    """
+    result = await ainvoke_llm(get_llm("planner"), prompt, call="translate", schema=SlideTextBatch)
+    if len(result.slides) != len(slides):
+        print(f"  ⚠ Übersetzung nach {target_language} unvollständig - Originaltext bleibt für {len(slides)} Folien")
+        return slides
+    # Quellen, Bild-Suchbegriffe und Bildeinstellungen sind sprachunabhängig
+    return [s.model_copy(deep=True, update={"title": t.title, "bullets": t.bullets})
+            for s, t in zip(slides, result.slides)]
+
+@usage_job("translate")
+def translate_plan(plan, source_language, target_languages):
+    """
+    Übersetzt einen fertigen Plan in weitere Sprachen. Alle Sprachen und Folien-
+    gruppen (TRANSLATION_BATCH_SLIDES) laufen gleichzeitig als eigene LLM-Aufrufe
+    in einem Event-Loop (höchstens TRANSLATION_WORKERS auf einmal).
+
+    Returns:
+        dict {Sprache: PresentationStructure}
+    """
+    return asyncio.run(atranslate_plan(plan, source_language, target_languages))
+
+
+async def atranslate_plan(plan, source_language, target_languages):
+    """Asynchroner Kern von translate_plan."""
+    batches = [plan.slides[i:i + TRANSLATION_BATCH_SLIDES]
+               for i in range(0, len(plan.slides), TRANSLATION_BATCH_SLIDES)]
+    targets = [language for language in target_languages if language != source_language]
+    if not targets:
+        return {}
+
+    print(f"--> Übersetze Plan nach {', '.join(targets)} ({len(batches)} Gruppe(n) pro Sprache)...")
+    limit = asyncio.Semaphore(TRANSLATION_WORKERS)
+
+    async def translate(batch, language):
+        async with limit:
+            return await _translate_batch(batch, source_language, language)
+
+    results = await asyncio.gather(*(
+        asyncio.gather(*(translate(batch, language) for batch in batches)) for language in targets
+    ))
+    return {
+        language: PresentationStructure(slides=[slide for batch in translated for slide in batch])
+        for language, translated in zip(targets, results)
+    }
@@ -1,8 +1,19 @@
 import streamlit as st
 import os
 import asyncio
-from agent_logic import analyze_pdf_and_plan_ppt
-from ppt_agent import generate_ppt_with_agent, get_templates_from_mcp
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from agent_logic import (
+    analyze_pdf_and_plan_ppt, build_document_index, update_plan_incrementally, document_fingerprints,
+    stream_plan_slides, translate_plan,
+)
+from ppt_agent import (
+    generate_ppt_with_agent, generate_ppt_from_stream, generate_ppt_variants, generate_template_previews,
+    get_templates_from_mcp, regenerate_slides,
+    manifest_path_for, load_manifest, new_output_dir,
+)
+from data_models import PresentationStructure
+from build_control import BuildCancelled, CancelToken
 
 st.set_page_config(
     page_title="AI Presentation Factory",
@@ -211,6 +222,15 @@ if 'cancel_requested' not in st.session_state:
     st.session_state.cancel_requested = False
 if 'selected_template_name' not in st.session_state:
     st.session_state.selected_template_name = None
+# Letzter Plan + Dokument-Fingerprints für die inkrementelle Planung
+if 'last_plan' not in st.session_state:
+    st.session_state.last_plan = None
+if 'last_plan_docs' not in st.session_state:
+    st.session_state.last_plan_docs = {}
+if 'last_plan_language' not in st.session_state:
+    st.session_state.last_plan_language = None
+if 'last_ppt_path' not in st.session_state:
+    st.session_state.last_ppt_path = None
 
 # -----------------------------------------------------------------------------
 # HEADER
@@ -257,6 +277,13 @@ if new_uploaded_files:
                 f.write(up_file.getbuffer())
             saved_paths.append(path)
         st.session_state.saved_pdf_paths = saved_paths
+        # Retrieval-Index schon beim Upload aufbauen (pro Dokument-Hash gecacht),
+        # damit die Planung später nur noch sucht
+        try:
+            with st.spinner("Dokumente werden indexiert..."):
+                build_document_index(saved_paths)
+        except Exception as e:
+            print(f"  ⚠ Indexierung beim Upload fehlgeschlagen: {e}")
 
 if st.session_state.uploaded_files_data:
     st.success(f"{len(st.session_state.uploaded_files_data)} Dokument(e) bereit")
@@ -275,11 +302,17 @@ section_header("2", "Sprache und Umfang", icon_name="sliders")
 col1, col2 = st.columns(2)
 
 with col1:
+    languages = ("Deutsch", "English", "Français", "Italiano", "Español")
     language = st.selectbox(
         "Sprache der Präsentation",
-        ("Deutsch", "English", "Français", "Italiano", "Español"),
+        languages,
         help="In welcher Sprache soll die Präsentation erstellt werden?"
     )
+    extra_languages = st.multiselect(
+        "Weitere Sprachen",
+        [l for l in languages if l != language],
+        help="Einmal planen, dann übersetzen: Layouts, Farben und Bilder werden für alle Sprachen übernommen."
+    )
 
 with col2:
     num_slides = st.slider(
@@ -298,11 +331,13 @@ card_end()
 card_start()
 section_header("3", "Design-Template auswählen", icon_name="layout")
 
+available_templates = []
 try:
     templates_data = asyncio.run(get_templates_from_mcp())
 
     if templates_data and templates_data.get("templates"):
         templates = templates_data["templates"]
+        available_templates = templates
         screenshot_base = "storage/templates/Screeenshot"
 
         cols = st.columns(4)
@@ -426,6 +461,23 @@ if st.session_state.uploaded_files_data:
 
     st.markdown("")
 
+incremental_planning = st.checkbox(
+    "Bestehenden Plan aktualisieren",
+    value=st.session_state.last_plan is not None,
+    disabled=st.session_state.last_plan is None,
+    help="Nur neue oder entfernte Dokumente werden verarbeitet; der letzte Plan wird überarbeitet statt neu erstellt."
+)
+streaming_mode = st.checkbox(
+    "Streaming-Planung",
+    value=False,
+    help="Folien werden schon gebaut (Layout, Bild), während der Plan noch generiert wird."
+)
+optimize_output = st.checkbox(
+    "Datei verkleinern",
+    value=False,
+    help="Entfernt unbenutzte Layouts, Master, Schriften und doppelte Bilder des Templates aus der PPTX."
+)
+
 col1, col2 = st.columns([3, 1])
 
 with col1:
@@ -442,6 +494,9 @@ with col2:
         st.session_state.saved_pdf_paths = []
         st.session_state.cancel_requested = False
         st.session_state.selected_template_name = None
+        st.session_state.last_plan = None
+        st.session_state.last_plan_docs = {}
+        st.session_state.last_ppt_path = None
         st.rerun()
 
 card_end()
@@ -458,6 +513,16 @@ if generate_button:
 
     cancel_placeholder.button("Abbrechen", on_click=cancel_callback, key="cancel_btn")
 
+    # Adapter: der PPT-Agent kennt Streamlit nicht, nur Token und Callback
+    cancel_token = CancelToken(check=lambda: st.session_state.cancel_requested)
+    slide_progress = status_box.progress(0.0)
+
+    def show_progress(stage, done, total, message):
+        if stage == "plan":
+            status_box.write(f"Plan: Folie {done} erhalten - {message}")
+        elif stage == "slides" and total:
+            slide_progress.progress(done / total, text=f"Folie {done}/{total}: {message}")
+
     try:
         if st.session_state.cancel_requested:
             status_box.update(label="Abgebrochen", state="error")
@@ -467,43 +532,190 @@ if generate_button:
         if st.session_state.cancel_requested:
             st.stop()
 
-        plan = analyze_pdf_and_plan_ppt(st.session_state.saved_pdf_paths, num_slides, language)
-        if st.session_state.cancel_requested:
-            st.stop()
-
-        status_box.write("Agent 2 generiert PowerPoint mit Bildern...")
-
-        ppt_path = generate_ppt_with_agent(
-            plan,
-            language,
-            template_name=selected_template_name,
-            image_style=image_style,
-            image_mode=image_mode,
-            image_colors=image_colors
-        )
+        # Eigener Ordner pro Generierung - andere Sessions bauen evtl. gerade in derselben Sprache
+        output_dir = new_output_dir()
+        output_path = os.path.join(output_dir, f"generated_presentation_{language}.pptx")
+        ppt_paths = None
+        if streaming_mode and not extra_languages and not (incremental_planning and st.session_state.last_plan is not None):
+            # Plan wird gestreamt; Agent 2 startet mit jeder fertigen Folie
+            status_box.write("Agent 2 baut Folien, während der Plan entsteht...")
+            ppt_path = generate_ppt_from_stream(
+                stream_plan_slides(st.session_state.saved_pdf_paths, num_slides, language),
+                language,
+                template_name=selected_template_name,
+                image_style=image_style,
+                image_mode=image_mode,
+                image_colors=image_colors,
+                expected_slides=num_slides,
+                output_path=output_path,
+                cancel_token=cancel_token,
+                progress=show_progress,
+                optimize=optimize_output
+            )
+            plan = PresentationStructure.model_validate(load_manifest(ppt_path)["plan"])
+            plan_docs = document_fingerprints(st.session_state.saved_pdf_paths)
+        else:
+            if incremental_planning and st.session_state.last_plan is not None:
+                plan, plan_docs = update_plan_incrementally(
+                    st.session_state.last_plan,
+                    st.session_state.last_plan_docs,
+                    st.session_state.saved_pdf_paths,
+                    num_slides,
+                    language,
+                    previous_language=st.session_state.last_plan_language
+                )
+            else:
+                plan = analyze_pdf_and_plan_ppt(st.session_state.saved_pdf_paths, num_slides, language)
+                plan_docs = document_fingerprints(st.session_state.saved_pdf_paths)
+            if st.session_state.cancel_requested:
+                st.stop()
+
+            if extra_languages:
+                # Übersetzung läuft parallel zum Aufbau der ersten Sprachversion
+                status_box.write(f"Agent 2 generiert {1 + len(extra_languages)} Sprachversionen...")
+                with ThreadPoolExecutor(max_workers=1) as translation_pool:
+                    translations = translation_pool.submit(
+                        contextvars.copy_context().run, translate_plan, plan, language, extra_languages
+                    )
+                    ppt_paths = generate_ppt_variants(
+                        plan,
+                        language,
+                        translations,
+                        template_name=selected_template_name,
+                        image_style=image_style,
+                        image_mode=image_mode,
+                        image_colors=image_colors,
+                        output_dir=output_dir,
+                        cancel_token=cancel_token,
+                        progress=show_progress,
+                        optimize=optimize_output
+                    )
+                ppt_path = ppt_paths[language]
+            else:
+                status_box.write("Agent 2 generiert PowerPoint mit Bildern...")
+
+                ppt_path = generate_ppt_with_agent(
+                    plan,
+                    language,
+                    template_name=selected_template_name,
+                    image_style=image_style,
+                    image_mode=image_mode,
+                    image_colors=image_colors,
+                    output_path=output_path,
+                    cancel_token=cancel_token,
+                    progress=show_progress,
+                    optimize=optimize_output
+                )
+        st.session_state.last_plan_docs = plan_docs
+        st.session_state.last_plan_language = language
 
         if st.session_state.cancel_requested:
             st.stop()
 
+        st.session_state.last_ppt_path = ppt_path
+        st.session_state.last_plan = plan
+
         status_box.update(label="Fertig!", state="complete", expanded=False)
         cancel_placeholder.empty()
 
         st.success("Präsentation erfolgreich erstellt!")
 
-        with open(ppt_path, "rb") as f:
-            st.download_button(
-                label="Download PPTX",
-                data=f,
-                file_name=f"praesentation_{language}.pptx",
-                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                use_container_width=True
-            )
+        for deck_language, deck_path in (ppt_paths or {language: ppt_path}).items():
+            with open(deck_path, "rb") as f:
+                st.download_button(
+                    label=f"Download PPTX ({deck_language})" if ppt_paths else "Download PPTX",
+                    data=f,
+                    file_name=f"praesentation_{deck_language}.pptx",
+                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                    use_container_width=True,
+                    key=f"download_{deck_language}"
+                )
+
+    except BuildCancelled:
+        status_box.update(label="Abgebrochen", state="error")
+        cancel_placeholder.empty()
+        st.warning("Erstellung abgebrochen.")
 
     except Exception as e:
         status_box.update(label="Fehler", state="error")
         cancel_placeholder.empty()
         st.error(f"Fehler: {e}")
 
+# Einzelne Folien neu generieren (nur die gewählten Slides, Rest bleibt unverändert)
+last_ppt_path = st.session_state.last_ppt_path
+if last_ppt_path and os.path.exists(manifest_path_for(last_ppt_path)) and st.session_state.last_plan:
+    with st.expander("Einzelne Folien neu generieren"):
+        plan_slides = st.session_state.last_plan.slides
+        selected_slides = st.multiselect(
+            "Folien",
+            options=list(range(len(plan_slides))),
+            format_func=lambda i: f"{i + 1}: {plan_slides[i].title}",
+            help="Layout, Bildstil und Bild werden nur für diese Folien neu bestimmt."
+        )
+        new_title = None
+        if len(selected_slides) == 1:
+            new_title = st.text_input("Titel", value=plan_slides[selected_slides[0]].title)
+
+        if st.button("Ausgewählte Folien neu generieren", disabled=not selected_slides):
+            updated_plan = st.session_state.last_plan.model_copy(deep=True)
+            if new_title:
+                updated_plan.slides[selected_slides[0]].title = new_title
+            with st.spinner("Folien werden neu generiert..."):
+                try:
+                    regenerate_slides(last_ppt_path, selected_slides, updated_plan)
+                    st.session_state.last_plan = updated_plan
+                    st.success(f"{len(selected_slides)} Folie(n) aktualisiert")
+                except Exception as e:
+                    st.error(f"Fehler: {e}")
+
+        with open(last_ppt_path, "rb") as f:
+            st.download_button(
+                label="Download aktualisierte PPTX",
+                data=f,
+                file_name=os.path.basename(last_ppt_path),
+                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                use_container_width=True,
+                key="download_regenerated"
+            )
+
+# Denselben Plan in mehreren Templates vergleichen (Bilder, Farben und Layout-Typen nur einmal)
+if st.session_state.last_plan and available_templates:
+    with st.expander("In weiteren Templates vergleichen"):
+        preview_templates = st.multiselect(
+            "Templates",
+            options=available_templates,
+            format_func=lambda t: t.replace(".pptx", "").replace(".potx", ""),
+            help="Der letzte Plan wird ohne neue Planung in jedem gewählten Template gebaut."
+        )
+        if st.button("Vorschauen erstellen", disabled=not preview_templates):
+            with st.spinner(f"{len(preview_templates)} Vorschauen werden erstellt..."):
+                try:
+                    st.session_state.preview_paths = generate_template_previews(
+                        st.session_state.last_plan,
+                        preview_templates,
+                        language=st.session_state.last_plan_language or language,
+                        image_style=image_style,
+                        image_mode=image_mode,
+                        image_colors=image_colors,
+                        output_dir=os.path.join(new_output_dir(), "previews"),
+                        optimize=optimize_output
+                    )
+                except Exception as e:
+                    st.error(f"Fehler: {e}")
+
+        for preview_template, preview_path in st.session_state.get("preview_paths", {}).items():
+            if not os.path.exists(preview_path):
+                continue
+            with open(preview_path, "rb") as f:
+                st.download_button(
+                    label=f"Download Vorschau ({preview_template.replace('.pptx', '')})",
+                    data=f,
+                    file_name=os.path.basename(preview_path),
+                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                    use_container_width=True,
+                    key=f"download_preview_{preview_template}"
+                )
+
 # Architektur-Diagramm am Ende
 st.markdown("---")
 with st.expander("Architektur und Ablauf"):
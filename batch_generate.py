@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Headless Batch-Generierung von Präsentationen (ohne Streamlit).
+
+Liest ein JSONL-Manifest, eine Zeile pro Job:
+
+    {"id": "anime", "pdfs": ["data/arts-07-00056.pdf"], "num_slides": 8,
+     "language": "Deutsch", "template": "Tech Startup Pitch Deck.pptx",
+     "image_style": "flat_illustration", "image_mode": "auto",
+     "image_colors": {"primary": "#0066CC", "secondary": "#00CC66"},
+     "languages": ["English", "Français"], "optimize": true}
+
+Pflicht ist nur "pdfs"; alles andere hat die Standardwerte der App. Mit
+"languages" wird einmal geplant und zusätzlich in diese Sprachen übersetzt
+(Mehrsprachen-Modus, Decks unter <output-dir>/<id>/); "optimize" verkleinert
+die Decks nach dem Speichern (pptx_optimizer). Die Jobs
+laufen in einem Thread-Pool (--workers) und teilen sich damit alle Caches des
+Prozesses und auf der Platte (Dokument-Index, Slide-Memo, Bild-Bibliothek,
+Template-Cache des MCP Servers) sowie die einmalige Transport-Erkennung des
+MCP Clients. Pro Job wird eine Ergebniszeile (Pfad, Zeiten, LLM-Nutzung bzw.
+Fehler) in die Results-JSONL geschrieben, sobald der Job fertig ist.
+
+Beispiel:
+    python batch_generate.py jobs.jsonl --results storage/batch_results.jsonl --workers 3
+"""
+import argparse
+import contextvars
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from agent_logic import analyze_pdf_and_plan_ppt, translate_plan
+from doc_index import document_hash
+from llm_scheduler import PRIORITY_BATCH, llm_priority, scheduler
+from llm_usage import usage_job
+from ppt_agent import generate_ppt_with_agent, generate_ppt_variants
+
+# Upload-Verzeichnis, das sich App und MCP Server teilen (read_pdf_file liest per Dateiname)
+UPLOAD_DIR = "storage"
+DEFAULT_OUTPUT_DIR = os.path.join("storage", "batch")
+
+_stage_lock = threading.Lock()
+_results_lock = threading.Lock()
+
+
+def load_manifest(path):
+    """Jobs aus der JSONL-Datei (Leerzeilen und #-Kommentare werden übersprungen)."""
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            job = json.loads(line)
+            if not job.get("pdfs"):
+                raise ValueError(f"Zeile {line_no}: 'pdfs' fehlt")
+            job.setdefault("id", f"job{line_no}")
+            jobs.append(job)
+    return jobs
+
+
+def staged_name(path):
+    """Dateiname im Upload-Verzeichnis: Inhalts-Hash + Originalname (gleichnamige PDFs kollidieren nicht)."""
+    return f"{document_hash(path)[:16]}_{os.path.basename(path)}"
+
+
+def stage_documents(pdf_paths):
+    """
+    Kopiert die PDFs ins Upload-Verzeichnis (wie der Upload in der App) und gibt die neuen Pfade zurück.
+    Der Name enthält den Inhalts-Hash: eine vorhandene Datei gleichen Namens ist also dasselbe Dokument
+    und wird von keinem anderen Job überschrieben.
+    """
+    staged = []
+    with _stage_lock:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        for path in pdf_paths:
+            target = os.path.join(UPLOAD_DIR, staged_name(path))
+            if not os.path.exists(target):
+                shutil.copy2(path, target)
+            staged.append(target)
+    return staged
+
+
+def run_job(job, output_dir):
+    """Plant und baut eine Präsentation. Gibt die Ergebniszeile zurück (wirft nie)."""
+    result = {"id": job["id"], "ok": False}
+    usage = None
+    start = time.perf_counter()
+    try:
+        # Batch-Aufrufe stehen im gemeinsamen LLM-Scheduler hinter interaktiven Anfragen
+        with usage_job(f"batch:{job['id']}") as usage, llm_priority(PRIORITY_BATCH):
+            paths = stage_documents(job["pdfs"])
+            language = job.get("language", "Deutsch")
+
+            plan_start = time.perf_counter()
+            plan = analyze_pdf_and_plan_ppt(paths, job.get("num_slides", 10), language)
+            result["plan_s"] = round(time.perf_counter() - plan_start, 2)
+            result["slides"] = len(plan.slides)
+
+            build_start = time.perf_counter()
+            settings = {
+                "template_name": job.get("template"),
+                "image_style": job.get("image_style", "flat_illustration"),
+                "image_mode": job.get("image_mode", "auto"),
+                "image_colors": job.get("image_colors"),
+                "optimize": job.get("optimize"),
+            }
+            if job.get("languages"):
+                variant_dir = os.path.join(output_dir, job["id"])
+                os.makedirs(variant_dir, exist_ok=True)
+                with ThreadPoolExecutor(max_workers=1) as translation_pool:
+                    translations = translation_pool.submit(
+                        contextvars.copy_context().run, translate_plan, plan, language, job["languages"]
+                    )
+                    result["outputs"] = generate_ppt_variants(plan, language, translations,
+                                                              output_dir=variant_dir, **settings)
+                result["output"] = result["outputs"][language]
+            else:
+                output_path = job.get("output") or os.path.join(output_dir, f"{job['id']}.pptx")
+                os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+                result["output"] = generate_ppt_with_agent(plan, language=language, output_path=output_path,
+                                                           **settings)
+            result["build_s"] = round(time.perf_counter() - build_start, 2)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    result["total_s"] = round(time.perf_counter() - start, 2)
+    if usage is not None:
+        result["llm"] = {k: usage[k] for k in ("calls", "input_tokens", "output_tokens", "latency_ms", "tiers")}
+    return result
+
+
+def write_result(results_path, result):
+    with _results_lock, open(results_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def run_batch(jobs, results_path, workers=2, output_dir=DEFAULT_OUTPUT_DIR):
+    """Führt alle Jobs im Pool aus und gibt die Ergebnisse in Abschlussreihenfolge zurück."""
+    os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(run_job, job, output_dir): job for job in jobs}
+        for future in as_completed(futures):
+            result = future.result()
+            write_result(results_path, result)
+            results.append(result)
+            status = f"✓ {result['output']}" if result["ok"] else f"⚠ {result['error']}"
+            print(f"--> Batch [{len(results)}/{len(jobs)}] {result['id']}: {status} ({result['total_s']} s)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Präsentationen headless aus einem JSONL-Manifest erzeugen")
+    parser.add_argument("manifest", help="JSONL mit einem Job pro Zeile")
+    parser.add_argument("--results", default=os.path.join("storage", "batch_results.jsonl"),
+                        help="Ergebnis-JSONL (wird angehängt)")
+    parser.add_argument("--workers", type=int, default=2, help="Parallele Jobs")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Zielordner für <id>.pptx")
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    print(f"--> Batch: {len(jobs)} Jobs, {args.workers} parallel")
+    start = time.perf_counter()
+    results = run_batch(jobs, args.results, workers=args.workers, output_dir=args.output_dir)
+    failed = sum(1 for r in results if not r["ok"])
+    print(f"✓ Batch fertig in {time.perf_counter() - start:.1f} s: {len(results) - failed} ok, {failed} Fehler")
+    metrics = scheduler.metrics()
+    print(f"  LLM-Scheduler: {metrics['admitted']} Aufrufe, Wartezeit Ø {metrics['avg_wait_ms']} ms / "
+          f"max {metrics['max_wait_ms']} ms, {metrics['retries']} Retries")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
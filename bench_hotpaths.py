@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Micro-Benchmarks für die CPU-lastigen Hot Paths des MCP Servers:
+
+- PDF-Extraktion (read_pdf_file -> extract_pdf_text): Seiten/s
+- Template-Analyse (analyze_template -> analyze_template_file): Layouts/s
+
+Gemessen wird über die Beispiel-PDFs in data/, die Templates in ppt_templates/
+sowie synthetische Grosseingaben (1k-Seiten-PDF, Templates mit 100+ Layouts).
+Laufzeit und Speicher (tracemalloc-Peak) werden in getrennten Durchläufen erfasst,
+damit das Tracing die Zeitmessung nicht verfälscht.
+
+Alternative Extraktions- oder Caching-Modi werden in PDF_MODES / TEMPLATE_MODES
+registriert und automatisch als Vergleichslauf mitgemessen.
+
+Aufruf:
+    python bench_hotpaths.py                  # alles
+    python bench_hotpaths.py --quick          # nur kleine Eingaben, 1 Wiederholung
+    python bench_hotpaths.py --json out.json  # Ergebnisse zusätzlich als JSON
+"""
+import argparse
+import contextlib
+import copy
+import glob
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from pypdf import PdfReader, PdfWriter
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.parts.slide import SlideLayoutPart
+
+from mcp_server import extract_pdf_text, analyze_template_file
+from pdf_structure import extract_structured
+from shared_cache import SharedFileCache
+
+SAMPLE_PDF_GLOB = "data/*.pdf"
+SAMPLE_TEMPLATE_GLOB = "ppt_templates/*.pptx"
+
+# Warmer Shared-Cache wie im MCP Server (der erste Durchlauf füllt ihn)
+_bench_cache = SharedFileCache(tempfile.mkdtemp(prefix="bench_cache_"))
+
+# Modus-Registry: name -> fn(path). Neue Modi hier eintragen, dann laufen sie
+# automatisch als Vergleich gegen "raw" / "baseline" mit.
+PDF_MODES = {
+    "raw": extract_pdf_text,
+    "cached": lambda path: _bench_cache.get_or_compute(
+        _bench_cache.file_key("pdf_text", path), lambda: extract_pdf_text(path)),
+    "structured": extract_structured,
+}
+
+TEMPLATE_MODES = {
+    "baseline": lambda path: analyze_template_file(path, os.path.basename(path)),
+    "cached": lambda path: _bench_cache.get_or_compute(
+        _bench_cache.file_key("template_analysis", path),
+        lambda: analyze_template_file(path, os.path.basename(path))),
+}
+
+
+# -----------------------------------------------------------------------------
+# Synthetische Eingaben
+# -----------------------------------------------------------------------------
+def make_synthetic_pdf(path, num_pages, seed_pages=10):
+    """
+    Erzeugt ein PDF mit num_pages Textseiten. Es werden nur seed_pages Seiten
+    mit fpdf2 gerendert (langsam) und danach mit pypdf vervielfältigt.
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=11)
+    for i in range(seed_pages):
+        pdf.add_page()
+        pdf.set_font("Helvetica", style="B", size=14)
+        pdf.cell(0, 10, f"{i + 1}. Synthetic Section {i + 1}", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", size=11)
+        pdf.multi_cell(0, 5, "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40)
+    seed = PdfReader(io.BytesIO(bytes(pdf.output())))
+
+    writer = PdfWriter()
+    for i in range(num_pages):
+        writer.add_page(seed.pages[i % seed_pages])
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def make_synthetic_template(path, num_layouts):
+    """
+    Erzeugt ein Template mit mindestens num_layouts Layouts, indem die Layouts
+    der Standard-Präsentation geklont und am Slide Master registriert werden.
+    """
+    prs = Presentation()
+    master = prs.slide_master
+    package = prs.part.package
+    layout_id_lst = master._element.get_or_add_sldLayoutIdLst()
+    source_layouts = list(prs.slide_layouts)
+    next_id = max(int(e.get("id")) for e in layout_id_lst) + 1
+
+    for i in range(max(0, num_layouts - len(source_layouts))):
+        source = source_layouts[i % len(source_layouts)]
+        partname = package.next_partname("/ppt/slideLayouts/slideLayout%d.xml")
+        part = SlideLayoutPart(partname, source.part.content_type, package, copy.deepcopy(source._element))
+        part.relate_to(master.part, RT.SLIDE_MASTER)
+        rId = master.part.relate_to(part, RT.SLIDE_LAYOUT)
+        layout_id = layout_id_lst._add_sldLayoutId(rId=rId)
+        layout_id.set("id", str(next_id))
+        next_id += 1
+
+    prs.save(path)
+    return path
+
+
+# -----------------------------------------------------------------------------
+# Messung
+# -----------------------------------------------------------------------------
+def _run_quiet(fn, path):
+    # Die Hot Paths loggen per print (z.B. classify_layout) - das kostet mit,
+    # soll aber die Benchmark-Ausgabe nicht fluten.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(path)
+
+
+def measure(fn, path, repeat):
+    """Gibt (Zeiten in s, Peak-Speicher in Bytes, Ergebnis) zurück."""
+    # Der Speicher-Durchlauf dient gleichzeitig als Warm-up (z.B. füllt er Caches)
+    tracemalloc.start()
+    try:
+        _run_quiet(fn, path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = _run_quiet(fn, path)
+        timings.append(time.perf_counter() - start)
+    return timings, peak, result
+
+
+def count_pdf_pages(path):
+    return len(PdfReader(path).pages)
+
+
+def count_template_layouts(path):
+    return len(Presentation(path).slide_layouts)
+
+
+def bench_inputs(kind, inputs, modes, unit_counter, unit_name, repeat):
+    rows = []
+    for label, path in inputs:
+        units = unit_counter(path)
+        for mode_name, fn in modes.items():
+            timings, peak, _ = measure(fn, path, repeat)
+            median = statistics.median(timings)
+            rows.append({
+                "kind": kind,
+                "input": label,
+                "mode": mode_name,
+                "units": units,
+                "unit": unit_name,
+                "size_bytes": os.path.getsize(path),
+                "median_s": round(median, 4),
+                "best_s": round(min(timings), 4),
+                "throughput": round(units / median, 1) if median > 0 else None,
+                "peak_mem_mb": round(peak / (1024 * 1024), 2),
+            })
+            print(f"  {label[:45]:45s} {mode_name:10s} {units:6d} {unit_name:7s} "
+                  f"{median * 1000:9.1f} ms  {rows[-1]['throughput']:>9} {unit_name}/s  "
+                  f"{rows[-1]['peak_mem_mb']:7.2f} MB")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-Benchmarks für PDF-Extraktion und Template-Analyse")
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen pro Messung (Median wird berichtet)")
+    parser.add_argument("--quick", action="store_true", help="Nur kleine Eingaben, 1 Wiederholung")
+    parser.add_argument("--synthetic-pages", type=int, default=1000, help="Seitenzahl des grossen synthetischen PDFs")
+    parser.add_argument("--synthetic-layouts", type=int, default=120, help="Layoutzahl des grossen synthetischen Templates")
+    parser.add_argument("--pdf-modes", nargs="*", default=None, help=f"Auswahl aus {list(PDF_MODES)}")
+    parser.add_argument("--template-modes", nargs="*", default=None, help=f"Auswahl aus {list(TEMPLATE_MODES)}")
+    parser.add_argument("--json", dest="json_path", help="Ergebnisse zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    repeat = 1 if args.quick else args.repeat
+    pdf_modes = {k: PDF_MODES[k] for k in (args.pdf_modes or PDF_MODES)}
+    template_modes = {k: TEMPLATE_MODES[k] for k in (args.template_modes or TEMPLATE_MODES)}
+
+    with tempfile.TemporaryDirectory(prefix="bench_hotpaths_") as tmp:
+        pdf_inputs = [(os.path.basename(p), p) for p in sorted(glob.glob(SAMPLE_PDF_GLOB))]
+        template_inputs = [(os.path.basename(p), p) for p in sorted(glob.glob(SAMPLE_TEMPLATE_GLOB))]
+
+        synthetic_pages = [100] if args.quick else [100, args.synthetic_pages]
+        synthetic_layouts = [30] if args.quick else [30, args.synthetic_layouts]
+
+        print("Erzeuge synthetische Eingaben...")
+        for n in synthetic_pages:
+            path = make_synthetic_pdf(os.path.join(tmp, f"synthetic_{n}p.pdf"), n)
+            pdf_inputs.append((f"synthetic_{n}p.pdf", path))
+        for n in synthetic_layouts:
+            path = make_synthetic_template(os.path.join(tmp, f"synthetic_{n}l.pptx"), n)
+            template_inputs.append((f"synthetic_{n}l.pptx", path))
+
+        print(f"\nPDF-Extraktion ({repeat}x, Median):")
+        rows = bench_inputs("pdf", pdf_inputs, pdf_modes, count_pdf_pages, "pages", repeat)
+
+        print(f"\nTemplate-Analyse ({repeat}x, Median):")
+        rows += bench_inputs("template", template_inputs, template_modes, count_template_layouts, "layouts", repeat)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n✓ Ergebnisse gespeichert: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
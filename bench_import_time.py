@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Import-Zeit-Benchmark für den Kaltstart von App, Agenten und Tests.
+
+Startet pro Modul einen frischen Interpreter mit `python -X importtime` und
+berichtet (Median über --repeat Läufe):
+
+- Wandzeit des Prozesses bis nach dem Import
+- kumulierte Import-Zeit des Moduls
+- die teuersten Top-Level-Abhängigkeiten (z.B. langchain_google_genai, mcp)
+
+Mit --first-llm wird zusätzlich gemessen, was der erste get_llm()-Aufruf
+kostet (dort wird LangChain seit llm_clients nachgeladen).
+
+Aufruf:
+    python bench_import_time.py
+    python bench_import_time.py --modules ppt_agent agent_logic --top 5
+    python bench_import_time.py --json out.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ["agent_logic", "ppt_agent", "mcp_client", "batch_generate", "mcp_server"]
+
+
+def import_profile(statement):
+    """Führt statement in einem frischen Interpreter aus; gibt (Wandzeit s, {Modul: (self µs, kumuliert µs, Tiefe)})."""
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "bench")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "Import fehlgeschlagen")
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return wall, modules
+
+
+def bench_module(module, repeat, top):
+    walls, profiles = [], []
+    for _ in range(repeat):
+        wall, modules = import_profile(f"import {module}")
+        walls.append(wall)
+        profiles.append(modules)
+
+    cumulative = statistics.median(p.get(module, (0, 0, 0))[1] for p in profiles) / 1000
+    # Direkte Abhängigkeiten des Moduls: eine Ebene unter ihm im letzten Profil
+    last = profiles[-1]
+    own_depth = last.get(module, (0, 0, 0))[2]
+    deps = sorted(((name, cum / 1000) for name, (_, cum, depth) in last.items() if depth == own_depth + 1),
+                  key=lambda d: d[1], reverse=True)[:top]
+    return {"module": module, "wall_ms": round(statistics.median(walls) * 1000, 1),
+            "import_ms": round(cumulative, 1), "top_deps": [[n, round(ms, 1)] for n, ms in deps]}
+
+
+def bench_first_llm(repeat):
+    statement = ("import time, llm_clients; t = time.perf_counter(); llm_clients.get_llm('planner'); "
+                 "print(round((time.perf_counter() - t) * 1000, 1))")
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "bench")
+    times = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", statement], capture_output=True, text=True, env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        times.append(float(proc.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(times), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-Zeiten (Kaltstart) der Projektmodule messen")
+    parser.add_argument("--modules", nargs="*", default=DEFAULT_MODULES, help="Zu messende Module")
+    parser.add_argument("--repeat", type=int, default=3, help="Läufe pro Modul (Median wird berichtet)")
+    parser.add_argument("--top", type=int, default=3, help="Anzahl teuerster Abhängigkeiten pro Modul")
+    parser.add_argument("--first-llm", action="store_true", help="Kosten des ersten get_llm()-Aufrufs messen")
+    parser.add_argument("--json", dest="json_path", help="Ergebnisse zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    print(f"Import-Zeiten ({args.repeat}x, Median):")
+    rows = []
+    for module in args.modules:
+        try:
+            row = bench_module(module, args.repeat, args.top)
+        except RuntimeError as e:
+            print(f"  {module:20s} ⚠ {e}")
+            continue
+        rows.append(row)
+        deps = ", ".join(f"{name} {ms:.0f} ms" for name, ms in row["top_deps"])
+        print(f"  {module:20s} {row['import_ms']:8.1f} ms Import  {row['wall_ms']:8.1f} ms Prozess   [{deps}]")
+
+    if args.first_llm:
+        first_llm_ms = bench_first_llm(args.repeat)
+        rows.append({"module": "get_llm() (erster Aufruf)", "import_ms": first_llm_ms})
+        print(f"  {'get_llm() erster Aufruf':20s} {first_llm_ms:8.1f} ms")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\n✓ Ergebnisse gespeichert: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
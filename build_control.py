@@ -0,0 +1,52 @@
+"""
+Abbruch und Fortschritt für den PPT-Builder - unabhängig von der Oberfläche.
+
+ppt_agent kennt weder Streamlit noch eine andere UI: der Aufrufer übergibt
+optional ein CancelToken und einen Fortschritts-Callback. Die Streamlit-App
+verbindet beides mit session_state bzw. ihrer Statusbox; Batch-Worker und
+Tests lassen es weg oder setzen den Token selbst.
+
+Fortschritts-Callback: progress(stage, done, total, message)
+    stage: "template", "plan" (Streaming), "slides", "saved", "variant" (Mehrsprachen-Modus)
+           oder "preview" (Template-Vorschau)
+    total: None, wenn die Gesamtzahl (noch) unbekannt ist
+"""
+import threading
+
+
+class BuildCancelled(Exception):
+    """Der Aufrufer hat die Erstellung über das CancelToken abgebrochen."""
+
+
+class CancelToken:
+    def __init__(self, event=None, check=None):
+        """
+        Args:
+            event: Event-Objekt mit set()/is_set() - für Prozess-Pools z.B. ein
+                   multiprocessing.Manager().Event(); Standard: threading.Event
+            check: optionale Funktion, die zusätzlich abgefragt wird (z.B. UI-Zustand)
+        """
+        self._event = event if event is not None else threading.Event()
+        self._check = check
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or bool(self._check and self._check())
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            print("--> Abbrechen-Anfrage im PPT-Agent erkannt. Beende Generierung.")
+            raise BuildCancelled("Präsentations-Erstellung durch Benutzer abgebrochen.")
+
+
+def report(progress, stage, done, total=None, message=""):
+    """Ruft den Fortschritts-Callback auf (falls vorhanden); Fehler darin brechen den Build nicht ab."""
+    if progress is None:
+        return
+    try:
+        progress(stage, done, total, message)
+    except Exception as e:
+        print(f"  ⚠ Fortschritts-Callback fehlgeschlagen: {e}")
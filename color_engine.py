@@ -0,0 +1,120 @@
+"""
+Lokale Farbwahl aus der Theme-Palette eines Templates (ohne LLM-Aufruf).
+
+Jedes PowerPoint-Template bringt im Theme seines Folienmasters ein Farbschema
+(<a:clrScheme>) mit: dk1/lt1/dk2/lt2, accent1-6 und Hyperlink-Farben. Der MCP
+Server liest es bei analyze_template mit aus (und cacht es mit der Analyse),
+choose_colors() wählt daraus Primary/Secondary passend zum Thema:
+
+1. Schlüsselwörter der Folientitel ergeben einen Ziel-Farbton (z.B. Grün für
+   Nachhaltigkeit, Blau für Tech/Business).
+2. Primary ist der Akzent mit dem nächstliegenden Farbton - ohne Treffer accent1.
+3. Secondary ist der nächste Akzent, der sich deutlich von Primary abhebt.
+
+Gleiche Eingaben ergeben immer dieselben Farben.
+"""
+import colorsys
+import re
+
+from lxml import etree
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+THEME_SLOTS = ("dk1", "lt1", "dk2", "lt2", "accent1", "accent2", "accent3",
+               "accent4", "accent5", "accent6", "hlink", "folHlink")
+ACCENT_SLOTS = THEME_SLOTS[4:10]
+_NS = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main"}
+
+# Themen-Schlüsselwörter (Wortanfänge, de/en) -> Farbton in Grad
+TOPIC_HUES = [
+    (("nachhaltig", "sustainab", "umwelt", "environment", "klima", "climate", "natur", "ökolog",
+      "ecolog", "green", "grün", "energie", "energy", "landwirtschaft", "agricultur"), 120),
+    (("tech", "digital", "software", "daten", "data", "cloud", "künstlich", "artificial", "ki ",
+      "ai ", "business", "finanz", "financ", "wirtschaft", "econom", "unternehm", "corporate"), 210),
+    (("kreativ", "creativ", "design", "kunst", "art ", "marketing", "kampagne", "campaign",
+      "anime", "manga", "medien", "media"), 30),
+    (("gesundheit", "health", "medizin", "medic", "pflege", "care"), 175),
+    (("innovation", "zukunft", "future", "luxus", "luxury", "strategie", "strateg"), 275),
+    (("sicherheit", "security", "risiko", "risk", "notfall", "emergenc"), 0),
+]
+MIN_SATURATION = 0.2      # fast graue Akzente sind keine Kandidaten
+MIN_HUE_DISTANCE = 40     # Mindestabstand Secondary <-> Primary
+
+
+def _slot_color(element):
+    """Hex-Farbe eines clrScheme-Eintrags (srgbClr oder sysClr mit lastClr)."""
+    srgb = element.find("a:srgbClr", _NS)
+    if srgb is not None:
+        return f"#{srgb.get('val').upper()}"
+    sys_color = element.find("a:sysClr", _NS)
+    if sys_color is not None and sys_color.get("lastClr"):
+        return f"#{sys_color.get('lastClr').upper()}"
+    return None
+
+
+def extract_theme_colors(prs):
+    """Farbschema des ersten Folienmasters als {slot: "#RRGGBB"} (leer, wenn keins gefunden)."""
+    try:
+        theme_part = prs.slide_masters[0].part.part_related_by(RT.THEME)
+        scheme = etree.fromstring(theme_part.blob).find("a:themeElements/a:clrScheme", _NS)
+    except (IndexError, KeyError, etree.XMLSyntaxError):
+        return {}
+    if scheme is None:
+        return {}
+
+    colors = {}
+    for slot in THEME_SLOTS:
+        element = scheme.find(f"a:{slot}", _NS)
+        color = _slot_color(element) if element is not None else None
+        if color:
+            colors[slot] = color
+    return colors
+
+
+def _hls(hex_color):
+    value = hex_color.lstrip("#")
+    r, g, b = (int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    hue, lightness, saturation = colorsys.rgb_to_hls(r, g, b)
+    return hue * 360, lightness, saturation
+
+
+def _hue_distance(a, b):
+    diff = abs(a - b) % 360
+    return min(diff, 360 - diff)
+
+
+def topic_hue(text):
+    """Ziel-Farbton für das Thema (erste Gruppe mit den meisten Treffern) oder None."""
+    words = " " + re.sub(r"[^\w]+", " ", text.lower()) + " "
+    best, best_hits = None, 0
+    for keywords, hue in TOPIC_HUES:
+        hits = sum(words.count(f" {keyword}") for keyword in keywords)
+        if hits > best_hits:
+            best, best_hits = hue, hits
+    return best
+
+
+def choose_colors(theme_colors, topic_text=""):
+    """
+    Primary/Secondary aus der Theme-Palette.
+
+    Returns:
+        dict {"primary": "#hex", "secondary": "#hex"} oder None, wenn die
+        Palette keine brauchbaren Akzentfarben enthält
+    """
+    candidates = [theme_colors[slot] for slot in ACCENT_SLOTS
+                  if slot in theme_colors and 0.1 < _hls(theme_colors[slot])[1] < 0.9
+                  and _hls(theme_colors[slot])[2] >= MIN_SATURATION]
+    if not candidates:
+        return None
+
+    target = topic_hue(topic_text)
+    if target is None:
+        primary = candidates[0]
+    else:
+        primary = min(candidates, key=lambda c: _hue_distance(_hls(c)[0], target))
+
+    primary_hue = _hls(primary)[0]
+    others = [c for c in candidates if c != primary]
+    distinct = [c for c in others if _hue_distance(_hls(c)[0], primary_hue) >= MIN_HUE_DISTANCE]
+    secondary = (distinct or others or [theme_colors.get("dk2", primary)])[0]
+    return {"primary": primary, "secondary": secondary}
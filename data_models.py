@@ -32,4 +32,20 @@ class CustomerSlide(BaseModel):
     colors: Optional[ImageColors] = Field(default=None, description="Farbschema für Bildgenerierung")
 
 class PresentationStructure(BaseModel):
-    slides: List[CustomerSlide]
\ No newline at end of file
+    slides: List[CustomerSlide]
+
+class OutlineSlide(BaseModel):
+    """Erste Planungsstufe: nur Arbeitstitel und Suchbegriffe für den Retrieval-Index"""
+    title: str = Field(description="Arbeitstitel der Folie")
+    searchQuery: str = Field(description="Suchbegriffe in der Sprache der Dokumente, um passende Textstellen zu finden")
+
+class PresentationOutline(BaseModel):
+    slides: List[OutlineSlide]
+
+class SlideText(BaseModel):
+    """Übersetzbarer Text einer Folie (Mehrsprachen-Modus)"""
+    title: str = Field(description="Übersetzter Titel")
+    bullets: List[BulletItem] = Field(description="Übersetzte Inhalte, gleiche Struktur wie im Original")
+
+class SlideTextBatch(BaseModel):
+    slides: List[SlideText]
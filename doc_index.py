@@ -0,0 +1,194 @@
+"""
+Lokaler Retrieval-Index (BM25) über die hochgeladenen Dokumente.
+
+Die strukturierte Extraktion des MCP Servers (read_pdf_file, mode="json") wird
+in seitengenaue Chunks zerlegt. Pro Dokument-Hash landen die Chunks samt
+Termhäufigkeiten in storage/.index, d.h. jedes PDF wird nur einmal zerlegt -
+egal unter welchem Namen es erneut hochgeladen wird.
+
+Neben den Chunks liegen dort auch die Dokument-Zusammenfassungen der
+inkrementellen Planung (<hash>.summary.json).
+
+Der Planer nutzt den Index, um pro Folie nur die relevantesten Textstellen
+(innerhalb eines Token-Budgets) in den Prompt zu geben, und um Source.pageNumber
+aus den echten Seitenangaben der Chunks zu füllen.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+
+from prompt_builder import count_tokens
+
+INDEX_DIR = os.environ.get("DOC_INDEX_DIR", os.path.join("storage", ".index"))
+INDEX_VERSION = 1
+CHUNK_CHARS = 1200
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "the", "and", "for", "are", "was", "were", "that", "this", "with", "from", "which", "have", "has",
+    "not", "but", "its", "their", "they", "can", "also", "been", "such", "these", "into", "than",
+    "der", "die", "das", "und", "ist", "mit", "von", "den", "dem", "des", "ein", "eine", "einer",
+    "auf", "für", "sich", "auch", "als", "wird", "werden", "nicht", "zu", "im", "bei", "oder",
+}
+
+
+def document_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def tokenize(text):
+    return [t for t in re.findall(r"\w+", text.lower())
+            if len(t) > 2 and not t.isdigit() and t not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    return count_tokens(text)
+
+
+def _split(text, size=CHUNK_CHARS):
+    """Text in Stücke von höchstens size Zeichen teilen, bevorzugt an Satzenden."""
+    pieces = []
+    while len(text) > size:
+        cut = text.rfind(". ", 0, size)
+        if cut < size // 2:
+            cut = text.rfind(" ", 0, size)
+        if cut <= 0:
+            cut = size
+        pieces.append(text[:cut + 1].strip())
+        text = text[cut + 1:]
+    if text.strip():
+        pieces.append(text.strip())
+    return pieces
+
+
+def chunk_document(doc):
+    """
+    Zerlegt das Ergebnis von pdf_structure.extract_structured in Chunks
+    {section, page, text, terms}. Grenzen liegen immer auf Seitenwechseln.
+    """
+    chunks = []
+    for section in doc.get("sections", []):
+        text = section.get("text", "")
+        offsets = section.get("page_offsets") or [[section.get("page_start", 1), 0]]
+        bounds = [o[1] for o in offsets[1:]] + [len(text)]
+        for (page, start), end in zip(offsets, bounds):
+            for piece in _split(text[start:end].strip()):
+                terms = Counter(tokenize(f"{section['title']} {piece}"))
+                chunks.append({"section": section["title"], "page": page, "text": piece, "terms": dict(terms)})
+    return chunks
+
+
+def _index_path(doc_hash, suffix=""):
+    return os.path.join(INDEX_DIR, f"{doc_hash}{suffix}.json")
+
+
+def _load(doc_hash, suffix=""):
+    try:
+        with open(_index_path(doc_hash, suffix), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if data.get("version") == INDEX_VERSION else None
+
+
+def _save(doc_hash, data, suffix=""):
+    try:
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=INDEX_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, **data}, f, ensure_ascii=False)
+        os.replace(tmp_path, _index_path(doc_hash, suffix))
+    except OSError as e:
+        print(f"  ⚠ Index konnte nicht gespeichert werden ({doc_hash[:12]}): {e}")
+
+
+def load_chunks(doc_hash):
+    data = _load(doc_hash)
+    return data["chunks"] if data else None
+
+
+def save_chunks(doc_hash, chunks):
+    _save(doc_hash, {"chunks": chunks})
+
+
+def load_summary(doc_hash):
+    """Zusammenfassung eines Dokuments (für die inkrementelle Planung), ebenfalls pro Hash gecacht."""
+    data = _load(doc_hash, ".summary")
+    return data["summary"] if data else None
+
+
+def save_summary(doc_hash, summary):
+    _save(doc_hash, {"summary": summary}, ".summary")
+
+
+class DocumentIndex:
+    """BM25 über die Chunks mehrerer Dokumente. chunks: Liste von dicts mit "doc"."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.lengths = [sum(c["terms"].values()) for c in chunks]
+        self.avg_length = (sum(self.lengths) / len(chunks)) if chunks else 0.0
+        df = Counter()
+        for chunk in chunks:
+            df.update(chunk["terms"].keys())
+        n = len(chunks)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    @property
+    def total_tokens(self):
+        return sum(estimate_tokens(c["text"]) for c in self.chunks)
+
+    def score(self, query_terms, i):
+        terms = self.chunks[i]["terms"]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / (self.avg_length or 1))
+        total = 0.0
+        for term in query_terms:
+            tf = terms.get(term)
+            if tf:
+                total += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+        return total
+
+    def search(self, query, k=5, token_budget=None):
+        """Top-k Chunks (absteigend nach Relevanz), optional begrenzt durch ein Token-Budget."""
+        query_terms = set(tokenize(query))
+        scored = [(self.score(query_terms, i), i) for i in range(len(self.chunks))]
+        scored = sorted((s for s in scored if s[0] > 0), reverse=True)
+        results, used = [], 0
+        for _, i in scored:
+            cost = estimate_tokens(self.chunks[i]["text"])
+            if token_budget is not None and results and used + cost > token_budget:
+                break
+            results.append(self.chunks[i])
+            used += cost
+            if len(results) >= k:
+                break
+        return results
+
+    def outline(self, token_budget):
+        """Kompakte Gliederung (Abschnitte mit Seiten und Textanfang) für die erste Planungsstufe."""
+        lines, used, seen = [], 0, set()
+        for chunk in self.chunks:
+            key = (chunk["doc"], chunk["section"])
+            if key in seen:
+                continue
+            seen.add(key)
+            line = f"[{chunk['doc']}, S. {chunk['page']}] {chunk['section'] or '(ohne Titel)'}: {chunk['text'][:200]}"
+            used += estimate_tokens(line)
+            if used > token_budget:
+                break
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def render_chunks(chunks):
+    """Chunks mit Quellenmarke für den Prompt."""
+    return "\n\n".join(f"[{c['doc']}, S. {c['page']}] {c['section']}\n{c['text']}" for c in chunks)
@@ -0,0 +1,121 @@
+"""
+Bild-Bibliothek mit Perceptual Hash (dHash) für Wiederverwendung und Dedup.
+
+Jedes abgerufene Folienbild wird beim Ingest gehasht. Ist es einem schon
+bekannten Bild fast gleich (Hamming-Abstand <= DUPLICATE_DISTANCE), wird das
+vorhandene Bild zurückgegeben - gleiche Bytes bedeuten in python-pptx auch nur
+einen Image-Part pro Präsentation. Sonst landet das Bild unter seinem Hash in
+storage/.image_library.
+
+Vor einem neuen Abruf sucht find_match() nach einem Bild für eine inhaltlich
+passende Slide (gleicher Stil, gleiche Farben, ähnliche Stichwörter) aus diesem
+oder früheren Decks und spart so den gurk.li-Aufruf.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+from doc_index import tokenize
+
+LIBRARY_DIR = os.environ.get("IMAGE_LIBRARY_DIR", os.path.join("storage", ".image_library"))
+DUPLICATE_DISTANCE = 6       # von 64 Bit
+REUSE_SIMILARITY = 0.6       # Jaccard der Stichwörter
+HASH_SIZE = 8
+
+
+def dhash(path):
+    """64-Bit Differenz-Hash: Helligkeitsgefälle benachbarter Pixel im 9x8-Graustufenbild."""
+    with Image.open(path) as image:
+        pixels = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            value = (value << 1) | (left > pixels[row * (HASH_SIZE + 1) + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def slide_keywords(slide_data):
+    """Stichwörter einer Slide für die Wiederverwendung (Titel plus Bild-Suchbegriffe)."""
+    terms = slide_data.ImageKeywords or slide_data.unsplashSearchTerms or []
+    return sorted(set(tokenize(" ".join([slide_data.title, *terms]))))
+
+
+def _jaccard(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+class ImageLibrary:
+    def __init__(self, directory=LIBRARY_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "library.json")
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [e for e in entries if os.path.exists(e["path"])]
+
+    def _save(self, entries):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def find_match(self, keywords, style, colors):
+        """Bereits vorhandenes Bild für eine inhaltlich passende Slide oder None."""
+        best, best_score = None, REUSE_SIMILARITY
+        for entry in self._load():
+            if entry["style"] != style or entry["colors"] != colors:
+                continue
+            score = _jaccard(entry["keywords"], keywords)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best["path"] if best else None
+
+    def ingest(self, path, keywords, style, colors):
+        """
+        Nimmt ein neu abgerufenes Bild auf.
+
+        Returns:
+            Pfad des Bildes in der Bibliothek - bei einem Beinahe-Duplikat das
+            schon vorhandene Bild (die neue Datei wird dann verworfen)
+        """
+        try:
+            image_hash = dhash(path)
+        except OSError as e:
+            print(f"  ⚠ Bild konnte nicht gehasht werden ({path}): {e}")
+            return path
+
+        with self._lock:
+            entries = self._load()
+            for entry in entries:
+                if hamming(int(entry["dhash"], 16), image_hash) <= DUPLICATE_DISTANCE:
+                    print(f"  ♻ Beinahe-Duplikat von {os.path.basename(entry['path'])} - verwende vorhandenes Bild")
+                    os.remove(path)
+                    return entry["path"]
+
+            os.makedirs(self.directory, exist_ok=True)
+            target = os.path.join(self.directory, f"{image_hash:016x}{os.path.splitext(path)[1]}")
+            shutil.move(path, target)
+            entries.append({"path": target, "dhash": f"{image_hash:016x}", "keywords": keywords,
+                            "style": style, "colors": colors, "created": time.time()})
+            try:
+                self._save(entries)
+            except OSError as e:
+                print(f"  ⚠ Bild-Bibliothek konnte nicht gespeichert werden: {e}")
+            return target
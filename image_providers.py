@@ -2,16 +2,27 @@ import os
 import requests
 import json
 import uuid
+from singleflight import SingleFlight, make_key
 
 # Webhook & Token aus .env laden
 N8N_WEBHOOK_URL = os.environ.get("N8N_WEBHOOK_URL")
 N8N_AUTH_TOKEN = os.environ.get("N8N_AUTH_TOKEN")
 
+# Fallback-Bild bei API-Fehlern (wird nicht als Ergebnis gecacht)
+PLACEHOLDER_IMAGE_PATH = "resource/Gemini_Generated_Image_yj7jhnyj7jhnyj7j.png"
+
+GURKLI_API_URL = "https://langchain.gurk.li/generate-image"
+# Zielordner für heruntergeladene Bilder (geteilt mit App und Bild-Bibliothek)
+IMAGE_DIR = "storage"
+
+# Gleichzeitige Anfragen mit identischem Payload erzeugen nur ein Bild
+gurkli_flight = SingleFlight("gurkli")
+
 def get_local_error_placeholder():
     """
     Gibt den Pfad zum lokalen Fallback-Bild zurück.
     """
-    placeholder_path = "resource/Gemini_Generated_Image_yj7jhnyj7jhnyj7j.png"
+    placeholder_path = PLACEHOLDER_IMAGE_PATH
     print(f"--> API-Fehler. Verwende lokalen Platzhalter: {placeholder_path}")
     # Prüfen, ob die Datei existiert, um Fehler zu vermeiden
     if os.path.exists(placeholder_path):
@@ -35,8 +46,6 @@ def get_image_from_gurkli(slide_data):
     - ai_model: "auto" (=flux) | "flux" | "banana"
     - colors: {"primary": "#hex", "secondary": "#hex"}
     """
-    GURKLI_API_URL = "https://langchain.gurk.li/generate-image"
-
     # Convert BulletItem objects to dictionaries
     bullets_as_dicts = [b.model_dump() for b in slide_data.bullets]
     # Convert Source objects to dictionaries
@@ -63,6 +72,27 @@ def get_image_from_gurkli(slide_data):
         "colors": colors_dict
     }
 
+    # Gleicher Payload gleichzeitig: ein Abruf, aber jeder Aufrufer bekommt seine eigene Datei
+    # (die Bild-Bibliothek verschiebt bzw. löscht sie beim Übernehmen)
+    image_bytes = gurkli_flight.do(make_key(payload), lambda: _request_gurkli_image(payload))
+    if image_bytes is None:
+        return get_local_error_placeholder()
+
+    safe_name = "slide_img"
+    if image_keywords:
+        safe_name = "".join(x for x in image_keywords[0] if x.isalnum())
+
+    # Eindeutiger Name: Bilder werden parallel abgerufen (Prefetch)
+    filename = f"img_{safe_name}_{uuid.uuid4().hex[:8]}_gurkli.jpg"
+    path = os.path.join(IMAGE_DIR, filename)
+
+    with open(path, "wb") as f:
+        f.write(image_bytes)
+    return path
+
+
+def _request_gurkli_image(payload):
+    """Ein Aufruf der gurk.li API inkl. Download. Gibt die Bilddaten zurück (None bei Fehlern)."""
     print("\n" + "="*40)
     print(f"--> DEBUG: SENDE DIESES JSON AN gurk.li:")
     print(json.dumps(payload, indent=2, ensure_ascii=False))
@@ -87,29 +117,20 @@ def get_image_from_gurkli(slide_data):
             image_url = response_data.get("url")
             if not image_url:
                 print("gurk.li Fehler: Kein 'url' Feld im JSON gefunden.")
-                return get_local_error_placeholder()
+                return None
 
             print(f"--> Lade Bild von URL: {image_url[:50]}...")
             image_response = requests.get(image_url, timeout=30)
 
             if image_response.status_code == 200:
-                safe_name = "slide_img"
-                if image_keywords:
-                    safe_name = "".join(x for x in image_keywords[0] if x.isalnum())
-
-                filename = f"img_{safe_name}_gurkli.jpg"
-                path = os.path.join("storage", filename)
-
-                with open(path, "wb") as f:
-                    f.write(image_response.content)
-                return path
+                return image_response.content
             else:
                 print(f"Fehler beim Download des Bildes von gurk.li: {image_response.status_code}")
-                return get_local_error_placeholder()
+                return None
         else:
             print(f"gurk.li Fehler: {response.status_code} - {response.text}")
-            return get_local_error_placeholder()
+            return None
 
     except Exception as e:
         print(f"gurk.li Exception: {e}")
-        return get_local_error_placeholder()
\ No newline at end of file
+        return None
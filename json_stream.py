@@ -0,0 +1,60 @@
+"""
+Inkrementeller Parser für gestreamte JSON-Antworten eines LLM.
+
+Das Modell liefert z.B. {"slides": [{...}, {...}, ...]} in beliebig kleinen
+Text-Stücken. IncrementalArrayParser meldet jedes Objekt des Arrays unter
+array_key, sobald seine schliessende Klammer angekommen ist - der Rest der
+Antwort muss dafür noch nicht da sein. Markdown-Codeblöcke um das JSON stören
+nicht, weil erst ab dem Schlüssel gesucht wird.
+"""
+import json
+import re
+
+
+class IncrementalArrayParser:
+    def __init__(self, array_key="slides"):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(array_key))
+        self.buffer = ""
+        self._pos = None  # Scan-Position, sobald das Array gefunden ist
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escape = False
+        self.done = False
+
+    def feed(self, text):
+        """Nimmt ein weiteres Text-Stück an und gibt die neu vollständigen Objekte zurück."""
+        self.buffer += text
+        if self._pos is None:
+            match = self._key_pattern.search(self.buffer)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        objects = []
+        buffer = self.buffer
+        while self._pos < len(buffer) and not self.done:
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0 and char == "]":
+                    self.done = True  # Ende des Arrays
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._start is not None:
+                        objects.append(json.loads(buffer[self._start:self._pos + 1]))
+                        self._start = None
+            self._pos += 1
+        return objects
@@ -0,0 +1,78 @@
+"""
+Gemeinsame, lazy erzeugte LLM-Clients für Agent 1 und Agent 2.
+
+langchain_google_genai (inkl. google.genai) kostet beim Import weit über eine
+Sekunde. Deshalb wird weder beim Import von agent_logic/ppt_agent noch beim
+Start der App ein Client gebaut: get_llm() lädt .env, importiert LangChain und
+erzeugt den Client erst beim ersten LLM-Aufruf. Profile mit gleichem Modell und
+gleicher Temperatur teilen sich eine Instanz.
+
+Routing nach Aufrufart: Ein-Wort-Klassifikationen (Layout-Typ, Bildstil) laufen
+über das Profil "classifier" - das schnellste Modell mit kurzer Antwort und
+ohne Thinking. Bei ungültiger Antwort eskaliert ppt_agent auf "builder".
+Das Modell jedes Profils lässt sich per LLM_MODEL_<PROFIL> überschreiben
+(z.B. LLM_MODEL_CLASSIFIER=gemini-2.5-flash).
+"""
+import os
+import threading
+
+# Profil -> Modell-Parameter
+LLM_PROFILES = {
+    "planner": {"model": "gemini-2.5-flash", "temperature": 0.2},   # Agent 1: Planung, Zusammenfassungen
+    "builder": {"model": "gemini-2.5-flash", "temperature": 0.3},   # Agent 2: Farben, Eskalation (mehr Varianz)
+    "classifier": {"model": "gemini-2.5-flash-lite", "temperature": 0.3,  # Agent 2: Layout-Typ, Bildstil
+                   "max_output_tokens": 16, "thinking_budget": 0},
+}
+
+_clients = {}
+_client_profiles = {}
+_lock = threading.Lock()
+_env_loaded = False
+
+
+def load_env():
+    """.env einmal pro Prozess laden (python-dotenv ist optional)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        pass
+    else:
+        load_dotenv()
+    _env_loaded = True
+
+
+def profile_params(profile):
+    """Modell-Parameter des Profils inkl. Überschreibung per LLM_MODEL_<PROFIL>."""
+    params = dict(LLM_PROFILES[profile])
+    params["model"] = os.environ.get(f"LLM_MODEL_{profile.upper()}", params["model"])
+    return params
+
+
+def get_llm(profile):
+    """Chat-Modell für das Profil (beim ersten Aufruf erzeugt, danach geteilt)."""
+    load_env()
+    params = profile_params(profile)
+    key = tuple(sorted(params.items()))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        if key not in _clients:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            _clients[key] = ChatGoogleGenerativeAI(
+                google_api_key=os.environ.get("GOOGLE_API_KEY"),
+                # Wiederholungen übernimmt llm_scheduler (mit gemeinsamer Pause für alle Aufrufe)
+                max_retries=0,
+                **params
+            )
+            _client_profiles[id(_clients[key])] = profile
+        return _clients[key]
+
+
+def profile_of(llm):
+    """Profil, für das der Client erzeugt wurde (None für fremde Clients, z.B. Mocks in Tests)."""
+    return _client_profiles.get(id(llm))
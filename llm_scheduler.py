@@ -0,0 +1,282 @@
+"""
+Gemeinsamer Scheduler vor allen LLM-Aufrufen (Rate-Limit, Priorität, Retry).
+
+Alle Aufrufe über llm_usage.invoke_llm/stream_llm holen sich vorher einen Slot:
+
+- Token-Buckets für Requests und Input-Tokens pro Minute (LLM_RPM, LLM_TPM).
+  Die Prompt-Tokens werden vorab geschätzt und nach der Antwort mit den echten
+  Input-Tokens verrechnet.
+- Prioritäten: wartende Aufrufe werden strikt nach Priorität und dann in
+  Ankunftsreihenfolge bedient. Planung in der App kommt vor Layout/Bildstil,
+  alles aus `with llm_priority(PRIORITY_BATCH):` (Batch-Jobs) kommt zuletzt.
+- Quota-Fehler (429 / RESOURCE_EXHAUSTED) und kurzzeitige Ausfälle werden mit
+  exponentiellem Backoff wiederholt. Der Backoff pausiert den ganzen Scheduler,
+  damit nicht alle wartenden Aufrufe gleichzeitig erneut ins Limit laufen.
+- metrics() liefert Warteschlange, Wartezeiten und Retries.
+- aacquire()/arun() sind die asyncio-Varianten (für ainvoke_llm) und teilen
+  sich die Warteschlange mit den synchronen Aufrufen.
+
+Der Scheduler gilt pro Prozess - die App bedient alle Sessions aus einem
+Prozess, batch_generate alle Jobs aus einem.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+LLM_RPM = int(os.environ.get("LLM_RPM", 1000))
+LLM_TPM = int(os.environ.get("LLM_TPM", 1_000_000))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 5))
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+ASYNC_POLL_SECONDS = 0.05
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_DEFAULT: "default", PRIORITY_BATCH: "batch"}
+
+# Aufrufe, auf die ein Benutzer direkt wartet
+CALL_PRIORITIES = {
+    "plan": PRIORITY_INTERACTIVE,
+    "plan_outline": PRIORITY_INTERACTIVE,
+    "plan_stream": PRIORITY_INTERACTIVE,
+    "replan": PRIORITY_INTERACTIVE,
+    "summarize": PRIORITY_INTERACTIVE,
+}
+
+_priority_floor = contextvars.ContextVar("llm_priority_floor", default=PRIORITY_INTERACTIVE)
+
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Stuft alle LLM-Aufrufe im Block (auch in kopierten Kontexten) mindestens auf priority herab."""
+    token = _priority_floor.set(priority)
+    try:
+        yield
+    finally:
+        _priority_floor.reset(token)
+
+
+def priority_for(call):
+    return max(CALL_PRIORITIES.get(call, PRIORITY_DEFAULT), _priority_floor.get())
+
+
+def is_retryable(exc):
+    """Quota-Überschreitung oder vorübergehender Ausfall des Modells."""
+    text = f"{type(exc).__name__} {exc}"
+    return any(marker in text for marker in ("429", "RESOURCE_EXHAUSTED", "ResourceExhausted", "rate limit",
+                                             "503", "UNAVAILABLE", "ServiceUnavailable", "DEADLINE_EXCEEDED"))
+
+
+class TokenBucket:
+    """Füllt sich kontinuierlich mit rate_per_minute auf (höchstens capacity); darf ins Minus gehen."""
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = float(self.capacity)
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        self._refill()
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def available(self):
+        self._refill()
+        return self.level
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+
+class LLMScheduler:
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, max_retries=LLM_MAX_RETRIES, burst=None):
+        """
+        Args:
+            rpm / tpm: Requests bzw. Input-Tokens pro Minute (Quota des Modells)
+            max_retries: Wiederholungen pro Aufruf bei Quota-Fehlern
+            burst: maximale Anzahl Requests am Stück (Standard: rpm)
+        """
+        self.requests = TokenBucket(rpm, capacity=burst)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._stats = {"admitted": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "retries": 0, "gave_up": 0}
+
+    def _admit(self, entry, tokens):
+        """
+        Unter self._cond: nimmt den Aufruf an, wenn er vorne steht und die Buckets reichen.
+        Returns: 0 bei Annahme, sonst Sekunden bis zum nächsten Versuch (None = auf notify warten)
+        """
+        if self._waiting[0] != entry:
+            return None
+        timeout = max(self.requests.wait_time(1), self.tokens.wait_time(tokens),
+                      self._paused_until - time.monotonic())
+        if timeout > 0:
+            return timeout
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        return 0
+
+    def _leave(self, entry, start):
+        """Unter self._cond: Eintrag aus der Warteschlange nehmen. Gibt die Wartezeit (ms) zurück."""
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+        return round((time.monotonic() - start) * 1000, 1)
+
+    def _count(self, wait_ms):
+        self._stats["admitted"] += 1
+        self._stats["wait_ms_total"] += wait_ms
+        self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+
+    def acquire(self, priority, tokens):
+        """Blockiert, bis der Aufruf an der Reihe ist und die Buckets es erlauben. Gibt die Wartezeit (ms) zurück."""
+        # Ein einzelner Prompt über dem Minutenlimit soll nicht ewig warten
+        tokens = min(tokens, self.tokens.capacity)
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while (timeout := self._admit(entry, tokens)) != 0:
+                    self._cond.wait(timeout)
+            finally:
+                wait_ms = self._leave(entry, start)
+            self._count(wait_ms)
+        return wait_ms
+
+    async def aacquire(self, priority, tokens):
+        """
+        acquire() für asyncio: wartet mit asyncio.sleep statt den Thread (und damit
+        den Event-Loop) zu blockieren. Synchrone und asynchrone Aufrufer teilen sich
+        dieselbe Warteschlange.
+        """
+        tokens = min(tokens, self.tokens.capacity)
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+        try:
+            while True:
+                with self._cond:
+                    timeout = self._admit(entry, tokens)
+                if timeout == 0:
+                    break
+                # Kein notify im Event-Loop - wer nicht vorne steht, fragt regelmässig nach
+                await asyncio.sleep(min(timeout, ASYNC_POLL_SECONDS) if timeout is not None else ASYNC_POLL_SECONDS)
+        finally:
+            with self._cond:
+                wait_ms = self._leave(entry, start)
+        with self._cond:
+            self._count(wait_ms)
+        return wait_ms
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Verrechnet die echten Input-Tokens mit der Schätzung aus acquire()."""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self.tokens.take(actual_tokens - min(estimated_tokens, self.tokens.capacity))
+
+    def should_retry(self, exc, attempt):
+        """True bei Quota-Fehler/Ausfall, solange Wiederholungen übrig sind."""
+        if not is_retryable(exc):
+            return False
+        if attempt >= self.max_retries:
+            with self._cond:
+                self._stats["gave_up"] += 1
+            return False
+        return True
+
+    def backoff(self, attempt):
+        """Pausiert alle Aufrufe nach einem Quota-Fehler (exponentiell, mit Jitter)."""
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5)
+        with self._cond:
+            self._stats["retries"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._cond.notify_all()
+        print(f"  ⚠ LLM-Quota erreicht - neuer Versuch in {delay:.1f} s (Versuch {attempt + 2})")
+        return delay
+
+    def run(self, call, tokens, fn, info=None):
+        """
+        Führt fn() mit Slot aus und wiederholt es bei Quota-Fehlern.
+
+        Args:
+            call: Art des Aufrufs (bestimmt mit llm_priority die Priorität)
+            tokens: geschätzte Input-Tokens
+            info: optionales dict, in dem "queue_ms" und "retries" mitgezählt werden
+                  (auch wenn fn am Ende fehlschlägt)
+
+        Returns:
+            Ergebnis von fn()
+        """
+        info = info if info is not None else {}
+        info.setdefault("queue_ms", 0.0)
+        info.setdefault("retries", 0)
+        priority = priority_for(call)
+        for attempt in itertools.count():
+            info["queue_ms"] += self.acquire(priority, tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    raise
+                info["retries"] += 1
+                # Die Pause gilt für alle; danach wartet der Aufruf erneut in der Warteschlange
+                self.backoff(attempt)
+
+    async def arun(self, call, tokens, coro_fn, info=None):
+        """run() für asyncio: coro_fn() liefert bei jedem Versuch eine neue Coroutine."""
+        info = info if info is not None else {}
+        info.setdefault("queue_ms", 0.0)
+        info.setdefault("retries", 0)
+        priority = priority_for(call)
+        for attempt in itertools.count():
+            info["queue_ms"] += await self.aacquire(priority, tokens)
+            try:
+                return await coro_fn()
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    raise
+                info["retries"] += 1
+                self.backoff(attempt)
+
+    def metrics(self):
+        with self._cond:
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            admitted = self._stats["admitted"]
+            return {
+                "waiting": waiting,
+                "admitted": admitted,
+                "avg_wait_ms": round(self._stats["wait_ms_total"] / admitted, 1) if admitted else 0.0,
+                "max_wait_ms": round(self._stats["wait_ms_max"], 1),
+                "retries": self._stats["retries"],
+                "gave_up": self._stats["gave_up"],
+                "requests_available": round(self.requests.available(), 1),
+                "tokens_available": round(self.tokens.available()),
+                "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            }
+
+
+# Ein Scheduler pro Prozess für alle Jobs und Sessions
+scheduler = LLMScheduler()
@@ -0,0 +1,275 @@
+"""
+Nutzungs-Protokoll für alle LLM-Aufrufe.
+
+invoke_llm() ersetzt direkte llm.invoke()-Aufrufe: es misst die Latenz, zählt
+die Prompt-Tokens lokal, übernimmt die tatsächlichen Input-/Output-Tokens aus
+usage_metadata (falls das Modell sie liefert) und schreibt pro Aufruf eine
+JSON-Zeile nach storage/llm_usage.jsonl. ainvoke_llm() ist dasselbe für
+asyncio-Code (llm.ainvoke).
+
+stream_llm() macht dasselbe für gestreamte Antworten und erfasst zusätzlich
+die Zeit bis zum ersten Token.
+
+Alle laufen über den gemeinsamen llm_scheduler (Rate-Limit, Priorität,
+Retry bei Quota-Fehlern); Wartezeit in der Queue und Retries stehen mit im Log.
+Jede Zeile nennt das Profil ("tier") aus llm_clients; die Job-Summe enthält
+Aufrufe und LLM-Zeit pro Tier.
+
+Mehrere Aufrufe lassen sich mit `with usage_job("plan"):` zu einem Job
+zusammenfassen; am Ende wird eine Summenzeile geschrieben und ausgegeben.
+Für Generatoren, deren Verbraucher zwischen den Elementen selbst LLM-Aufrufe
+macht (Plan-Stream -> PPT-Pipeline), gibt es usage_job_iter().
+
+LLM_USAGE_LOG="" schaltet das Schreiben ab.
+"""
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+from llm_clients import profile_of
+from llm_scheduler import priority_for, scheduler
+from prompt_builder import count_tokens
+
+USAGE_LOG_PATH = os.environ.get("LLM_USAGE_LOG", os.path.join("storage", "llm_usage.jsonl"))
+
+_current_job = contextvars.ContextVar("llm_usage_job", default=None)
+_write_lock = threading.Lock()
+
+
+def _write(record):
+    if not USAGE_LOG_PATH:
+        return
+    try:
+        directory = os.path.dirname(USAGE_LOG_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _write_lock, open(USAGE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"  ⚠ LLM-Nutzung konnte nicht protokolliert werden: {e}")
+
+
+def _usage_of(message):
+    usage = getattr(message, "usage_metadata", None)
+    if isinstance(usage, dict):
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    return None, None
+
+
+def _model_name(llm):
+    model = getattr(llm, "model", None)
+    return model if isinstance(model, str) else type(llm).__name__
+
+
+@contextlib.contextmanager
+def usage_job(name):
+    """
+    Fasst alle LLM-Aufrufe im Block zu einem Job zusammen (auch über asyncio-Tasks
+    hinweg). Auch als Decorator nutzbar; verschachtelte Jobs zählen zum äussersten.
+    """
+    outer = _current_job.get()
+    if outer is not None:
+        yield outer
+        return
+
+    job = {"job_id": uuid.uuid4().hex[:12], "job": name, "calls": 0, "prompt_tokens": 0,
+           "input_tokens": 0, "output_tokens": 0, "latency_ms": 0.0, "tiers": {}}
+    token = _current_job.set(job)
+    start = time.perf_counter()
+    try:
+        yield job
+    finally:
+        _current_job.reset(token)
+        job["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        job["latency_ms"] = round(job["latency_ms"], 1)
+        for tier in job["tiers"].values():
+            tier["latency_ms"] = round(tier["latency_ms"], 1)
+        _write({"type": "job", "ts": time.time(), **job})
+        print(f"📊 LLM-Nutzung '{name}': {job['calls']} Aufrufe, {job['input_tokens'] or job['prompt_tokens']} in / "
+              f"{job['output_tokens']} out Tokens, {job['latency_ms'] / 1000:.1f} s LLM-Zeit")
+        if len(job["tiers"]) > 1:
+            print("   pro Tier: " + ", ".join(f"{name} {t['calls']}x / {t['latency_ms'] / 1000:.1f} s"
+                                             for name, t in sorted(job["tiers"].items())))
+
+
+def usage_job_iter(name, iterable):
+    """
+    usage_job für Generatoren: der Job bleibt vom ersten bis zum letzten Element
+    offen (inkl. Code nach dem letzten yield), gilt aber nur für den Generator -
+    nicht für den Verbraucher zwischen zwei Elementen. Dazu läuft der Generator
+    in einer eigenen Kopie des Kontexts; ein äusserer Job des Verbrauchers zählt
+    dort nicht, die Aufrufe bilden einen eigenen Job.
+    """
+    def body():
+        with usage_job(name):
+            yield from iterable
+
+    inner = body()
+    context = contextvars.copy_context()
+    context.run(_current_job.set, None)
+    try:
+        while True:
+            try:
+                item = context.run(next, inner)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        # Verbraucher hat abgebrochen: Job trotzdem abschliessen
+        context.run(inner.close)
+
+
+def _record_call(llm, call, prompt_tokens, latency_ms, input_tokens, output_tokens, ok, **extra):
+    job = _current_job.get()
+    tier = profile_of(llm)
+    record = {
+        "type": "call",
+        "ts": time.time(),
+        "job_id": job["job_id"] if job else None,
+        "job": job["job"] if job else None,
+        "call": call,
+        "model": _model_name(llm),
+        "tier": tier,
+        "prompt_tokens": prompt_tokens,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "latency_ms": round(latency_ms, 1),
+        "ok": ok,
+        **extra,
+    }
+    _write(record)
+    if job:
+        job["calls"] += 1
+        job["prompt_tokens"] += prompt_tokens
+        job["input_tokens"] += input_tokens or 0
+        job["output_tokens"] += output_tokens or 0
+        job["latency_ms"] += latency_ms
+        tier_stats = job["tiers"].setdefault(tier or "other", {"calls": 0, "latency_ms": 0.0})
+        tier_stats["calls"] += 1
+        tier_stats["latency_ms"] += latency_ms
+
+
+def invoke_llm(llm, prompt, call, schema=None):
+    """
+    Ruft das LLM auf und protokolliert Tokens und Latenz.
+
+    Args:
+        llm: LangChain Chat-Modell
+        prompt: Prompt-Text
+        call: Art des Aufrufs (z.B. "plan", "layout", "image_style") für die Auswertung
+        schema: Optionales Pydantic-Modell für Structured Output
+
+    Returns:
+        AIMessage (ohne schema) bzw. die geparste schema-Instanz
+    """
+    prompt_tokens = count_tokens(prompt)
+    start = time.perf_counter()
+    ok = False
+    raw = None
+    scheduling = {}
+
+    def attempt():
+        nonlocal raw
+        if schema is None:
+            raw = llm.invoke(prompt)
+            return raw
+        result, raw = _unpack_structured(llm.with_structured_output(schema, include_raw=True).invoke(prompt))
+        return result
+
+    try:
+        result = scheduler.run(call, prompt_tokens, attempt, info=scheduling)
+        ok = True
+        return result
+    finally:
+        input_tokens, output_tokens = _usage_of(raw)
+        scheduler.settle(prompt_tokens, input_tokens)
+        _record_call(llm, call, prompt_tokens, (time.perf_counter() - start) * 1000,
+                     input_tokens, output_tokens, ok, **scheduling)
+
+
+async def ainvoke_llm(llm, prompt, call, schema=None):
+    """
+    Asynchrone Variante von invoke_llm (llm.ainvoke). Wartet im Scheduler ohne
+    Thread, sodass viele Aufrufe in einem Event-Loop nebeneinander laufen können.
+    """
+    prompt_tokens = count_tokens(prompt)
+    start = time.perf_counter()
+    ok = False
+    raw = None
+    scheduling = {}
+
+    async def attempt():
+        nonlocal raw
+        if schema is None:
+            raw = await llm.ainvoke(prompt)
+            return raw
+        result, raw = _unpack_structured(await llm.with_structured_output(schema, include_raw=True).ainvoke(prompt))
+        return result
+
+    try:
+        result = await scheduler.arun(call, prompt_tokens, attempt, info=scheduling)
+        ok = True
+        return result
+    finally:
+        input_tokens, output_tokens = _usage_of(raw)
+        scheduler.settle(prompt_tokens, input_tokens)
+        _record_call(llm, call, prompt_tokens, (time.perf_counter() - start) * 1000,
+                     input_tokens, output_tokens, ok, **scheduling)
+
+
+def _unpack_structured(result):
+    """(geparstes Ergebnis, rohe Antwort) aus with_structured_output(include_raw=True)."""
+    if not (isinstance(result, dict) and "parsed" in result):
+        return result, None
+    if result.get("parsing_error") is not None:
+        raise result["parsing_error"]
+    return result["parsed"], result.get("raw")
+
+
+def stream_llm(llm, prompt, call):
+    """
+    Wie invoke_llm, aber als Generator über die Text-Stücke der Antwort.
+    Protokolliert wird nach dem letzten Stück (bzw. bei Abbruch des Verbrauchers).
+    """
+    prompt_tokens = count_tokens(prompt)
+    start = time.perf_counter()
+    first_token_ms = None
+    input_tokens = output_tokens = None
+    ok = False
+    scheduling = {"queue_ms": 0.0, "retries": 0}
+    priority = priority_for(call)
+    try:
+        for attempt in itertools.count():
+            scheduling["queue_ms"] += scheduler.acquire(priority, prompt_tokens)
+            try:
+                for chunk in llm.stream(prompt):
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - start) * 1000, 1)
+                    chunk_in, chunk_out = _usage_of(chunk)
+                    # LangChain liefert die Nutzung pro Stück als Delta (wie beim Addieren der Chunks)
+                    if chunk_in is not None:
+                        input_tokens = (input_tokens or 0) + chunk_in
+                    if chunk_out is not None:
+                        output_tokens = (output_tokens or 0) + chunk_out
+                    content = chunk.content
+                    if isinstance(content, list):
+                        content = "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+                    if content:
+                        yield content
+                break
+            except Exception as e:
+                # Wiederholen nur, solange der Verbraucher noch nichts bekommen hat
+                if first_token_ms is not None or not scheduler.should_retry(e, attempt):
+                    raise
+                scheduling["retries"] += 1
+                scheduler.backoff(attempt)
+        ok = True
+    finally:
+        scheduler.settle(prompt_tokens, input_tokens)
+        _record_call(llm, call, prompt_tokens, (time.perf_counter() - start) * 1000,
+                     input_tokens, output_tokens, ok, first_token_ms=first_token_ms, **scheduling)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Lastgenerator für den MCP Server.
+
+Öffnet N gleichzeitige SSE-Sessions (oder mit --transport http Streamable-HTTP-
+Clients) gegen mcp_server:app und spielt einen gewichteten Mix aus
+list_templates, analyze_template, get_template_file und read_pdf_file ab. Berichtet Durchsatz, Tail-Latenzen pro Tool sowie den
+Event-Loop-Lag des Servers (über /metrics) und des Generators selbst.
+
+Beispiele:
+    # gegen laufenden Server (docker-compose, Port 8010/8020 auf dem Host)
+    python loadtest_mcp.py --url http://localhost:8010/sse --clients 20 --duration 60 \\
+        --pdf bericht.pdf --pdf paper.pdf
+
+    # Server lokal als Subprozess starten (Templates/PDFs aus dem Repo)
+    python loadtest_mcp.py --spawn --clients 10 --duration 30 --pdf 20853739.pdf
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+from mcp_client import HttpToolSession
+
+DEFAULT_MIX = "list_templates=40,analyze_template=25,get_template_file=15,read_pdf_file=20"
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.session_setup = []
+        self.session_failures = 0
+
+    def record(self, tool, seconds, ok):
+        self.latencies.setdefault(tool, []).append(seconds)
+        if not ok:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+
+    def summary(self, duration):
+        tools = {}
+        total = 0
+        for tool, values in sorted(self.latencies.items()):
+            total += len(values)
+            tools[tool] = {
+                "calls": len(values),
+                "errors": self.errors.get(tool, 0),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1),
+            }
+        all_values = [v for values in self.latencies.values() for v in values]
+        return {
+            "duration_s": round(duration, 1),
+            "calls": total,
+            "throughput_rps": round(total / duration, 2) if duration else 0.0,
+            "p50_ms": round(percentile(all_values, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(all_values, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(all_values, 0.99) * 1000, 1),
+            "session_setup_p95_ms": round(percentile(self.session_setup, 0.95) * 1000, 1),
+            "session_failures": self.session_failures,
+            "tools": tools,
+        }
+
+
+def build_arguments(tool, templates, pdfs):
+    if tool in ("analyze_template", "get_template_file", "get_template_path"):
+        return {"template_name": random.choice(templates)}
+    if tool == "read_pdf_file":
+        return {"filename": random.choice(pdfs)}
+    return {}
+
+
+async def run_client(url, mix, templates, pdfs, deadline, stats):
+    tools = [t for t in mix if t != "read_pdf_file" or pdfs]
+    weights = [mix[t] for t in tools]
+    start = time.perf_counter()
+    try:
+        async with sse_client(url) as streams:
+            async with ClientSession(streams[0], streams[1]) as session:
+                await session.initialize()
+                stats.session_setup.append(time.perf_counter() - start)
+
+                while time.monotonic() < deadline:
+                    tool = random.choices(tools, weights)[0]
+                    call_start = time.perf_counter()
+                    try:
+                        result = await session.call_tool(tool, arguments=build_arguments(tool, templates, pdfs))
+                        text = result.content[0].text if result.content else ""
+                        ok = not result.isError and not text.startswith("Fehler")
+                    except Exception:
+                        ok = False
+                    stats.record(tool, time.perf_counter() - call_start, ok)
+    except Exception as e:
+        stats.session_failures += 1
+        print(f"  ⚠ Session fehlgeschlagen: {e}")
+
+
+async def run_http_client(url, mix, templates, pdfs, deadline, stats):
+    """Wie run_client, aber über Streamable HTTP: ein POST pro Tool-Aufruf, keine Session."""
+    tools = [t for t in mix if t != "read_pdf_file" or pdfs]
+    weights = [mix[t] for t in tools]
+    async with httpx.AsyncClient(timeout=300) as client:
+        session = HttpToolSession(client, url)
+        while time.monotonic() < deadline:
+            tool = random.choices(tools, weights)[0]
+            call_start = time.perf_counter()
+            try:
+                text = await session.call_tool(tool, build_arguments(tool, templates, pdfs))
+                ok = not text.startswith("Fehler")
+            except Exception:
+                ok = False
+            stats.record(tool, time.perf_counter() - call_start, ok)
+
+
+async def probe_local_lag(deadline, interval=0.05):
+    """Lag des Generator-Loops - ist er hoch, misst der Test den Client statt den Server."""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while time.monotonic() < deadline:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - start - interval)
+    return worst
+
+
+async def discover_templates(url):
+    async with sse_client(url) as streams:
+        async with ClientSession(streams[0], streams[1]) as session:
+            await session.initialize()
+            result = await session.call_tool("list_templates", arguments={})
+            return json.loads(result.content[0].text).get("templates", [])
+
+
+async def fetch_metrics(metrics_url, reset=False):
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(metrics_url, params={"reset": "1"} if reset else None)
+            return response.json()
+    except Exception as e:
+        print(f"  ⚠ /metrics nicht erreichbar: {e}")
+        return None
+
+
+async def run_load(args):
+    mix = parse_mix(args.mix)
+    metrics_url = args.url.rsplit("/sse", 1)[0] + "/metrics"
+
+    templates = args.template or await discover_templates(args.url)
+    if not templates:
+        mix.pop("analyze_template", None)
+        mix.pop("get_template_file", None)
+    if not args.pdf:
+        print("  ⚠ Keine --pdf angegeben - read_pdf_file wird übersprungen")
+
+    print(f"--> {args.clients} Clients ({args.transport}), {args.duration}s, Mix: {mix}")
+    await fetch_metrics(metrics_url, reset=True)
+
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = time.monotonic() + args.duration
+    clients = []
+    for _ in range(args.clients):
+        if args.transport == "http":
+            client = run_http_client(args.url.rsplit("/sse", 1)[0] + "/mcp", mix, templates, args.pdf, deadline, stats)
+        else:
+            client = run_client(args.url, mix, templates, args.pdf, deadline, stats)
+        clients.append(asyncio.create_task(client))
+        if args.ramp_up:
+            await asyncio.sleep(args.ramp_up / args.clients)
+    local_lag = await probe_local_lag(deadline)
+    await asyncio.gather(*clients)
+    duration = time.perf_counter() - start
+
+    summary = stats.summary(duration)
+    summary["clients"] = args.clients
+    summary["transport"] = args.transport
+    summary["generator_max_lag_ms"] = round(local_lag * 1000, 1)
+    server_metrics = await fetch_metrics(metrics_url)
+    if server_metrics:
+        summary["server"] = server_metrics
+    return summary
+
+
+def print_summary(summary):
+    print("\n" + "=" * 60)
+    print(f"Clients: {summary['clients']}  Dauer: {summary['duration_s']}s  Calls: {summary['calls']}")
+    print(f"Durchsatz: {summary['throughput_rps']} req/s   "
+          f"p50/p95/p99: {summary['p50_ms']}/{summary['p95_ms']}/{summary['p99_ms']} ms")
+    print(f"Session-Aufbau p95: {summary['session_setup_p95_ms']} ms   "
+          f"Fehlgeschlagene Sessions: {summary['session_failures']}")
+    print("-" * 60)
+    for tool, row in summary["tools"].items():
+        print(f"  {tool:20s} {row['calls']:6d} calls {row['errors']:4d} err  "
+              f"p50 {row['p50_ms']:8.1f}  p95 {row['p95_ms']:8.1f}  p99 {row['p99_ms']:8.1f}  max {row['max_ms']:8.1f} ms")
+    print("-" * 60)
+    lag = summary.get("server", {}).get("loop_lag")
+    if lag:
+        print(f"Server Event-Loop-Lag: p50 {lag['p50_ms']} ms  p99 {lag['p99_ms']} ms  max {lag['max_ms']} ms")
+    print(f"Generator Event-Loop-Lag (max): {summary['generator_max_lag_ms']} ms")
+    print("=" * 60)
+
+
+def spawn_server(port):
+    env = dict(os.environ)
+    env.setdefault("MCP_TEMPLATES_DIR", os.path.abspath("ppt_templates"))
+    env.setdefault("MCP_STORAGE_DIR", os.path.abspath("data"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mcp_server:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("MCP Server konnte nicht gestartet werden")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lastgenerator für den MCP Server (SSE)")
+    parser.add_argument("--url", default=os.environ.get("MCP_SERVER_URL", "http://localhost:8010/sse"))
+    parser.add_argument("--clients", type=int, default=10, help="Anzahl gleichzeitiger SSE-Sessions")
+    parser.add_argument("--duration", type=float, default=30, help="Testdauer in Sekunden")
+    parser.add_argument("--ramp-up", type=float, default=0, help="Sekunden, über die die Clients gestartet werden")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Gewichteter Tool-Mix, z.B. 'list_templates=40,read_pdf_file=20'")
+    parser.add_argument("--pdf", action="append", default=[], help="PDF-Dateiname im Upload-Verzeichnis des Servers (mehrfach)")
+    parser.add_argument("--template", action="append", default=[], help="Template-Name (Default: alle vom Server)")
+    parser.add_argument("--transport", choices=["sse", "http"], default="sse",
+                        help="sse: eine Session pro Client, http: ein POST pro Aufruf (/mcp)")
+    parser.add_argument("--spawn", action="store_true", help="mcp_server:app lokal per uvicorn starten")
+    parser.add_argument("--port", type=int, default=8765, help="Port für --spawn")
+    parser.add_argument("--json", dest="json_path", help="Ergebnis zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        server = spawn_server(args.port)
+        args.url = f"http://127.0.0.1:{args.port}/sse"
+    try:
+        summary = asyncio.run(run_load(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print_summary(summary)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
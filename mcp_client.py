@@ -0,0 +1,114 @@
+"""
+Gemeinsamer MCP Client für Agent 1 und Agent 2.
+
+Der Server bietet zwei Transporte an:
+- Streamable HTTP (/mcp): jeder Tool-Aufruf ist ein einzelner POST mit JSON-Antwort
+- SSE (/sse + /messages): langlebiger Event-Stream plus separater POST pro Nachricht
+
+open_tool_session() nimmt HTTP, wenn der Server es anbietet, und fällt sonst auf
+SSE zurück. Beide Varianten liefern bei call_tool() den Text des ersten
+Content-Blocks (bzw. "" wenn keiner vorhanden ist) und werfen McpToolError,
+wenn der Server das Ergebnis als Fehler markiert (isError).
+
+MCP_TRANSPORT steuert die Wahl: "auto" (Standard), "http" oder "sse".
+"""
+import os
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+mcp_server_url = os.environ.get("MCP_SERVER_URL", "http://mcp-server:8000/sse")
+mcp_http_url = os.environ.get("MCP_HTTP_URL", mcp_server_url.rsplit("/sse", 1)[0] + "/mcp")
+MCP_TRANSPORT = os.environ.get("MCP_TRANSPORT", "auto")
+MCP_HTTP_TIMEOUT = float(os.environ.get("MCP_HTTP_TIMEOUT", 300))
+# Nach einer fehlgeschlagenen Erkennung wird HTTP erst nach dieser Zeit erneut geprüft
+MCP_PROBE_RETRY_SECONDS = float(os.environ.get("MCP_PROBE_RETRY_SECONDS", 30))
+
+# Ergebnis der Transport-Erkennung: ein Erfolg gilt für den ganzen Prozess, ein
+# Fehlschlag nur bis zum nächsten Versuch (Server beim App-Start evtl. noch nicht da)
+_http_available = False
+_http_probe_failed_at = None
+
+
+class McpToolError(Exception):
+    pass
+
+
+def _result_text(content, is_error):
+    """Text des ersten Content-Blocks; Tool-Fehler werden als McpToolError geworfen."""
+    text = content[0] if content else ""
+    if is_error:
+        raise McpToolError(text or "Tool-Aufruf fehlgeschlagen")
+    return text
+
+
+class HttpToolSession:
+    """Ein POST pro Tool-Aufruf - kein Stream-Aufbau, kein Initialize-Handshake (stateless Server)."""
+
+    def __init__(self, client, url):
+        self.client = client
+        self.url = url
+        self._ids = itertools.count(1)
+
+    async def _request(self, method, params):
+        response = await self.client.post(
+            self.url,
+            json={"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params},
+            headers={"Accept": "application/json, text/event-stream"},
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if "error" in payload:
+            raise McpToolError(payload["error"].get("message", str(payload["error"])))
+        return payload["result"]
+
+    async def call_tool(self, name, arguments):
+        result = await self._request("tools/call", {"name": name, "arguments": arguments})
+        content = [block.get("text", "") for block in result.get("content") or []]
+        return _result_text(content, result.get("isError"))
+
+
+class SseToolSession:
+    def __init__(self, session):
+        self.session = session
+
+    async def call_tool(self, name, arguments):
+        result = await self.session.call_tool(name, arguments=arguments)
+        return _result_text([getattr(block, "text", "") for block in result.content], result.isError)
+
+
+async def _probe_http(client):
+    """Prüft, ob der Server den Streamable-HTTP-Endpunkt anbietet (Fehlschläge nur kurz gemerkt)."""
+    global _http_available, _http_probe_failed_at
+    if _http_available:
+        return True
+    if _http_probe_failed_at is not None and time.monotonic() - _http_probe_failed_at < MCP_PROBE_RETRY_SECONDS:
+        return False
+    try:
+        await HttpToolSession(client, mcp_http_url)._request("tools/list", {})
+        _http_available = True
+    except (httpx.HTTPError, McpToolError, ValueError, KeyError):
+        print("--> MCP Client: Kein Streamable HTTP verfügbar - verwende SSE")
+        _http_probe_failed_at = time.monotonic()
+    return _http_available
+
+
+@asynccontextmanager
+async def open_tool_session():
+    """Öffnet eine Tool-Session über den schnellsten verfügbaren Transport."""
+    if MCP_TRANSPORT != "sse":
+        async with httpx.AsyncClient(timeout=MCP_HTTP_TIMEOUT) as client:
+            if MCP_TRANSPORT == "http" or await _probe_http(client):
+                yield HttpToolSession(client, mcp_http_url)
+                return
+
+    # MCP-SDK erst hier importieren: teuer und nur für den SSE-Fallback nötig
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+
+    async with sse_client(mcp_server_url) as streams:
+        async with ClientSession(streams[0], streams[1]) as session:
+            await session.initialize()
+            yield SseToolSession(session)
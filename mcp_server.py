@@ -1,20 +1,42 @@
 import os
 import json
+import time
+import asyncio
+import anyio
 import base64
+import contextlib
 import re # Added for regex parsing of placeholder types
+from pydantic import ValidationError
 from pypdf import PdfReader
 from pptx import Presentation
 from mcp.server import Server
 import mcp.types as types
 from mcp.server.sse import SseServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 from starlette.applications import Starlette
 from starlette.routing import Route
 from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from tool_dispatcher import ToolDispatcher, ToolPolicy, parse_tool_limits
+from session_broker import SqliteSessionBroker, make_worker_id
+from shared_cache import SharedFileCache
+from singleflight import SingleFlight, make_key
+from pdf_structure import extract_structured, render_structured
+from color_engine import extract_theme_colors
 
 # 1. Server definieren
 mcp = Server("pdf-and-template-service")
-STORAGE_DIR = "/uploads"  # PDF uploads (separate volume)
-TEMPLATES_DIR = "/data/templates"  # Templates (baked into image)
+STORAGE_DIR = os.environ.get("MCP_STORAGE_DIR", "/uploads")  # PDF uploads (separate volume)
+TEMPLATES_DIR = os.environ.get("MCP_TEMPLATES_DIR", "/data/templates")  # Templates (baked into image)
+
+# Erhöhen, wenn sich das Format der Template-Analyse ändert (alte Cache-Einträge werden ignoriert)
+TEMPLATE_ANALYSIS_VERSION = 2
+
+# Gemeinsamer Cache für Template-Analysen und PDF-Texte (von allen Workern/Replicas nutzbar)
+cache = SharedFileCache(
+    os.environ.get("MCP_CACHE_DIR", os.path.join(STORAGE_DIR, ".mcp_cache")),
+    enabled=os.environ.get("MCP_CACHE", "1") != "0"
+)
 
 # 2. Tool Definition
 @mcp.list_tools()
@@ -22,11 +44,13 @@ async def list_tools() -> list[types.Tool]:
     return [
         types.Tool(
             name="read_pdf_file",
-            description="Liest den Text aus einer PDF-Datei im Speicher.",
+            description="Liest den Text aus einer PDF-Datei im Speicher. Mit mode='structured' kommt ein kompakter Abschnittsbaum (ohne Kopf-/Fusszeilen, Seitenzahlen und Literaturliste) mit Seitenspannen.",
             inputSchema={
                 "type": "object",
                 "properties": {
-                    "filename": {"type": "string", "description": "Der Name der Datei (z.B. bericht.pdf)"}
+                    "filename": {"type": "string", "description": "Der Name der Datei (z.B. bericht.pdf)"},
+                    "mode": {"type": "string", "enum": ["raw", "structured", "json"], "description": "raw = Rohtext (Standard), structured = Abschnitte als Text, json = Abschnittsbaum als JSON"},
+                    "references": {"type": "string", "enum": ["drop", "condense", "keep"], "description": "Umgang mit dem Literaturverzeichnis im Modus structured/json (Standard: drop)"}
                 },
                 "required": ["filename"]
             }
@@ -134,154 +158,396 @@ def classify_layout(layout):
         print(f"    - Classified as: Other (fallback)")
         return "Other" # Default for complex or unhandled layouts
 
-@mcp.call_tool()
-async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
-    # PDF Tool
-    if name == "read_pdf_file":
-        filename = arguments.get("filename")
-        file_path = os.path.join(STORAGE_DIR, filename)
-        print(f"MCP Server: Lese Datei {file_path}...")
-
-        if not os.path.exists(file_path):
-            return [types.TextContent(
-                type="text",
-                text=f"Fehler: Datei {filename} nicht gefunden. (Pfad geprüft: {file_path})"
-            )]
-
-        try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-
-            full_text = f"--- INHALT VON {filename} ---\n{text}\n--- ENDE {filename} ---"
-            return [types.TextContent(type="text", text=full_text)]
+def extract_pdf_text(file_path):
+    """
+    Extrahiert den Rohtext aller Seiten einer PDF-Datei (Hot Path von read_pdf_file).
+    """
+    reader = PdfReader(file_path)
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() or ""
+    return text
 
-        except Exception as e:
-            return [types.TextContent(type="text", text=f"Fehler: {str(e)}")]
+def analyze_template_file(template_path, template_name):
+    """
+    Lädt ein Template und beschreibt alle Layouts inkl. Placeholders (Hot Path von analyze_template).
+    """
+    prs = Presentation(template_path)
+
+    # Analysiere Layouts
+    layouts_info = []
+    for idx, layout in enumerate(prs.slide_layouts):
+        placeholders_info = []
+        for ph in layout.placeholders:
+            placeholders_info.append({
+                "idx": ph.placeholder_format.idx,
+                "type": str(ph.placeholder_format.type),
+                "has_text_frame": ph.has_text_frame
+            })
+
+        layouts_info.append({
+            "index": idx,
+            "name": layout.name,
+            "classified_type": classify_layout(layout),
+            "placeholders": placeholders_info
+        })
+
+    return {
+        "template_name": template_name,
+        "slide_width_inches": round(prs.slide_width.inches, 2),
+        "slide_height_inches": round(prs.slide_height.inches, 2),
+        "total_layouts": len(prs.slide_layouts),
+        "theme_colors": extract_theme_colors(prs),
+        "layouts": layouts_info
+    }
+
+# Tool-Handler: synchron und auf Modulebene, damit der Dispatcher sie in einem
+# Thread- oder Prozess-Pool ausführen kann. Rückgabe ist immer der Antworttext.
+def tool_read_pdf_file(arguments):
+    filename = arguments.get("filename")
+    file_path = os.path.join(STORAGE_DIR, filename)
+    print(f"MCP Server: Lese Datei {file_path}...")
+
+    if not os.path.exists(file_path):
+        return f"Fehler: Datei {filename} nicht gefunden. (Pfad geprüft: {file_path})"
+
+    mode = arguments.get("mode", "raw")
+    references = arguments.get("references", "drop")
+    try:
+        if mode in ("structured", "json"):
+            doc = cache.get_or_compute(
+                cache.file_key("pdf_structured", file_path, references),
+                lambda: extract_structured(file_path, references=references)
+            )
+            if mode == "json":
+                return json.dumps({"filename": filename, **doc}, ensure_ascii=False)
+            return render_structured(filename, doc)
+
+        text = cache.get_or_compute(
+            cache.file_key("pdf_text", file_path),
+            lambda: extract_pdf_text(file_path)
+        )
+        return f"--- INHALT VON {filename} ---\n{text}\n--- ENDE {filename} ---"
+    except Exception as e:
+        return f"Fehler: {str(e)}"
+
+def tool_list_templates(arguments):
+    print("MCP Server: Liste Templates...")
+    try:
+        if not os.path.exists(TEMPLATES_DIR):
+            return "Fehler: Templates-Ordner nicht gefunden."
+
+        templates = [f for f in os.listdir(TEMPLATES_DIR) if f.endswith(('.pptx', '.potx'))]
+        templates.sort()
+
+        result = {
+            "count": len(templates),
+            "templates": templates
+        }
+        return json.dumps(result, indent=2)
+    except Exception as e:
+        return f"Fehler: {str(e)}"
+
+def tool_analyze_template(arguments):
+    template_name = arguments.get("template_name")
+    template_path = os.path.join(TEMPLATES_DIR, template_name)
+    print(f"MCP Server: Analysiere Template {template_path}...")
+
+    if not os.path.exists(template_path):
+        return f"Fehler: Template {template_name} nicht gefunden."
+
+    try:
+        analysis = cache.get_or_compute(
+            cache.file_key("template_analysis", template_path, TEMPLATE_ANALYSIS_VERSION),
+            lambda: analyze_template_file(template_path, template_name)
+        )
+        return json.dumps(analysis, indent=2)
+    except Exception as e:
+        return f"Fehler bei Template-Analyse: {str(e)}"
+
+def tool_get_template_path(arguments):
+    template_name = arguments.get("template_name")
+    template_path = os.path.join(TEMPLATES_DIR, template_name)
+
+    if os.path.exists(template_path):
+        return template_path
+    return f"Fehler: Template {template_name} nicht gefunden."
+
+def tool_get_template_file(arguments):
+    template_name = arguments.get("template_name")
+    template_path = os.path.join(TEMPLATES_DIR, template_name)
+    print(f"MCP Server: Lade Template-Datei {template_path}...")
+
+    if not os.path.exists(template_path):
+        return f"Fehler: Template {template_name} nicht gefunden."
+
+    try:
+        # Lese Template als Bytes und encode als Base64
+        with open(template_path, "rb") as f:
+            template_bytes = f.read()
+
+        # Base64 encoding für sicheren Transport über JSON/MCP
+        template_b64 = base64.b64encode(template_bytes).decode('utf-8')
+
+        # Sende als JSON mit Metadaten
+        result = {
+            "template_name": template_name,
+            "size_bytes": len(template_bytes),
+            "size_mb": round(len(template_bytes) / (1024 * 1024), 2),
+            "data": template_b64
+        }
+
+        print(f"  Template geladen: {result['size_mb']} MB")
+        return json.dumps(result)
+
+    except Exception as e:
+        return f"Fehler beim Laden des Templates: {str(e)}"
+
+TOOL_HANDLERS = {
+    "read_pdf_file": tool_read_pdf_file,
+    "list_templates": tool_list_templates,
+    "analyze_template": tool_analyze_template,
+    "get_template_path": tool_get_template_path,
+    "get_template_file": tool_get_template_file,
+}
+
+# CPU-lastiges Parsing (pypdf, python-pptx) läuft im Prozess-Pool, reine Datei-I/O im Thread-Pool.
+# Limits pro Tool lassen sich über MCP_TOOL_LIMITS überschreiben (z.B. "read_pdf_file=2,analyze_template=4").
+dispatcher = ToolDispatcher(
+    policies={
+        "read_pdf_file": ToolPolicy(kind="cpu", max_concurrency=4),
+        "analyze_template": ToolPolicy(kind="cpu", max_concurrency=4),
+        "list_templates": ToolPolicy(kind="io", max_concurrency=32),
+        "get_template_path": ToolPolicy(kind="io", max_concurrency=32),
+        "get_template_file": ToolPolicy(kind="io", max_concurrency=8),
+    },
+    cpu_workers=int(os.environ.get("MCP_CPU_WORKERS", os.cpu_count() or 2)),
+    io_workers=int(os.environ.get("MCP_IO_WORKERS", 16)),
+    limit_overrides=parse_tool_limits(os.environ.get("MCP_TOOL_LIMITS", "")),
+)
+
+# Alle Tools lesen nur - gleichzeitige identische Aufrufe (z.B. mehrere Benutzer mit
+# demselben Template bei kaltem Cache) laufen nur einmal durch den Dispatcher
+tool_flight = SingleFlight("mcp_tools")
 
-    # Template Tools
-    elif name == "list_templates":
-        print("MCP Server: Liste Templates...")
-        try:
-            if not os.path.exists(TEMPLATES_DIR):
-                return [types.TextContent(type="text", text="Fehler: Templates-Ordner nicht gefunden.")]
+@mcp.call_tool()
+async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
+    handler = TOOL_HANDLERS.get(name)
+    if handler is None:
+        raise ValueError(f"Unbekanntes Tool: {name}")
 
-            templates = [f for f in os.listdir(TEMPLATES_DIR) if f.endswith(('.pptx', '.potx'))]
-            templates.sort()
+    # Der Event Loop macht nur Protokoll-Handling - die eigentliche Arbeit läuft im Executor
+    text = await tool_flight.ado(make_key(name, arguments), lambda: dispatcher.run(name, handler, arguments))
+    return [types.TextContent(type="text", text=text)]
 
-            result = {
-                "count": len(templates),
-                "templates": templates
-            }
-            return [types.TextContent(type="text", text=json.dumps(result, indent=2))]
-        except Exception as e:
-            return [types.TextContent(type="text", text=f"Fehler: {str(e)}")]
+# 4. Web-Server Setup (DER KRITISCHE TEIL)
+sse = SseServerTransport("/messages")
 
-    elif name == "analyze_template":
-        template_name = arguments.get("template_name")
-        template_path = os.path.join(TEMPLATES_DIR, template_name)
-        print(f"MCP Server: Analysiere Template {template_path}...")
+# Sessions, deren SSE-Stream in diesem Worker läuft (session_id hex). Die ID steht im
+# "endpoint"-Event, das der Transport als erstes an den Client sendet (MCP-Protokoll).
+local_sessions = set()
+ENDPOINT_SESSION_PATTERN = re.compile(rb"session_id=([0-9a-f]{32})")
 
-        if not os.path.exists(template_path):
-            return [types.TextContent(type="text", text=f"Fehler: Template {template_name} nicht gefunden.")]
+async def handle_sse(request: Request):
+    # TRICK: Wir geben eine asynchrone Funktion zurück, statt direkt auszuführen.
+    # Starlette führt diese Funktion dann mit (scope, receive, send) aus.
+    async def asgi_app(scope, receive, send):
+        session = {}
+
+        async def track_session(message):
+            # Session erst anmelden, dann dem Client den Endpunkt schicken - sonst kann
+            # sein erster POST auf einem anderen Worker vor der Anmeldung ankommen
+            if "id" not in session and message.get("type") == "http.response.body":
+                match = ENDPOINT_SESSION_PATTERN.search(message.get("body", b""))
+                if match:
+                    session["id"] = match.group(1).decode("ascii")
+                    local_sessions.add(session["id"])
+                    if broker:
+                        await anyio.to_thread.run_sync(broker.register, session["id"], WORKER_ID)
+            await send(message)
 
         try:
-            prs = Presentation(template_path)
-
-            # Analysiere Layouts
-            layouts_info = []
-            for idx, layout in enumerate(prs.slide_layouts):
-                placeholders_info = []
-                for ph in layout.placeholders:
-                    placeholders_info.append({
-                        "idx": ph.placeholder_format.idx,
-                        "type": str(ph.placeholder_format.type),
-                        "has_text_frame": ph.has_text_frame
-                    })
-
-                layouts_info.append({
-                    "index": idx,
-                    "name": layout.name,
-                    "classified_type": classify_layout(layout),
-                    "placeholders": placeholders_info
-                })
-
-            analysis = {
-                "template_name": template_name,
-                "slide_width_inches": round(prs.slide_width.inches, 2),
-                "slide_height_inches": round(prs.slide_height.inches, 2),
-                "total_layouts": len(prs.slide_layouts),
-                "layouts": layouts_info
-            }
-
-            return [types.TextContent(type="text", text=json.dumps(analysis, indent=2))]
-        except Exception as e:
-            return [types.TextContent(type="text", text=f"Fehler bei Template-Analyse: {str(e)}")]
-
-    elif name == "get_template_path":
-        template_name = arguments.get("template_name")
-        template_path = os.path.join(TEMPLATES_DIR, template_name)
+            async with sse.connect_sse(scope, receive, track_session) as streams:
+                await mcp.run(streams[0], streams[1], mcp.create_initialization_options())
+        finally:
+            if "id" in session:
+                local_sessions.discard(session["id"])
+                if broker:
+                    await anyio.to_thread.run_sync(broker.unregister, session["id"])
+    
+    return asgi_app
 
-        if os.path.exists(template_path):
-            return [types.TextContent(type="text", text=template_path)]
-        else:
-            return [types.TextContent(type="text", text=f"Fehler: Template {template_name} nicht gefunden.")]
+# Streamable HTTP: Jeder Tool-Aufruf ist ein einzelner POST mit JSON-Antwort - ohne
+# Event-Stream und ohne Session-Zustand (funktioniert daher auch ohne Broker im Scale-out).
+http_session_manager = StreamableHTTPSessionManager(app=mcp, json_response=True, stateless=True)
 
-    elif name == "get_template_file":
-        template_name = arguments.get("template_name")
-        template_path = os.path.join(TEMPLATES_DIR, template_name)
-        print(f"MCP Server: Lade Template-Datei {template_path}...")
+async def handle_streamable_http(request: Request):
+    async def asgi_app(scope, receive, send):
+        await http_session_manager.handle_request(scope, receive, send)
 
-        if not os.path.exists(template_path):
-            return [types.TextContent(type="text", text=f"Fehler: Template {template_name} nicht gefunden.")]
+    return asgi_app
 
+# Scale-out: Mehrere Worker/Replicas teilen sich die Sessions über einen Broker.
+# Ein POST für eine fremde Session wird beim Broker abgelegt und vom Besitzer eingespeist.
+SCALE_OUT = os.environ.get("MCP_SCALE_OUT", "0") == "1"
+WORKER_ID = make_worker_id()
+BROKER_POLL_SECONDS = int(os.environ.get("MCP_BROKER_POLL_MS", 20)) / 1000
+broker = None
+if SCALE_OUT:
+    broker = SqliteSessionBroker(
+        os.environ.get("MCP_BROKER_PATH", os.path.join(STORAGE_DIR, ".mcp_broker.sqlite"))
+    )
+    print(f"MCP Server: Scale-out aktiv (Worker {WORKER_ID})")
+
+def owns_session(session_id_hex):
+    return session_id_hex in local_sessions
+
+async def relay_to_owner(session_id_hex, scope, receive, send):
+    """Legt den POST für den besitzenden Worker ab. False, wenn niemand die Session kennt."""
+    if not await anyio.to_thread.run_sync(broker.owner, session_id_hex):
+        return False
+
+    body = await Request(scope, receive).body()
+    try:
+        types.JSONRPCMessage.model_validate_json(body)
+    except ValidationError:
+        await Response("Could not parse message", status_code=400)(scope, receive, send)
+        return True
+
+    await anyio.to_thread.run_sync(broker.publish, session_id_hex, body)
+    await Response("Accepted", status_code=202)(scope, receive, send)
+    return True
+
+async def deliver_locally(session_id_hex, body):
+    """Speist eine weitergeleitete Nachricht über den normalen POST-Weg des Transports ein (True = angenommen)."""
+    scope = {
+        "type": "http", "method": "POST", "path": "/messages", "root_path": "",
+        "query_string": f"session_id={session_id_hex}".encode("ascii"),
+        "headers": [(b"content-type", b"application/json"), (b"host", b"localhost")],
+    }
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if delivered:
+            return {"type": "http.disconnect"}
+        delivered = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    status = {}
+
+    async def capture(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    await sse.handle_post_message(scope, receive, capture)
+    return status.get("code") == 202
+
+async def pump_brokered_messages():
+    """Speist vom Broker weitergeleitete Nachrichten in die lokalen Sessions ein."""
+    last_heartbeat = 0.0
+    while True:
         try:
-            # Lese Template als Bytes und encode als Base64
-            with open(template_path, "rb") as f:
-                template_bytes = f.read()
-
-            # Base64 encoding für sicheren Transport über JSON/MCP
-            template_b64 = base64.b64encode(template_bytes).decode('utf-8')
-
-            # Sende als JSON mit Metadaten
-            result = {
-                "template_name": template_name,
-                "size_bytes": len(template_bytes),
-                "size_mb": round(len(template_bytes) / (1024 * 1024), 2),
-                "data": template_b64
-            }
-
-            print(f"  Template geladen: {result['size_mb']} MB")
-            return [types.TextContent(type="text", text=json.dumps(result))]
+            for session_id_hex, body in await anyio.to_thread.run_sync(broker.take_messages, WORKER_ID):
+                if owns_session(session_id_hex) and not await deliver_locally(session_id_hex, body):
+                    print(f"MCP Server: Weitergeleitete Nachricht für Session {session_id_hex} abgelehnt")
 
+            if time.time() - last_heartbeat > 10:
+                await anyio.to_thread.run_sync(broker.heartbeat, WORKER_ID)
+                last_heartbeat = time.time()
         except Exception as e:
-            return [types.TextContent(type="text", text=f"Fehler beim Laden des Templates: {str(e)}")]
-
-    else:
-        raise ValueError(f"Unbekanntes Tool: {name}")
-
-# 4. Web-Server Setup (DER KRITISCHE TEIL)
-sse = SseServerTransport("/messages")
-
-async def handle_sse(request: Request):
-    # TRICK: Wir geben eine asynchrone Funktion zurück, statt direkt auszuführen.
-    # Starlette führt diese Funktion dann mit (scope, receive, send) aus.
-    async def asgi_app(scope, receive, send):
-        async with sse.connect_sse(scope, receive, send) as streams:
-            await mcp.run(streams[0], streams[1], mcp.create_initialization_options())
-    
-    return asgi_app
+            print(f"MCP Server: Broker-Fehler: {e}")
+        await asyncio.sleep(BROKER_POLL_SECONDS)
 
 async def handle_messages(request: Request):
     # Auch hier: Wir geben die Logik als ASGI-App zurück.
     async def asgi_app(scope, receive, send):
+        session_id_hex = request.query_params.get("session_id", "")
+        if broker and session_id_hex and not owns_session(session_id_hex):
+            if await relay_to_owner(session_id_hex, scope, receive, send):
+                return
         await sse.handle_post_message(scope, receive, send)
     
     return asgi_app
 
-# 5. App Routes
+# 5. Event-Loop-Monitoring
+class LoopLagMonitor:
+    """
+    Misst, wie stark der Event Loop blockiert ist: Ein Ticker schläft `interval`
+    Sekunden und vergleicht mit der tatsächlich vergangenen Zeit. Blockierende
+    Tool-Arbeit (pypdf, python-pptx) im Loop zeigt sich direkt als Lag.
+    """
+
+    def __init__(self, interval=0.05, window=2000):
+        self.interval = interval
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.samples = []
+        self.max_lag = 0.0
+        self.started_at = time.time()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.max_lag = max(self.max_lag, lag)
+            self.samples.append(lag)
+            if len(self.samples) > self.window:
+                del self.samples[: len(self.samples) - self.window]
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+        return {
+            "window_seconds": round(time.time() - self.started_at, 1),
+            "samples": len(ordered),
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
+
+loop_monitor = LoopLagMonitor()
+
+async def handle_metrics(request: Request):
+    metrics = {
+        "worker_id": WORKER_ID,
+        "scale_out": SCALE_OUT,
+        "local_sessions": len(local_sessions),
+        "loop_lag": loop_monitor.snapshot(),
+        "tools": dispatcher.snapshot(),
+        "coalesced": tool_flight.metrics()
+    }
+    if request.query_params.get("reset"):
+        loop_monitor.reset()
+        dispatcher.reset_peaks()
+    return JSONResponse(metrics)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    tasks = [asyncio.create_task(loop_monitor.run())]
+    if broker:
+        tasks.append(asyncio.create_task(pump_brokered_messages()))
+    try:
+        async with http_session_manager.run():
+            yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        dispatcher.shutdown()
+
+# 6. App Routes
 app = Starlette(routes=[
     Route("/sse", endpoint=handle_sse, methods=["GET"]),
-    Route("/messages", endpoint=handle_messages, methods=["POST"])
-])
\ No newline at end of file
+    Route("/messages", endpoint=handle_messages, methods=["POST"]),
+    Route("/mcp", endpoint=handle_streamable_http, methods=["GET", "POST", "DELETE"]),
+    Route("/metrics", endpoint=handle_metrics, methods=["GET"])
+], lifespan=lifespan)
\ No newline at end of file
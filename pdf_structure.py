@@ -0,0 +1,315 @@
+"""
+Strukturierte, layout-bewusste PDF-Extraktion für read_pdf_file (mode="structured"/"json").
+
+Statt eines flachen extract_text()-Blobs entsteht ein kompakter Abschnittsbaum:
+- wiederkehrende Kopf-/Fusszeilen (Journal-Header, Download-Vermerke) und
+  Seitenzahlen werden entfernt
+- Überschriften werden über Schriftgrösse/Fettdruck, Nummerierung und bekannte
+  Abschnittsnamen erkannt
+- Tabellenzeilen (überwiegend Zahlen) werden als kompakte Zeilen statt im
+  Fliesstext ausgegeben
+- Literaturverzeichnisse werden weggelassen bzw. auf wenige Einträge gekürzt
+- jeder Abschnitt trägt seine Seitenspanne (page_start/page_end)
+
+Das spart im Planungs-Prompt vor allem bei den akademischen PDFs viele Tokens.
+"""
+import re
+from collections import Counter
+
+from pypdf import PdfReader
+
+EDGE_LINES = 3  # so viele Zeilen oben/unten gelten als Kopf-/Fussbereich
+BOILERPLATE_MIN_SHARE = 0.4
+MAX_HEADING_WORDS = 14
+CONDENSED_REFERENCES = 5
+
+SECTION_KEYWORDS = {
+    "abstract", "introduction", "background", "literature review", "related work", "method",
+    "methods", "methodology", "data", "results", "discussion", "conclusion", "conclusions",
+    "summary", "acknowledgments", "acknowledgements", "appendix", "executive summary",
+    "zusammenfassung", "einleitung", "hintergrund", "methodik", "ergebnisse", "diskussion",
+    "fazit", "schluss", "anhang",
+}
+REFERENCE_KEYWORDS = {
+    "references", "reference list", "bibliography", "works cited", "literature cited", "sources",
+    "literatur", "literaturverzeichnis", "quellen", "quellenverzeichnis", "bibliographie",
+}
+
+_NUMBERED_HEADING = re.compile(r"^((?:\d{1,2}\.)*\d{1,2})\.?\s+(\S.*)$")
+_PAGE_NUMBER = re.compile(r"^(?:page|seite|s\.)?\s*(?:\d{1,4}|[ivxlc]{1,6})(?:\s*(?:of|von|/)\s*\d{1,4})?$", re.I)
+_DOT_LEADER = re.compile(r"\.{5,}\s*\S{1,6}$")
+_REFERENCE_ENTRY = re.compile(r"^(?:\[\d+\]|\d{1,3}\.\s|[A-ZÄÖÜ][\w'’\-]+,\s+(?:[A-Z]\.|[A-ZÄÖÜ][a-zäöü]+))")
+_NUMERIC_CELL = re.compile(r"^[(\-–+$€£]?\d[\d.,%]*[)%]?$")
+_GLYPH_IDS = re.compile(r"(?:/gid\d+)+")
+_BOLD_FONT = re.compile(r"bold|black|heavy|semibold|demi|-b\b|,b\b", re.I)
+
+
+def _normalize(line):
+    """Vergleichsform für Kopf-/Fusszeilen: nur die Buchstaben zählen (Seitenzahlen, Satzzeichen egal)."""
+    return re.sub(r"[^a-zäöüß]+", "", line.lower())
+
+
+def _clean(text):
+    # Nicht dekodierbare Glyphen erscheinen als "/gid00030/gid00035..." - das ist kein Text
+    return _GLYPH_IDS.sub("", text.replace("\x00", "")).strip()
+
+
+def extract_page_lines(reader):
+    """
+    Liefert pro Seite eine Liste von (text, font_size, bold). Die Zeilen stammen
+    aus denselben Fragmenten wie extract_text(), ergänzt um Layout-Informationen.
+    """
+    pages = []
+    for page in reader.pages:
+        lines = []
+        current = {"text": "", "weighted_size": 0.0, "chars": 0, "bold": True}
+
+        def flush():
+            text = _clean(current["text"])
+            if text:
+                # Zeichengewichtetes Mittel: Hochstellungen und Initialen verzerren sonst die Grösse
+                size = current["weighted_size"] / current["chars"] if current["chars"] else 0.0
+                lines.append((text, round(size, 1), current["bold"]))
+            current.update(text="", weighted_size=0.0, chars=0, bold=True)
+
+        def visitor(text, cm, tm, font_dict, font_size):
+            scale = abs(tm[3] * cm[3]) if tm and cm and tm[3] and cm[3] else 1.0
+            font_name = str(font_dict.get("/BaseFont", "")) if font_dict else ""
+            parts = text.split("\n")
+            for i, part in enumerate(parts):
+                if part.strip():
+                    chars = len(part.strip())
+                    current["text"] += part
+                    current["weighted_size"] += (font_size or 0) * scale * chars
+                    current["chars"] += chars
+                    current["bold"] = current["bold"] and bool(_BOLD_FONT.search(font_name))
+                elif part:
+                    current["text"] += part
+                if i < len(parts) - 1:
+                    flush()
+
+        page.extract_text(visitor_text=visitor)
+        flush()
+        pages.append(lines)
+    return pages
+
+
+def find_boilerplate(pages):
+    """Zeilen, die auf vielen Seiten im Kopf- oder Fussbereich wiederkehren."""
+    if len(pages) < 3:
+        return set()
+    counts = Counter()
+    for lines in pages:
+        edge = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+        counts.update({_normalize(text) for text, _, _ in edge})
+    threshold = max(3, BOILERPLATE_MIN_SHARE * len(pages))
+    return {line for line, count in counts.items() if count >= threshold and len(line) >= 4}
+
+
+def _body_font_size(pages):
+    # Auf halbe Punkte runden, damit leicht schwankende Fliesstext-Grössen zusammenfallen
+    sizes = Counter()
+    for lines in pages:
+        for text, size, _ in lines:
+            sizes[round(size * 2) / 2] += len(text)
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def _heading_level(text, size, bold, body_size):
+    """Gibt die Überschriften-Ebene (1-3) zurück oder None für Fliesstext."""
+    words = text.split()
+    if not words or len(words) > MAX_HEADING_WORDS or len(text) < 3:
+        return None
+    if text.endswith((".", ",", ";", ":", ")")):
+        return None
+    keyword = re.sub(r"^[\d.\s]+", "", text).strip().lower()
+    numbered = _NUMBERED_HEADING.match(text)
+
+    # Tabellenzeilen und Zahlenkolonnen sind keine Überschriften
+    title_words = keyword.split()
+    if not title_words or sum(any(c.isalpha() for c in w) for w in title_words) < len(title_words) * 0.6:
+        return None
+    if body_size and (size < body_size * 0.95 or size > body_size * 4):
+        return None  # Fussnoten/Bildunterschriften bzw. dekorative Riesenbuchstaben
+    larger = body_size and size >= body_size * 1.15
+
+    if larger:
+        return 1 if size >= body_size * 1.5 else 2
+    if keyword in REFERENCE_KEYWORDS or keyword in SECTION_KEYWORDS or keyword.startswith("appendix"):
+        return 2
+    if numbered and numbered.group(2)[:1].isupper() and len(words) <= 10:
+        return min(3, 1 + numbered.group(1).count("."))
+    if bold and len(words) <= 10:
+        return 3
+    if text.isupper() and len(words) <= 8 and sum(c.isalpha() for c in text) >= 4:
+        return 2
+    return None
+
+
+def _is_table_row(text):
+    """Zeile einer Zahlentabelle: mehrere Zellen, mindestens die Hälfte davon numerisch."""
+    cells = text.split()
+    if len(cells) < 3:
+        return False
+    return sum(bool(_NUMERIC_CELL.match(c)) for c in cells) >= len(cells) * 0.5
+
+
+def _join_paragraph(lines):
+    """Zeilen zu Fliesstext zusammenfügen, Silbentrennung am Zeilenende auflösen."""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _section_text(lines, tables):
+    """Fliesstext und Tabellenblöcke in Lesereihenfolge; Tabellenzeilen bleiben Zeilen."""
+    parts, paragraph, table = [], [], []
+    for line in lines:
+        if line in tables:
+            if paragraph:
+                parts.append(_join_paragraph(paragraph))
+                paragraph = []
+            table.append(re.sub(r"\s+", " | ", line.strip()))
+        else:
+            if table:
+                parts.append("[Tabelle]\n" + "\n".join(table))
+                table = []
+            paragraph.append(line)
+    if paragraph:
+        parts.append(_join_paragraph(paragraph))
+    if table:
+        parts.append("[Tabelle]\n" + "\n".join(table))
+    return "\n".join(p for p in parts if p)
+
+
+def _paged_section_text(section, tables):
+    """
+    Text eines Abschnitts plus [[seite, zeichen_offset], ...], damit Abschnitte
+    über mehrere Seiten später seitengenau zerlegt werden können (Retrieval-Index).
+    """
+    pieces, offsets, start = [], [], 0
+    for i, line_page in enumerate(section["line_pages"] + [None]):
+        if i and (line_page is None or line_page != section["line_pages"][i - 1]):
+            piece = _section_text(section["lines"][start:i], tables)
+            if piece:
+                offsets.append([section["line_pages"][start], sum(len(p) + 1 for p in pieces)])
+                pieces.append(piece)
+            start = i
+    return "\n".join(pieces), offsets
+
+
+def extract_structured(file_path, references="drop"):
+    """
+    Zerlegt ein PDF in einen Abschnittsbaum.
+
+    Args:
+        file_path: Pfad zur PDF-Datei
+        references: "drop" (nur Anzahl), "condense" (erste Einträge) oder "keep"
+
+    Returns:
+        dict mit "pages", "sections" [{title, level, page_start, page_end, text, page_offsets}],
+        "references" (oder None), "removed_lines" und "table_rows"
+    """
+    reader = PdfReader(file_path)
+    pages = extract_page_lines(reader)
+    boilerplate = find_boilerplate(pages)
+    body_size = _body_font_size(pages)
+
+    sections = []
+    current = {"title": "", "level": 0, "page_start": 1, "page_end": 1, "lines": [], "line_pages": []}
+    reference_section = None
+    removed = 0
+    table_rows = set()
+
+    for page_number, lines in enumerate(pages, start=1):
+        for text, size, bold in lines:
+            if _normalize(text) in boilerplate or _PAGE_NUMBER.match(text) or _DOT_LEADER.search(text):
+                removed += 1
+                continue
+
+            level = _heading_level(text, size, bold, body_size)
+            keyword = re.sub(r"^[\d.\s]+", "", text).strip().lower() if level is not None else ""
+            if level is not None and reference_section is not None and references != "keep" \
+                    and level > reference_section["level"] and keyword not in REFERENCE_KEYWORDS:
+                # Unterüberschriften im Literaturverzeichnis (z.B. "A. Journal articles")
+                # gehören samt ihren Einträgen zum Verzeichnis - sonst landen sie im Prompt
+                level = None
+            if level is not None:
+                # Mehrzeilige Überschriften (gleiche Ebene, noch kein Text dazwischen) zusammenführen
+                if current["title"] and not current["lines"] and current["level"] == level \
+                        and current["page_start"] == page_number:
+                    current["title"] += " " + text
+                    continue
+                if current["lines"] or current["title"]:
+                    sections.append(current)
+                current = {"title": text, "level": level, "page_start": page_number,
+                           "page_end": page_number, "lines": [], "line_pages": []}
+                if keyword in REFERENCE_KEYWORDS:
+                    reference_section = current
+                elif reference_section is not None and level <= reference_section["level"]:
+                    reference_section = None
+                continue
+
+            if _is_table_row(text):
+                table_rows.add(text)
+            current["lines"].append(text)
+            current["line_pages"].append(page_number)
+            current["page_end"] = page_number
+
+    if current["lines"] or current["title"]:
+        sections.append(current)
+
+    result_sections = []
+    reference_info = None
+    for section in sections:
+        keyword = re.sub(r"^[\d.\s]+", "", section["title"]).strip().lower()
+        if keyword in REFERENCE_KEYWORDS and references != "keep":
+            entries = [line for line in section["lines"] if _REFERENCE_ENTRY.match(line)]
+            reference_info = {
+                "title": section["title"],
+                "page_start": section["page_start"],
+                "page_end": section["page_end"],
+                "entries": len(entries),
+                "sample": [e[:160] for e in entries[:CONDENSED_REFERENCES]] if references == "condense" else [],
+            }
+            continue
+        text, page_offsets = _paged_section_text(section, table_rows)
+        result_sections.append({
+            "title": section["title"],
+            "level": section["level"],
+            "page_start": section["page_start"],
+            "page_end": section["page_end"],
+            "text": text,
+            "page_offsets": page_offsets,
+        })
+
+    return {
+        "pages": len(pages),
+        "sections": result_sections,
+        "references": reference_info,
+        "removed_lines": removed,
+        "table_rows": len(table_rows),
+    }
+
+
+def render_structured(filename, doc):
+    """Kompakte Textform für den Planungs-Prompt (Markdown-Überschriften mit Seitenspannen)."""
+    out = [f"--- INHALT VON {filename} (strukturiert, {doc['pages']} Seiten) ---"]
+    for section in doc["sections"]:
+        span = f"S. {section['page_start']}" if section["page_start"] == section["page_end"] \
+            else f"S. {section['page_start']}-{section['page_end']}"
+        if section["title"]:
+            out.append(f"{'#' * max(1, section['level'])} {section['title']} [{span}]")
+        if section["text"]:
+            out.append(section["text"])
+    refs = doc.get("references")
+    if refs:
+        out.append(f"[{refs['title']} ausgelassen: ~{refs['entries']} Einträge, "
+                   f"S. {refs['page_start']}-{refs['page_end']}]")
+        out.extend(f"- {entry}" for entry in refs["sample"])
+    out.append(f"--- ENDE {filename} ---")
+    return "\n".join(out)
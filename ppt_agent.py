@@ -10,48 +10,73 @@ Der Agent:
 """
 
 import os
+import re
 import json
 import base64
+import hashlib
+import uuid
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import traceback # Added for detailed exception logging
 from io import BytesIO
-from dotenv import load_dotenv
 from pptx import Presentation
 from pptx.util import Inches, Pt
-from langchain_google_genai import ChatGoogleGenerativeAI
-from mcp import ClientSession
-from mcp.client.sse import sse_client
+from mcp_client import open_tool_session
+from shared_cache import SharedFileCache
+from singleflight import SingleFlight
+from llm_usage import ainvoke_llm, invoke_llm, usage_job
+from llm_clients import get_llm, load_env
 from data_models import PresentationStructure, ImageColors
-from image_providers import get_image_from_gurkli
-import streamlit as st # Hinzugefügt für Abbruch-Erkennung
-
-load_dotenv()
-api_key = os.environ.get("GOOGLE_API_KEY")
-mcp_server_url = os.environ.get("MCP_SERVER_URL", "http://mcp-server:8000/sse")
-
-# LLM für Layout-Entscheidungen
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.3,  # Erhöht für mehr Varianz
-    google_api_key=api_key
-)
-
-
-import httpx
+from image_providers import get_image_from_gurkli, PLACEHOLDER_IMAGE_PATH
+from color_engine import choose_colors
+from build_control import CancelToken, report
+from image_library import ImageLibrary, slide_keywords
+from pptx_optimizer import optimize_pptx
+
+load_env()
+
+# Memo der Slide-Entscheidungen (Layout, Bildstil, Bild) pro Slide-Inhalt
+SLIDE_MEMO_DIR = os.path.join("storage", ".slide_memo")
+slide_memo = SharedFileCache(SLIDE_MEMO_DIR)
+# Gleichzeitige Entscheidungen mit demselben Memo-Schlüssel (gleiche Slide in
+# mehreren Sessions/Jobs, bei kaltem Memo) teilen sich LLM-Aufruf und Bildabruf
+decision_flight = SingleFlight("slide_memo")
+# Bilder aller Decks, per Perceptual Hash dedupliziert
+image_library = ImageLibrary()
+
+# Parallele Bildabrufe (gurk.li) während Template-Laden und Layout-Entscheidungen
+IMAGE_PREFETCH_WORKERS = int(os.environ.get("IMAGE_PREFETCH_WORKERS", 4))
+# Parallele Layout-Entscheidungen im Streaming-Modus (inkl. Template-Download)
+LAYOUT_WORKERS = int(os.environ.get("LAYOUT_WORKERS", 3))
+# Parallel gebaute Template-Vorschauen (Template-Download + Zusammensetzen)
+PREVIEW_WORKERS = int(os.environ.get("PREVIEW_WORKERS", 3))
+# Layout-Typen, die der Agent pro Slide wählt (Template-Layouts tragen sie als classified_type)
+LAYOUT_CATEGORIES = [
+    "Title and Subtitle",
+    "Title and Content",
+    "Title, Content and Image",
+    "Title Only",
+    "Two Content",
+    "Image Only",
+    "Content Only",
+    "Other"
+]
+# Modell-Stufen für Ein-Wort-Klassifikationen (schnell zuerst, siehe llm_clients)
+CLASSIFIER_TIERS = ("classifier", "builder")
+# Fertige Decks verkleinern (unbenutzte Layouts, Master, Schriften, doppelte Medien) - siehe pptx_optimizer
+OPTIMIZE_OUTPUT = os.environ.get("OPTIMIZE_PPTX", "0") == "1"
 
 async def get_templates_from_mcp():
     """Holt die Liste aller verfügbaren Templates vom MCP Server."""
     try:
-        async with sse_client(mcp_server_url) as streams:
-            async with ClientSession(streams[0], streams[1]) as session:
-                await session.initialize()
+        async with open_tool_session() as session:
+            print("--> Agent 2: Frage MCP Server nach Templates...")
+            text = await session.call_tool("list_templates", arguments={})
 
-                print("--> Agent 2: Frage MCP Server nach Templates...")
-                result = await session.call_tool("list_templates", arguments={})
-
-                if result.content:
-                    templates_json = json.loads(result.content[0].text)
-                    return templates_json
+            if text:
+                templates_json = json.loads(text)
+                return templates_json
     except Exception as e:
         print(f"!!! EXCEPTION in get_templates_from_mcp: {e}")
         traceback.print_exc() # Print the full traceback
@@ -61,19 +86,16 @@ async def get_templates_from_mcp():
 
 async def analyze_template_via_mcp(template_name):
     """Analysiert ein Template über den MCP Server."""
-    async with sse_client(mcp_server_url) as streams:
-        async with ClientSession(streams[0], streams[1]) as session:
-            await session.initialize()
-
-            print(f"--> Agent 2: Analysiere Template '{template_name}' via MCP...")
-            result = await session.call_tool(
-                "analyze_template",
-                arguments={"template_name": template_name}
-            )
-
-            if result.content:
-                analysis = json.loads(result.content[0].text)
-                return analysis
+    async with open_tool_session() as session:
+        print(f"--> Agent 2: Analysiere Template '{template_name}' via MCP...")
+        text = await session.call_tool(
+            "analyze_template",
+            arguments={"template_name": template_name}
+        )
+
+        if text:
+            analysis = json.loads(text)
+            return analysis
     return None
 
 
@@ -82,26 +104,23 @@ async def get_template_file_from_mcp(template_name):
     Lädt ein Template über MCP (als Base64-encoded Bytes).
     Gibt ein BytesIO-Objekt zurück, das direkt in Presentation() verwendet werden kann.
     """
-    async with sse_client(mcp_server_url) as streams:
-        async with ClientSession(streams[0], streams[1]) as session:
-            await session.initialize()
+    async with open_tool_session() as session:
+        print(f"--> Agent 2: Lade Template-Datei '{template_name}' über MCP...")
+        text = await session.call_tool(
+            "get_template_file",
+            arguments={"template_name": template_name}
+        )
 
-            print(f"--> Agent 2: Lade Template-Datei '{template_name}' über MCP...")
-            result = await session.call_tool(
-                "get_template_file",
-                arguments={"template_name": template_name}
-            )
-
-            if result.content:
-                template_data = json.loads(result.content[0].text)
+        if text:
+            template_data = json.loads(text)
 
-                # Decode Base64 zu Bytes
-                template_bytes = base64.b64decode(template_data["data"])
+            # Decode Base64 zu Bytes
+            template_bytes = base64.b64decode(template_data["data"])
 
-                print(f"  ✓ Template geladen: {template_data['size_mb']} MB")
+            print(f"  ✓ Template geladen: {template_data['size_mb']} MB")
 
-                # Gib als BytesIO zurück (funktioniert mit Presentation())
-                return BytesIO(template_bytes)
+            # Gib als BytesIO zurück (funktioniert mit Presentation())
+            return BytesIO(template_bytes)
     return None
 
 
@@ -109,9 +128,13 @@ def decide_colors_for_presentation(presentation_data, template_analysis=None):
     """
     Agent entscheidet passende Farben basierend auf dem Präsentationsthema und Template.
 
+    Mit Template kommen die Farben lokal aus dessen Theme-Palette (color_engine,
+    kein LLM-Aufruf). Nur ohne Template bzw. ohne brauchbare Palette fragt der
+    Agent das LLM.
+
     Args:
         presentation_data: PresentationStructure mit allen Slides
-        template_analysis: Optional - Analyse des Templates
+        template_analysis: Optional - Analyse des Templates (mit "theme_colors")
 
     Returns:
         dict: {"primary": "#hex", "secondary": "#hex"}
@@ -120,6 +143,12 @@ def decide_colors_for_presentation(presentation_data, template_analysis=None):
     all_titles = [slide.title for slide in presentation_data.slides[:5]]  # Erste 5 Titel
     topics_summary = ", ".join(all_titles)
 
+    if template_analysis and template_analysis.get("theme_colors"):
+        colors = choose_colors(template_analysis["theme_colors"], topics_summary)
+        if colors:
+            print(f"  🎨 Farben aus Template-Palette: Primary={colors['primary']}, Secondary={colors['secondary']}")
+            return colors
+
     # Template-Info falls vorhanden
     template_info = ""
     if template_analysis:
@@ -145,30 +174,56 @@ def decide_colors_for_presentation(presentation_data, template_analysis=None):
     secondary: #HEXCODE
     """
 
-    response = llm.invoke(prompt)
-    result = response.content.strip()
+    response = invoke_llm(get_llm("builder"), prompt, call="colors")
+    return parse_color_answer(response.content.strip())
 
-    # Parse die Antwort
-    try:
-        lines = result.split("\n")
-        primary = "#0066CC"  # Fallback
-        secondary = "#00CC66"  # Fallback
-
-        for line in lines:
-            line_lower = line.lower().strip()
-            if "primary" in line_lower and "#" in line:
-                primary = line.split("#")[1][:6]
-                primary = f"#{primary}"
-            elif "secondary" in line_lower and "#" in line:
-                secondary = line.split("#")[1][:6]
-                secondary = f"#{secondary}"
-
-        print(f"  🎨 Agent wählt Farben: Primary={primary}, Secondary={secondary}")
-        return {"primary": primary, "secondary": "#00CC66"}
 
-    except Exception as e:
-        print(f"  ⚠ Fehler beim Parsen der Farben: {e} - Verwende Fallback")
-        return {"primary": "#0066CC", "secondary": "#00CC66"}
+def parse_color_answer(result):
+    """Liest "primary: #hex" / "secondary: #hex" aus der LLM-Antwort (Fallback je Farbe)."""
+    primary = "#0066CC"  # Fallback
+    secondary = "#00CC66"  # Fallback
+
+    for line in result.split("\n"):
+        line_lower = line.lower().strip()
+        match = re.search(r"#([0-9a-fA-F]{6})\b", line)
+        if not match:
+            continue
+        if "primary" in line_lower:
+            primary = f"#{match.group(1).upper()}"
+        elif "secondary" in line_lower:
+            secondary = f"#{match.group(1).upper()}"
+
+    print(f"  🎨 Agent wählt Farben: Primary={primary}, Secondary={secondary}")
+    return {"primary": primary, "secondary": secondary}
+
+
+def _clean_answer(response):
+    return response.content.strip().strip("\"'`*.").strip()
+
+
+def classify_with_llm(prompt, call, options):
+    """Synchroner Wrapper um aclassify_with_llm (Slide-Worker ohne Event-Loop)."""
+    return asyncio.run(aclassify_with_llm(prompt, call, options))
+
+
+async def aclassify_with_llm(prompt, call, options):
+    """
+    Ein-Wort-Klassifikation mit Modell-Routing: zuerst das schnelle Profil
+    "classifier", bei einer Antwort außerhalb von options eine Stufe höher.
+
+    Returns:
+        Die passende Option (in ihrer Schreibweise) oder - wenn auch die letzte
+        Stufe danebenliegt - deren Antwort; die Aufrufer haben dafür eigene Fallbacks
+    """
+    canonical = {option.lower(): option for option in options}
+    answer = None
+    for i, tier in enumerate(CLASSIFIER_TIERS):
+        answer = _clean_answer(await ainvoke_llm(get_llm(tier), prompt, call=call))
+        if answer.lower() in canonical:
+            return canonical[answer.lower()]
+        if i + 1 < len(CLASSIFIER_TIERS):
+            print(f"  ⚠ Ungültige Antwort '{answer}' ({tier}) - eskaliere auf {CLASSIFIER_TIERS[i + 1]}")
+    return answer
 
 
 def decide_image_style_for_slide(slide_data):
@@ -209,11 +264,9 @@ def decide_image_style_for_slide(slide_data):
     Antworte NUR mit dem Namen des am besten passenden Stils: flat_illustration, fine_line, oder photorealistic.
     """
 
-    response = llm.invoke(prompt)
-    suggested_style = response.content.strip().lower()
-
-    # Validierung
+    # Validierung (mit Eskalation auf das stärkere Modell)
     valid_styles = ["flat_illustration", "fine_line", "photorealistic"]
+    suggested_style = classify_with_llm(prompt, "image_style", valid_styles)
     if suggested_style not in valid_styles:
         print(f"  ⚠ Ungültiger Stil '{suggested_style}' - Fallback auf flat_illustration")
         return "flat_illustration"
@@ -245,13 +298,17 @@ def has_subtitle_only(layout):
 
 
 
-def decide_layout_for_slide(template_analysis, slide_data, is_first_slide, slide_index, total_slides):
-    """
-    Wählt INTELLIGENT das beste Layout für eine Slide.
-    Nutzt einen LLM, um basierend auf dem Content den Layout-Typ zu bestimmen.
-    """
-    layouts = template_analysis["layouts"]
-    
+def layout_category_key(slide_data, slide_index, total_slides):
+    """Der Layout-Typ hängt nur von Inhalt und Position ab - nicht vom Template."""
+    return _memo_key("category", {
+        "content": _slide_content(slide_data),
+        "first": slide_index == 0,
+        "last": slide_index == total_slides - 1,
+    })
+
+
+def _layout_category_prompt(slide_data, slide_index, total_slides):
+    is_first_slide = slide_index == 0
     content_summary = f"Titel: {slide_data.title}\n"
     content_summary += f"Punkte: {len(slide_data.bullets)}\n"
     for item in slide_data.bullets:
@@ -266,22 +323,11 @@ def decide_layout_for_slide(template_analysis, slide_data, is_first_slide, slide
     elif slide_index == total_slides - 1:
         position_context = "This is the last slide of the presentation."
 
-    layout_categories = [
-        "Title and Subtitle",
-        "Title and Content",
-        "Title, Content and Image",
-        "Title Only",
-        "Two Content",
-        "Image Only",
-        "Content Only",
-        "Other"
-    ]
-
     prompt = f"""
     You are an expert presentation designer. Your task is to choose the best layout for a slide based on its content.
 
     **Available Layout Categories:**
-    {', '.join(layout_categories)}
+    {', '.join(LAYOUT_CATEGORIES)}
 
     **Content to Classify:**
     - Slide {slide_index + 1} of {total_slides}
@@ -302,13 +348,46 @@ def decide_layout_for_slide(template_analysis, slide_data, is_first_slide, slide
     Based on the content and the examples, choose the single most appropriate layout category from the list of available categories.
     Respond ONLY with the name of the category (e.g., "Title and Content").
     """
-    
-    response = llm.invoke(prompt)
-    suggested_category = response.content.strip()
-    
-    print(f"  LLM-Vorschlag für Content-Typ: {suggested_category}")
+    return prompt
+
+
+def decide_layout_category(slide_data, slide_index, total_slides, use_memo=True):
+    """Synchroner Wrapper um adecide_layout_category (Slide-Worker ohne Event-Loop)."""
+    return asyncio.run(adecide_layout_category(slide_data, slide_index, total_slides, use_memo=use_memo))
 
-    # Matching logic remains the same...
+
+async def adecide_layout_category(slide_data, slide_index, total_slides, use_memo=True):
+    """
+    LLM-Entscheidung des Layout-Typs (z.B. "Title and Content") für eine Slide.
+    Memoisiert pro Inhalt, damit ein Template-Wechsel keinen neuen LLM-Aufruf kostet.
+    """
+    key = layout_category_key(slide_data, slide_index, total_slides)
+    cached = slide_memo.get(key) if use_memo else None
+    if cached:
+        print(f"  ✓ Content-Typ aus Memo (Slide {slide_index + 1}): {cached['category']}")
+        return cached["category"]
+
+    async def decide():
+        prompt = _layout_category_prompt(slide_data, slide_index, total_slides)
+        suggested_category = await aclassify_with_llm(prompt, "layout", LAYOUT_CATEGORIES)
+        print(f"  LLM-Vorschlag für Content-Typ (Slide {slide_index + 1}): {suggested_category}")
+        slide_memo.set(key, {"category": suggested_category})
+        return suggested_category
+
+    return await decision_flight.ado(key, decide)
+
+
+async def adecide_layout_categories(slides, indices=None):
+    """
+    Layout-Typen gleichzeitig in einem Event-Loop (ein Task pro Slide).
+    indices: nur diese Slides entscheiden (Standard: alle); Ergebnis in derselben Reihenfolge.
+    """
+    indices = range(len(slides)) if indices is None else indices
+    return await asyncio.gather(*(adecide_layout_category(slides[i], i, len(slides)) for i in indices))
+
+
+def match_layout(layouts, suggested_category, slide_index):
+    """Bildet den Layout-Typ auf ein Layout des Templates ab (ohne LLM)."""
     for layout in layouts:
         if layout.get("classified_type") == suggested_category:
             print(f"  → Layout gefunden (genaue Übereinstimmung mit '{suggested_category}'): {layout['name']}")
@@ -331,8 +410,367 @@ def decide_layout_for_slide(template_analysis, slide_data, is_first_slide, slide
     return min(1, len(layouts) - 1)
 
 
+def decide_layout_for_slide(template_analysis, slide_data, is_first_slide, slide_index, total_slides,
+                            use_memo=True):
+    """
+    Wählt INTELLIGENT das beste Layout für eine Slide.
+    Nutzt einen LLM, um basierend auf dem Content den Layout-Typ zu bestimmen.
+    """
+    category = decide_layout_category(slide_data, slide_index, total_slides, use_memo=use_memo)
+    return match_layout(template_analysis["layouts"], category, slide_index)
+
+# -----------------------------------------------------------------------------
+# Einzelne Slides: Entscheidung, Aufbau, Memo und Manifest
+# -----------------------------------------------------------------------------
+def _memo_key(prefix, relevant):
+    raw = json.dumps(relevant, sort_keys=True, ensure_ascii=False)
+    return f"{prefix}-" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _slide_content(slide_data):
+    return slide_data.model_dump(include={"title", "bullets", "unsplashSearchTerms", "ImageKeywords", "ai_model"})
+
+
+def slide_decision_key(slide_data, template_name, slide_index, total_slides):
+    """Hash über alles, was die Layout-Entscheidung einer Slide beeinflusst."""
+    return _memo_key("layout", {
+        "content": _slide_content(slide_data),
+        "template": template_name,
+        "first": slide_index == 0,
+        "last": slide_index == total_slides - 1,
+    })
+
+
+def image_decision_key(slide_data, image_style, image_mode, image_colors):
+    """Das Bild hängt nur vom Slide-Inhalt und den Bild-Einstellungen ab - nicht vom Layout."""
+    return _memo_key("image", {
+        "content": _slide_content(slide_data),
+        "image": [image_style, image_mode, image_colors],
+    })
+
+
+def decide_slide_image(slide_data, image_style, image_mode, image_colors, use_memo=True):
+    """
+    Bildstil-Entscheidung und Bildabruf für eine Slide (memoisiert pro Inhalt).
+    Läuft im Prefetch-Pool parallel zu Template-Laden und Layout-Entscheidungen.
+
+    Returns:
+        dict: {"style", "image_path"}
+    """
+    if not slide_data.unsplashSearchTerms:
+        return {"style": None, "image_path": None}
+
+    key = image_decision_key(slide_data, image_style, image_mode, image_colors)
+    if use_memo:
+        cached = slide_memo.get(key)
+        if cached and cached["image_path"] and os.path.exists(cached["image_path"]):
+            slide_data.style = cached["style"]
+            return cached
+
+    slide_data.image_mode = image_mode
+    # Farben sind immer vorhanden (User oder Agent-gewählt)
+    slide_data.colors = ImageColors(
+        primary=image_colors.get("primary", "#0066CC"),
+        secondary=image_colors.get("secondary", "#00CC66")
+    )
+    result = decision_flight.do(key, lambda: _fetch_slide_image(slide_data, image_style, image_mode, image_colors,
+                                                                key, use_memo))
+    # Wer auf eine gleiche Slide gewartet hat, übernimmt deren Stil
+    slide_data.style = result["style"]
+    return result
+
+
+def _fetch_slide_image(slide_data, image_style, image_mode, image_colors, key, use_memo):
+    """Bildstil (ggf. per LLM), Abruf bzw. Wiederverwendung und Memo-Eintrag für decide_slide_image."""
+    # Bei "auto" lässt der Agent den Stil entscheiden
+    if image_style == "auto":
+        slide_data.style = decide_image_style_for_slide(slide_data)
+    else:
+        slide_data.style = image_style
+
+    # Passendes Bild aus diesem oder früheren Decks wiederverwenden (spart den Abruf)
+    keywords = slide_keywords(slide_data)
+    colors = slide_data.colors.model_dump()
+    image_path = image_library.find_match(keywords, slide_data.style, colors) if use_memo else None
+    if image_path:
+        print(f"  ♻ Wiederverwendetes Bild für '{slide_data.title}': {os.path.basename(image_path)}")
+    else:
+        image_path = get_image_from_gurkli(slide_data)
+        if image_path == PLACEHOLDER_IMAGE_PATH or not (image_path and os.path.exists(image_path)):
+            # Fehlerbild nicht memoisieren - beim nächsten Lauf erneut versuchen
+            return {"style": slide_data.style, "image_path": image_path}
+        # Beinahe-Duplikate auf ein gemeinsames Bild abbilden
+        image_path = image_library.ingest(image_path, keywords, slide_data.style, colors)
+
+    result = {"style": slide_data.style, "image_path": image_path}
+    slide_memo.set(key, result)
+    return result
+
+
+def prefetch_slide_images(executor, slides, image_style, image_mode, image_colors):
+    """
+    Startet die Bildabrufe aller Slides sofort (sobald Plan und Farben feststehen).
+    Gibt pro Slide ein Future zurück; build_slide wartet erst beim Einfügen darauf.
+    """
+    futures = []
+    for slide_data in slides:
+        # Kontext kopieren, damit die LLM-Aufrufe im Pool zum aktuellen usage_job zählen
+        futures.append(executor.submit(
+            contextvars.copy_context().run,
+            decide_slide_image, slide_data, image_style, image_mode, image_colors
+        ))
+    return futures
+
+
+def decide_slide(template_analysis, slide_data, slide_index, total_slides, image_style, image_mode,
+                 image_colors, template_name=None, use_memo=True, image_future=None, with_image=True):
+    """
+    Trifft alle teuren Entscheidungen für eine Slide (Layout-LLM, Bildstil-LLM, Bildabruf).
+
+    Ergebnisse werden pro Slide-Inhalt memoisiert: eine unveränderte Slide kostet
+    beim nächsten Lauf weder LLM-Aufrufe noch einen Bildabruf. Läuft der Bildabruf
+    bereits im Prefetch (image_future), wird nur noch auf dessen Ergebnis gewartet;
+    mit with_image=False wird nur das Layout entschieden.
+
+    Returns:
+        dict: {"key", "layout_index", "style", "image_path"}
+    """
+    key = slide_decision_key(slide_data, template_name, slide_index, total_slides)
+    cached = slide_memo.get(key) if use_memo else None
+    if cached:
+        layout_index = cached["layout_index"]
+        print(f"  ✓ Slide unverändert - Layout aus Memo ({layout_index})")
+    elif template_analysis:
+        layout_index = decide_layout_for_slide(
+            template_analysis,
+            slide_data,
+            is_first_slide=(slide_index == 0),
+            slide_index=slide_index,
+            total_slides=total_slides,
+            use_memo=use_memo
+        )
+    else:
+        # Ohne Template: Standard-Logik
+        layout_index = 0 if slide_index == 0 else 1
+    if not cached:
+        slide_memo.set(key, {"layout_index": layout_index})
+
+    if not with_image:
+        return {"key": key, "layout_index": layout_index}
+    if image_future is not None:
+        image = image_future.result()
+    else:
+        image = decide_slide_image(slide_data, image_style, image_mode, image_colors, use_memo=use_memo)
+
+    return {"key": key, "layout_index": layout_index, **image}
+
+
+def build_slide(prs, slide_data, decision, is_title_slide):
+    """Hängt eine Slide gemäss decision an die Präsentation an und befüllt Text und Bild."""
+    layout = prs.slide_layouts[decision["layout_index"]]
+    slide = prs.slides.add_slide(layout)
+
+    # Titel setzen
+    if slide.shapes.title:
+        slide.shapes.title.text = slide_data.title
+
+    # TITLE SLIDE: Subtitle befüllen (idx=1 ist oft Subtitle)
+    if is_title_slide:
+        # Erstelle Subtitle aus den ersten Bullets
+        subtitle_text = ""
+        if slide_data.bullets:
+            subtitle_parts = [item.bullet for item in slide_data.bullets[:2]]
+            subtitle_text = " | ".join(subtitle_parts)
+
+        # Suche Subtitle-Placeholder (idx=1 bei Title Slides)
+        for shape in slide.placeholders:
+            if shape.placeholder_format.idx == 1 and shape.has_text_frame:
+                shape.text_frame.text = subtitle_text
+                print(f"  Subtitle gesetzt: '{subtitle_text[:50]}...'" )
+                break
+
+    # CONTENT SLIDES: Content einfügen
+    else:
+        tf = None
+        for idx in [1, 2, 3]:  # Versuche verschiedene Indices
+            for shape in slide.placeholders:
+                if shape.placeholder_format.idx == idx and shape.has_text_frame:
+                    tf = shape.text_frame
+                    print(f"  Content Placeholder: idx={idx}")
+                    break
+            if tf:
+                break
+
+        if tf:
+            tf.clear()
+            for item in slide_data.bullets:
+                p = tf.add_paragraph()
+                p.text = item.bullet
+                p.level = 0
+                for sub in item.sub:
+                    ps = tf.add_paragraph()
+                    ps.text = sub
+                    ps.level = 1
+        else:
+            print(f"  ⚠ Kein Content-Placeholder gefunden!")
+
+    # Bild einfügen - DYNAMISCH basierend auf Foliengröße!
+    image_path = decision["image_path"]
+    if image_path and os.path.exists(image_path):
+        try:
+            # Berechne Position basierend auf Foliengröße
+            slide_width = prs.slide_width
+            slide_height = prs.slide_height
+
+            # Bild soll ca. 35% der Folienbreite einnehmen
+            img_width = int(slide_width * 0.35)
+
+            # Position: rechte untere Ecke mit Rand
+            margin = Inches(0.3)
+            img_left = slide_width - img_width - margin
+            img_top = int(slide_height * 0.35)  # Startet bei ca. 35% von oben
+
+            slide.shapes.add_picture(
+                image_path,
+                left=img_left,
+                top=img_top,
+                width=img_width
+            )
+            print(f'  ✓ Bild eingefügt (Position: {img_left/914400:.1f}" x {img_top/914400:.1f}")')
+        except Exception as e:
+            print(f"  ⚠ Bild-Fehler: {e}")
+
+    return slide
+
+
+def new_output_dir(root="storage"):
+    """
+    Eigener Ordner pro Generierung (storage/<id>/): Sessions und Batch-Jobs in
+    derselben Sprache überschreiben sich sonst gegenseitig Deck und Manifest -
+    und regenerate_slides würde die falsche Präsentation bearbeiten.
+    """
+    path = os.path.join(root, uuid.uuid4().hex)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def manifest_path_for(ppt_path):
+    return os.path.splitext(ppt_path)[0] + ".manifest.json"
+
+
+def write_manifest(ppt_path, presentation_data, decisions, language, template_name,
+                   image_style, image_mode, image_colors, optimized=False):
+    """Sidecar-Datei mit Plan und Entscheidungen pro Slide (Grundlage für regenerate_slides)."""
+    manifest = {
+        "language": language,
+        "template_name": template_name,
+        "image_style": image_style,
+        "image_mode": image_mode,
+        "image_colors": image_colors,
+        "plan": presentation_data.model_dump(),
+        "slides": decisions,
+        "optimized": optimized,
+    }
+    with open(manifest_path_for(ppt_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def load_manifest(ppt_path):
+    with open(manifest_path_for(ppt_path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_presentation(prs, output_path, optimize=None):
+    """
+    Speichert die Präsentation und verkleinert sie optional (optimize=None: OPTIMIZE_OUTPUT).
+
+    Returns:
+        True, wenn das Deck optimiert wurde (gehört ins Manifest)
+    """
+    prs.save(output_path)
+    if not (OPTIMIZE_OUTPUT if optimize is None else optimize):
+        return False
+    optimize_pptx(output_path)
+    return True
+
+
+def replace_slide(prs, index, new_slide):
+    """Setzt new_slide (zuletzt angehängt) an Position index und entfernt die alte Slide."""
+    sld_ids = prs.slides._sldIdLst
+    new_id = sld_ids[-1]
+    old_id = sld_ids[index]
+    prs.part.drop_rel(old_id.rId)
+    sld_ids.remove(old_id)
+    sld_ids.insert(index, new_id)
+    return new_slide
+
+
+@usage_job("regenerate")
+def regenerate_slides(ppt_path, slide_indices, presentation_data=None, cancel_token=None, progress=None):
+    """
+    Berechnet nur die gewählten Slides neu (Layout, Stil, Bild) und tauscht sie
+    in der gespeicherten Präsentation aus. Alle anderen Slides bleiben unangetastet.
+
+    Args:
+        ppt_path: Pfad einer mit generate_ppt_with_agent erzeugten PPT (mit Manifest)
+        slide_indices: 0-basierte Indizes der neu zu erzeugenden Slides
+        presentation_data: Optional geänderter Plan (z.B. neuer Titel); sonst der Plan aus dem Manifest
+        cancel_token / progress: wie generate_ppt_with_agent
+
+    Returns:
+        Pfad zur aktualisierten PPT
+    """
+    manifest = load_manifest(ppt_path)
+    if presentation_data is None:
+        presentation_data = PresentationStructure.model_validate(manifest["plan"])
+    total_slides = len(presentation_data.slides)
+
+    template_name = manifest["template_name"]
+    optimized = manifest.get("optimized", False)
+    if optimized:
+        # Im optimierten Deck fehlen die unbenutzten Layouts - aus dem Template neu zusammensetzen
+        template_file, template_analysis = _load_template_via_mcp(template_name) if template_name else (None, None)
+        prs = _new_presentation(template_file)
+    else:
+        template_analysis = asyncio.run(analyze_template_via_mcp(template_name)) if template_name else None
+        prs = Presentation(ppt_path)
+
+    cancel_token = cancel_token or CancelToken()
+    selected = sorted(set(slide_indices))
+    for done, i in enumerate(selected):
+        cancel_token.raise_if_cancelled()
+        if not 0 <= i < min(total_slides, len(manifest["slides"])):
+            raise ValueError(f"Slide {i + 1} existiert nicht (Präsentation hat {len(manifest['slides'])} Slides)")
+        slide_data = presentation_data.slides[i]
+        print(f"--> Regeneriere Slide {i+1}: {slide_data.title}")
+
+        # Die gewählten Slides werden bewusst neu entschieden (neues Bild, neues Layout)
+        decision = decide_slide(
+            template_analysis, slide_data, i, total_slides,
+            manifest["image_style"], manifest["image_mode"], manifest["image_colors"],
+            template_name=template_name if template_analysis else None, use_memo=False
+        )
+        if not optimized:
+            replace_slide(prs, i, build_slide(prs, slide_data, decision, is_title_slide=(i == 0)))
+        manifest["slides"][i] = decision
+        report(progress, "slides", done + 1, len(selected), slide_data.title)
+
+    if optimized:
+        # Übrige Slides aus den Entscheidungen im Manifest - keine LLM-Aufrufe, keine Bildabrufe
+        for i, slide_data in enumerate(presentation_data.slides):
+            build_slide(prs, slide_data, manifest["slides"][i], is_title_slide=(i == 0))
+
+    save_presentation(prs, ppt_path, optimize=optimized)
+    write_manifest(ppt_path, presentation_data, manifest["slides"], manifest["language"], template_name,
+                   manifest["image_style"], manifest["image_mode"], manifest["image_colors"], optimized=optimized)
+    print(f"✓ {len(set(slide_indices))} Slide(s) neu erzeugt: {ppt_path}")
+    return ppt_path
+
+
+@usage_job("build")
 def generate_ppt_with_agent(presentation_data, language="Deutsch", template_name=None,
-                            image_style="flat_illustration", image_mode="auto", image_colors=None):
+                            image_style="flat_illustration", image_mode="auto", image_colors=None,
+                            output_path=None, cancel_token=None, progress=None, optimize=None):
     """
     Agent 2: Generiert PPT mit intelligenter Layout-Auswahl.
 
@@ -343,6 +781,10 @@ def generate_ppt_with_agent(presentation_data, language="Deutsch", template_name
         image_style: Bildstil (flat_illustration, fine_line, photorealistic)
         image_mode: Bildquelle (auto, stock_only, ai_only)
         image_colors: Farbschema dict {"primary": "#hex", "secondary": "#hex"} (optional)
+        output_path: Zielpfad (Standard: <new_output_dir()>/generated_presentation_<Sprache>.pptx)
+        cancel_token: build_control.CancelToken - wird vor jeder Slide geprüft (BuildCancelled)
+        progress: Callback progress(stage, done, total, message), siehe build_control
+        optimize: Deck nach dem Speichern verkleinern (pptx_optimizer); None = OPTIMIZE_OUTPUT
 
     Returns:
         Pfad zur generierten PPT
@@ -351,34 +793,295 @@ def generate_ppt_with_agent(presentation_data, language="Deutsch", template_name
     print("AGENT 2: PPT BUILDER AGENT")
     print("="*60)
 
-    # 1. Template laden VIA MCP (kein Dateisystem-Zugriff!)
-    template_file = None
+    # 1. Farben bestimmen - Agent wählt wenn keine User-Farben
+    #    (braucht nur Plan und Template-Analyse, daher vor dem Template-Download;
+    #    die Analyse wird danach beim Zusammenbau wiederverwendet)
     template_analysis = None
-
-    if template_name:
-        # Hole Template-Datei und Analyse über MCP
-        template_file = asyncio.run(get_template_file_from_mcp(template_name))
-        template_analysis = asyncio.run(analyze_template_via_mcp(template_name))
-
-        if template_file and template_analysis:
-            print(f"✓ Template via MCP geladen: {template_name}")
-            print(f'  Dimensionen: {template_analysis["slide_width_inches"]}" x {template_analysis["slide_height_inches"]}"')
-            print(f"  Verfügbare Layouts: {template_analysis['total_layouts']}")
-            print("  Template Analysis (first 2000 chars):")
-            print(json.dumps(template_analysis, indent=2)[:2000])
-            if len(json.dumps(template_analysis, indent=2)) > 2000:
-                print("  ... (truncated)")
-        else:
-            print("⚠ Template konnte nicht über MCP geladen werden - verwende Standard")
-
-    # 1b. Farben bestimmen - Agent wählt wenn keine User-Farben
     if image_colors is None:
         print("\n🎨 Keine Farben vorgegeben - Agent wählt passende Farben...")
+        template_analysis = asyncio.run(analyze_template_via_mcp(template_name)) if template_name else None
         image_colors = decide_colors_for_presentation(presentation_data, template_analysis)
     else:
         print(f"\n🎨 User-Farben: Primary={image_colors['primary']}, Secondary={image_colors['secondary']}")
 
-    # 2. PowerPoint erstellen aus Template-Bytes
+    # 1b. Bilder hängen nicht vom Layout ab: alle Abrufe sofort starten, sie laufen
+    #     parallel zu Template-Laden und Layout-Entscheidungen
+    image_pool = ThreadPoolExecutor(max_workers=IMAGE_PREFETCH_WORKERS, thread_name_prefix="image-prefetch")
+    image_futures = prefetch_slide_images(image_pool, presentation_data.slides, image_style, image_mode, image_colors)
+    print(f"--> Bild-Prefetch gestartet ({len(image_futures)} Slides, {IMAGE_PREFETCH_WORKERS} parallel)")
+    try:
+        return _assemble_presentation(presentation_data, language, template_name, image_style,
+                                      image_mode, image_colors, image_futures, output_path=output_path,
+                                      cancel_token=cancel_token, progress=progress, optimize=optimize,
+                                      template_analysis=template_analysis)
+    finally:
+        image_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@usage_job("build")
+def generate_ppt_from_stream(slide_stream, language="Deutsch", template_name=None,
+                             image_style="flat_illustration", image_mode="auto", image_colors=None,
+                             expected_slides=None, output_path=None, cancel_token=None, progress=None,
+                             optimize=None):
+    """
+    Pipeline-Variante von generate_ppt_with_agent für agent_logic.stream_plan_slides().
+
+    Jede Slide geht sofort nach ihrem Eintreffen in Bild-Prefetch und Layout-
+    Entscheidung, während der Plan noch gestreamt wird. Das Template wird
+    parallel dazu geladen. Zusammengebaut wird nach dem Ende des Streams.
+
+    Args:
+        slide_stream: Iterator über CustomerSlide
+        expected_slides: erwartete Anzahl Slides (für "letzte Folie" im Layout-Prompt)
+        übrige Args wie generate_ppt_with_agent
+
+    Returns:
+        Pfad zur generierten PPT
+    """
+    print("\n" + "="*60)
+    print("AGENT 2: PPT BUILDER AGENT (Streaming)")
+    print("="*60)
+    cancel_token = cancel_token or CancelToken()
+
+    image_pool = ThreadPoolExecutor(max_workers=IMAGE_PREFETCH_WORKERS, thread_name_prefix="image-prefetch")
+    layout_pool = ThreadPoolExecutor(max_workers=LAYOUT_WORKERS, thread_name_prefix="layout")
+    try:
+        # Pro Aufgabe ein eigener Kontext-Snapshot - ein Context kann nicht in zwei Threads gleichzeitig laufen
+        template_future = layout_pool.submit(
+            contextvars.copy_context().run, _load_template_via_mcp, template_name
+        ) if template_name else None
+
+        def decide_layout(slide_data, i):
+            template_analysis = template_future.result()[1] if template_future else None
+            return decide_slide(
+                template_analysis, slide_data, i, max(expected_slides or 0, i + 1),
+                image_style, image_mode, image_colors,
+                template_name=template_name if template_analysis else None,
+                with_image=False
+            )
+
+        slides, image_futures, decision_futures = [], [], []
+        for i, slide_data in enumerate(slide_stream):
+            cancel_token.raise_if_cancelled()
+
+            if image_colors is None:
+                # Die Titelfolie trägt das Thema - reicht für die Farbwahl
+                print("\n🎨 Keine Farben vorgegeben - Agent wählt passende Farben...")
+                image_colors = decide_colors_for_presentation(
+                    PresentationStructure(slides=[slide_data]),
+                    template_future.result()[1] if template_future else None
+                )
+
+            print(f"--> Pipeline: Slide {i+1} '{slide_data.title}' gestartet")
+            report(progress, "plan", i + 1, expected_slides, slide_data.title)
+            slides.append(slide_data)
+            image_futures.extend(prefetch_slide_images(image_pool, [slide_data], image_style, image_mode, image_colors))
+            decision_futures.append(layout_pool.submit(contextvars.copy_context().run, decide_layout, slide_data, i))
+
+        if not slides:
+            raise Exception("Der Plan-Stream hat keine Folien geliefert.")
+
+        return _assemble_presentation(
+            PresentationStructure(slides=slides), language, template_name, image_style, image_mode,
+            image_colors, image_futures,
+            template=template_future.result() if template_future else None,
+            decision_futures=decision_futures, output_path=output_path,
+            cancel_token=cancel_token, progress=progress, optimize=optimize
+        )
+    finally:
+        image_pool.shutdown(wait=False, cancel_futures=True)
+        layout_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@usage_job("build")
+def generate_ppt_variants(presentation_data, language, translations, template_name=None,
+                          image_style="flat_illustration", image_mode="auto", image_colors=None,
+                          output_dir=None, cancel_token=None, progress=None, optimize=None):
+    """
+    Mehrsprachen-Modus: baut die Präsentation in language wie generate_ppt_with_agent
+    und daraus die übersetzten Varianten. Layouts, Farben und Bilder hängen nicht
+    von der Sprache ab und werden für alle Varianten übernommen - pro weiterer
+    Sprache fällt nur noch das Zusammensetzen der Folien an.
+
+    Args:
+        presentation_data: Plan in der Ausgangssprache
+        translations: {Sprache: PresentationStructure} (gleiche Folien wie der Plan)
+                      oder ein Future darauf - die Übersetzung kann so parallel zum
+                      Aufbau der ersten Präsentation laufen
+        output_dir: Zielordner für generated_presentation_<Sprache>.pptx (Standard: new_output_dir())
+        übrige Args wie generate_ppt_with_agent
+
+    Returns:
+        dict {Sprache: Pfad zur PPT}, Ausgangssprache zuerst
+    """
+    cancel_token = cancel_token or CancelToken()
+    output_dir = output_dir or new_output_dir()
+    base_path = generate_ppt_with_agent(
+        presentation_data, language, template_name=template_name, image_style=image_style,
+        image_mode=image_mode, image_colors=image_colors,
+        output_path=os.path.join(output_dir, f"generated_presentation_{language}.pptx"),
+        cancel_token=cancel_token, progress=progress, optimize=optimize
+    )
+    manifest = load_manifest(base_path)
+    decisions = manifest["slides"]
+    if hasattr(translations, "result"):
+        translations = translations.result()
+
+    template_bytes = None
+    if template_name:
+        template_file = asyncio.run(get_template_file_from_mcp(template_name))
+        template_bytes = template_file.getvalue() if template_file else None
+
+    paths = {language: base_path}
+    for variant_language, variant_plan in translations.items():
+        if len(variant_plan.slides) != len(presentation_data.slides):
+            raise ValueError(f"Übersetzung nach {variant_language} hat {len(variant_plan.slides)} statt "
+                             f"{len(presentation_data.slides)} Folien")
+        print(f"--> Variante {variant_language}: übernehme Layouts und Bilder aus {language}")
+        prs = _new_presentation(BytesIO(template_bytes) if template_bytes else None)
+        for i, slide_data in enumerate(variant_plan.slides):
+            cancel_token.raise_if_cancelled()
+            build_slide(prs, slide_data, decisions[i], is_title_slide=(i == 0))
+
+        output_path = os.path.join(output_dir, f"generated_presentation_{variant_language}.pptx")
+        optimized = save_presentation(prs, output_path, optimize)
+        write_manifest(output_path, variant_plan, decisions, variant_language, template_name,
+                       image_style, image_mode, manifest["image_colors"], optimized=optimized)
+        paths[variant_language] = output_path
+        report(progress, "variant", len(paths) - 1, len(translations), variant_language)
+        print(f"✓ Variante {variant_language} erstellt: {output_path}")
+    return paths
+
+
+@usage_job("preview")
+def generate_template_previews(presentation_data, template_names, language="Deutsch",
+                               image_style="flat_illustration", image_mode="auto", image_colors=None,
+                               output_dir=os.path.join("storage", "previews"), cancel_token=None, progress=None,
+                               optimize=None):
+    """
+    Template-Vergleich: baut denselben Plan in mehreren Templates.
+
+    Alles, was nicht vom Template abhängt, wird nur einmal berechnet: Farben,
+    Bildstil und Bilder (ein gemeinsamer Prefetch) sowie der Layout-Typ jeder
+    Slide (adecide_layout_categories, memoisiert). Pro Template bleiben der
+    Template-Download, die vom MCP Server gecachte Analyse, die Zuordnung
+    Typ -> Layout (match_layout) und das Zusammensetzen. Downloads, Analysen und
+    Layout-Typen laufen gemeinsam in einem Event-Loop. Die Layout-Wahl landet im
+    Slide-Memo - wird eine Vorschau danach regulär erzeugt, kostet sie keine
+    LLM-Aufrufe und keine Bildabrufe mehr.
+
+    Args:
+        template_names: Templates, in denen die Vorschau gebaut wird
+        image_colors: ohne Vorgabe wählt der Agent die Farben einmal anhand des
+                      ersten Templates - alle Vorschauen zeigen dieselben Bilder
+        output_dir: Zielordner für preview_<Template>.pptx (jeweils mit Manifest)
+        übrige Args wie generate_ppt_with_agent
+
+    Returns:
+        dict {Template-Name: Pfad zur PPT} in der Reihenfolge von template_names
+    """
+    print("\n" + "="*60)
+    print(f"AGENT 2: TEMPLATE-VORSCHAU ({len(template_names)} Templates)")
+    print("="*60)
+    cancel_token = cancel_token or CancelToken()
+    os.makedirs(output_dir, exist_ok=True)
+    slides = presentation_data.slides
+    total_slides = len(slides)
+
+    async def prepare():
+        # Alle Templates (Datei + Analyse) und alle Layout-Typen in einem Event-Loop
+        loaded, categories = await asyncio.gather(
+            asyncio.gather(*(_aload_template(name) for name in template_names)),
+            adecide_layout_categories(slides)
+        )
+        return dict(zip(template_names, loaded)), categories
+
+    template_pool = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix="preview")
+    image_pool = ThreadPoolExecutor(max_workers=IMAGE_PREFETCH_WORKERS, thread_name_prefix="image-prefetch")
+    try:
+        image_futures = None
+        if image_colors is not None:
+            image_futures = prefetch_slide_images(image_pool, slides, image_style, image_mode, image_colors)
+        templates, categories = asyncio.run(prepare())
+        if image_colors is None:
+            print("\n🎨 Keine Farben vorgegeben - Agent wählt Farben einmal für alle Vorschauen...")
+            first_analysis = templates[template_names[0]][1] if template_names else None
+            image_colors = decide_colors_for_presentation(presentation_data, first_analysis)
+            image_futures = prefetch_slide_images(image_pool, slides, image_style, image_mode, image_colors)
+
+        def build_preview(template_name):
+            template_file, template_analysis = templates[template_name]
+            prs = _new_presentation(template_file if template_analysis else None)
+            decisions = []
+            for i, slide_data in enumerate(slides):
+                cancel_token.raise_if_cancelled()
+                if template_analysis:
+                    key = slide_decision_key(slide_data, template_name, i, total_slides)
+                    layout_index = match_layout(template_analysis["layouts"], categories[i], i)
+                    slide_memo.set(key, {"layout_index": layout_index})
+                else:
+                    key = slide_decision_key(slide_data, None, i, total_slides)
+                    layout_index = 0 if i == 0 else 1
+                decision = {"key": key, "layout_index": layout_index, **image_futures[i].result()}
+                build_slide(prs, slide_data, decision, is_title_slide=(i == 0))
+                decisions.append(decision)
+
+            output_path = os.path.join(output_dir, f"preview_{os.path.splitext(template_name)[0]}.pptx")
+            optimized = save_presentation(prs, output_path, optimize)
+            write_manifest(output_path, presentation_data, decisions, language,
+                           template_name if template_analysis else None, image_style, image_mode, image_colors,
+                           optimized=optimized)
+            print(f"✓ Vorschau erstellt: {output_path}")
+            return output_path
+
+        build_futures = {
+            name: template_pool.submit(contextvars.copy_context().run, build_preview, name)
+            for name in template_names
+        }
+        paths = {}
+        for name in template_names:
+            paths[name] = build_futures[name].result()
+            report(progress, "preview", len(paths), len(template_names), name)
+        return paths
+    finally:
+        for pool in (template_pool, image_pool):
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _aload_template(template_name):
+    """Template-Datei und Analyse gleichzeitig über MCP holen."""
+    template_file, template_analysis = await asyncio.gather(
+        get_template_file_from_mcp(template_name), analyze_template_via_mcp(template_name)
+    )
+    return template_file, template_analysis
+
+
+def _load_template_via_mcp(template_name):
+    return asyncio.run(_aload_template(template_name))
+
+
+async def _aprepare_deck(template_name, slides, template_analysis=None):
+    """
+    Template-Datei, Template-Analyse und die Layout-Typen der Slides (ohne Layout-Memo)
+    gleichzeitig in einem Event-Loop - statt Template-Download und danach ein
+    LLM-Aufruf pro Slide nacheinander.
+
+    template_analysis: schon vorhandene Analyse (Farbwahl) - dann wird nur die Datei geholt
+    """
+    pending = [i for i, slide_data in enumerate(slides)
+               if slide_memo.get(slide_decision_key(slide_data, template_name, i, len(slides))) is None]
+
+    async def load():
+        if template_analysis is None:
+            return await _aload_template(template_name)
+        return await get_template_file_from_mcp(template_name), template_analysis
+
+    template, _ = await asyncio.gather(load(), adecide_layout_categories(slides, indices=pending))
+    return template
+
+
+def _new_presentation(template_file):
+    """Leere Präsentation aus Template-Bytes (Beispiel-Folien entfernt) bzw. Standard 16:9."""
     if template_file:
         # WICHTIG: Presentation() kann BytesIO direkt verarbeiten!
         prs = Presentation(template_file)
@@ -397,129 +1100,82 @@ def generate_ppt_with_agent(presentation_data, language="Deutsch", template_name
         prs = Presentation()
         prs.slide_width = Inches(16)
         prs.slide_height = Inches(9)
+    return prs
+
+
+def _assemble_presentation(presentation_data, language, template_name, image_style, image_mode,
+                           image_colors, image_futures, template=None, decision_futures=None,
+                           output_path=None, cancel_token=None, progress=None, optimize=None,
+                           template_analysis=None):
+    """
+    Template laden, Layouts entscheiden und Slides bauen, während die Bilder im Prefetch laufen.
+
+    template / decision_futures: bereits geladenes Template bzw. schon laufende
+    Slide-Entscheidungen (Streaming-Modus); sonst wird beides hier erledigt.
+    template_analysis: bereits geholte Analyse (Farbwahl) - es fehlt nur noch die Datei
+    """
+    cancel_token = cancel_token or CancelToken()
+
+    # 2. Template laden VIA MCP (kein Dateisystem-Zugriff!)
+    template_file = None
+
+    if template_name:
+        # Hole Template-Datei und Analyse über MCP (die Layout-Typen werden dabei schon entschieden)
+        if template is None:
+            template = asyncio.run(_aprepare_deck(template_name, presentation_data.slides, template_analysis))
+        template_file, template_analysis = template
 
-    # 3. Slides generieren mit intelligenter Layout-Wahl
+        if template_file and template_analysis:
+            print(f"✓ Template via MCP geladen: {template_name}")
+            print(f'  Dimensionen: {template_analysis["slide_width_inches"]}" x {template_analysis["slide_height_inches"]}"')
+            print(f"  Verfügbare Layouts: {template_analysis['total_layouts']}")
+            print("  Template Analysis (first 2000 chars):")
+            print(json.dumps(template_analysis, indent=2)[:2000])
+            if len(json.dumps(template_analysis, indent=2)) > 2000:
+                print("  ... (truncated)")
+        else:
+            print("⚠ Template konnte nicht über MCP geladen werden - verwende Standard")
+        report(progress, "template", 1, 1, template_name)
+
+    # 3. PowerPoint erstellen aus Template-Bytes
+    prs = _new_presentation(template_file)
+
+    # 4. Slides generieren mit intelligenter Layout-Wahl
     print(f"\n{'='*60}")
     print("GENERIERE SLIDES MIT INTELLIGENTER LAYOUT-WAHL")
     print(f"{'='*60}\n")
 
     total_slides = len(presentation_data.slides)
+    decisions = []
 
     for i, slide_data in enumerate(presentation_data.slides):
         # CANCELLATION CHECK
-        if st.session_state.get('cancel_requested', False):
-            print("--> Abbrechen-Anfrage im PPT-Agent erkannt. Beende Generierung.")
-            raise Exception("Präsentations-Erstellung durch Benutzer abgebrochen.")
-        
-        print(f"Slide {i+1}: {slide_data.title}")
+        cancel_token.raise_if_cancelled()
 
-        # Agent entscheidet Layout
-        if template_analysis:
-            layout_index = decide_layout_for_slide(
-                template_analysis,
-                slide_data,
-                is_first_slide=(i == 0),
-                slide_index=i,
-                total_slides=total_slides
-            )
-            layout = prs.slide_layouts[layout_index]
-        else:
-            # Ohne Template: Standard-Logik
-            layout = prs.slide_layouts[0] if i == 0 else prs.slide_layouts[1]
-
-        slide = prs.slides.add_slide(layout)
-        is_title_slide = (i == 0)
-
-        # Titel setzen
-        if slide.shapes.title:
-            slide.shapes.title.text = slide_data.title
-
-        # TITLE SLIDE: Subtitle befüllen (idx=1 ist oft Subtitle)
-        if is_title_slide:
-            # Erstelle Subtitle aus den ersten Bullets
-            subtitle_text = ""
-            if slide_data.bullets:
-                subtitle_parts = [item.bullet for item in slide_data.bullets[:2]]
-                subtitle_text = " | ".join(subtitle_parts)
-
-            # Suche Subtitle-Placeholder (idx=1 bei Title Slides)
-            for shape in slide.placeholders:
-                if shape.placeholder_format.idx == 1 and shape.has_text_frame:
-                    shape.text_frame.text = subtitle_text
-                    print(f"  Subtitle gesetzt: '{subtitle_text[:50]}...'" )
-                    break
+        print(f"Slide {i+1}: {slide_data.title}")
 
-        # CONTENT SLIDES: Content einfügen
+        # Agent entscheidet Layout, Bildstil und Bild (unveränderte Slides aus dem Memo)
+        if decision_futures is not None:
+            decision = {**decision_futures[i].result(), **image_futures[i].result()}
         else:
-            tf = None
-            for idx in [1, 2, 3]:  # Versuche verschiedene Indices
-                for shape in slide.placeholders:
-                    if shape.placeholder_format.idx == idx and shape.has_text_frame:
-                        tf = shape.text_frame
-                        print(f"  Content Placeholder: idx={idx}")
-                        break
-                if tf:
-                    break
-
-            if tf:
-                tf.clear()
-                for item in slide_data.bullets:
-                    p = tf.add_paragraph()
-                    p.text = item.bullet
-                    p.level = 0
-                    for sub in item.sub:
-                        ps = tf.add_paragraph()
-                        ps.text = sub
-                        ps.level = 1
-            else:
-                print(f"  ⚠ Kein Content-Placeholder gefunden!")
-
-        # Bild einfügen - DYNAMISCH basierend auf Foliengröße!
-        if slide_data.unsplashSearchTerms:
-            # Setze Bild-Einstellungen auf der Slide (von UI-Parametern)
-            # Bei "auto" lässt der Agent den Stil entscheiden
-            if image_style == "auto":
-                slide_data.style = decide_image_style_for_slide(slide_data)
-            else:
-                slide_data.style = image_style
-
-            slide_data.image_mode = image_mode
-            # Farben sind immer vorhanden (User oder Agent-gewählt)
-            slide_data.colors = ImageColors(
-                primary=image_colors.get("primary", "#0066CC"),
-                secondary=image_colors.get("secondary", "#00CC66")
+            decision = decide_slide(
+                template_analysis, slide_data, i, total_slides,
+                image_style, image_mode, image_colors,
+                template_name=template_name if template_analysis else None,
+                image_future=image_futures[i]
             )
-
-            image_path = get_image_from_gurkli(slide_data)
-            if image_path and os.path.exists(image_path):
-                try:
-                    # Berechne Position basierend auf Foliengröße
-                    slide_width = prs.slide_width
-                    slide_height = prs.slide_height
-
-                    # Bild soll ca. 35% der Folienbreite einnehmen
-                    img_width = int(slide_width * 0.35)
-
-                    # Position: rechte untere Ecke mit Rand
-                    margin = Inches(0.3)
-                    img_left = slide_width - img_width - margin
-                    img_top = int(slide_height * 0.35)  # Startet bei ca. 35% von oben
-
-                    slide.shapes.add_picture(
-                        image_path,
-                        left=img_left,
-                        top=img_top,
-                        width=img_width
-                    )
-                    print(f'  ✓ Bild eingefügt (Position: {img_left/914400:.1f}" x {img_top/914400:.1f}")')
-                except Exception as e:
-                    print(f"  ⚠ Bild-Fehler: {e}")
+        build_slide(prs, slide_data, decision, is_title_slide=(i == 0))
+        decisions.append(decision)
+        report(progress, "slides", i + 1, total_slides, slide_data.title)
 
         print()
 
-    # 4. Speichern
-    output_path = os.path.join("storage", f"generated_presentation_{language}.pptx")
-    prs.save(output_path)
+    # 5. Speichern
+    output_path = output_path or os.path.join(new_output_dir(), f"generated_presentation_{language}.pptx")
+    optimized = save_presentation(prs, output_path, optimize)
+    write_manifest(output_path, presentation_data, decisions, language, template_name,
+                   image_style, image_mode, image_colors, optimized=optimized)
+    report(progress, "saved", total_slides, total_slides, output_path)
 
     print(f"{'='*60}")
     print(f"✓ AGENT 2: PPT erfolgreich erstellt: {output_path}")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Optimierung fertiger Präsentationen (optionaler Schritt nach dem Speichern).
+
+Templates im Slidesgo-Stil bringen Dutzende Layouts, mehrere Master und große
+Bilder mit. Nach dem Entfernen der Beispiel-Folien bleibt all das im Deck,
+obwohl keine generierte Folie es nutzt. optimize_pptx():
+
+1. entfernt Layouts, die keine Folie verwendet, und Master ohne verwendete Layouts
+   (Bilder und Themes, die nur daran hingen, fallen beim Speichern mit weg)
+2. entfernt eingebettete Schriften, die in keiner verbliebenen Folie, keinem
+   Layout, Master oder Theme mehr vorkommen
+3. führt byte-gleiche Medien auf einen Part zusammen (nach dem Speichern auf
+   ZIP-/OPC-Ebene: .rels-Ziele umschreiben, Kopien weglassen)
+4. packt das ZIP neu: XML mit maximaler Kompression, bereits komprimierte
+   Medien (JPEG, PNG, ...) unkomprimiert - ein zweites Deflate spart dort nichts
+
+Achtung: Layout-Indizes der Template-Analyse gelten für ein optimiertes Deck
+nicht mehr. regenerate_slides baut solche Decks deshalb aus dem Template neu.
+
+Aufruf:
+    python pptx_optimizer.py storage/generated_presentation_Deutsch.pptx
+"""
+import argparse
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import zipfile
+from io import BytesIO
+
+from lxml import etree
+from pptx import Presentation
+from pptx.oxml.ns import qn
+
+# Medien, die schon komprimiert sind - im ZIP nur gespeichert
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".wdp", ".mp3", ".m4a", ".mp4", ".mov", ".wmv"}
+COMPRESS_LEVEL = 9
+TYPEFACE_PATTERN = re.compile(rb'typeface="([^"]+)"')
+MEDIA_PREFIX = "ppt/media/"
+CONTENT_TYPES_NAME = "[Content_Types].xml"
+
+
+def prune_layouts(prs):
+    """Entfernt unbenutzte Layouts und Master. Gibt (entfernte Layouts, entfernte Master) zurück."""
+    used_layouts = {slide.slide_layout.part for slide in prs.slides}
+    removed_layouts = 0
+    for master in prs.slide_masters:
+        for layout in list(master.slide_layouts):
+            if layout.part not in used_layouts:
+                master.slide_layouts.remove(layout)
+                removed_layouts += 1
+
+    # Master ohne Layouts fallen weg - mindestens einer bleibt für neue Folien erhalten
+    master_ids = prs.element.find(qn("p:sldMasterIdLst"))
+    removed_masters = 0
+    for master_id, master in reversed(list(zip(master_ids.findall(qn("p:sldMasterId")), prs.slide_masters))):
+        if len(master.slide_layouts) == 0 and len(master_ids.findall(qn("p:sldMasterId"))) > 1:
+            master_ids.remove(master_id)
+            prs.part.drop_rel(master_id.get(qn("r:id")))
+            removed_masters += 1
+    return removed_layouts, removed_masters
+
+
+def prune_embedded_fonts(prs):
+    """Entfernt eingebettete Schriften ohne Verwendung. Gibt die Anzahl entfernter Schriften zurück."""
+    font_list = prs.element.find(qn("p:embeddedFontLst"))
+    if font_list is None:
+        return 0
+
+    used = set()
+    for part in prs.part.package.iter_parts():
+        if part is not prs.part and part.content_type.endswith("+xml"):
+            used.update(name.decode("utf-8") for name in TYPEFACE_PATTERN.findall(part.blob))
+
+    removed = 0
+    for embedded in list(font_list):
+        font = embedded.find(qn("p:font"))
+        if font is None or font.get("typeface") in used:
+            continue
+        # regular/bold/italic/boldItalic verweisen per r:id auf die Schriftdaten
+        for variant in embedded:
+            rId = variant.get(qn("r:id"))
+            if rId:
+                prs.part.drop_rel(rId)
+        font_list.remove(embedded)
+        removed += 1
+    if len(font_list) == 0:
+        font_list.getparent().remove(font_list)
+    return removed
+
+
+def read_entries(data):
+    """{Name im ZIP: Bytes} eines gespeicherten Decks (Reihenfolge der Einträge bleibt)."""
+    with zipfile.ZipFile(BytesIO(data)) as source:
+        return {info.filename: source.read(info) for info in source.infolist()}
+
+
+def deduplicate_media(entries):
+    """
+    Führt byte-gleiche Medien im gespeicherten Paket zusammen: alle Verweise in den
+    .rels-Dateien zeigen danach auf einen Part, die Kopien fallen aus entries.
+    Gibt die Anzahl entfernter Parts zurück.
+    """
+    canonical = {}
+    replacements = {}
+    for name, blob in entries.items():
+        if not name.startswith(MEDIA_PREFIX):
+            continue
+        digest = hashlib.sha1(blob).hexdigest()
+        if digest in canonical:
+            replacements[name] = canonical[digest]
+        else:
+            canonical[digest] = name
+    if not replacements:
+        return 0
+
+    for name in [n for n in entries if n.endswith(".rels")]:
+        rels = etree.fromstring(entries[name])
+        # ppt/slides/_rels/slide1.xml.rels: Ziele sind relativ zu ppt/slides/
+        base = posixpath.dirname(posixpath.dirname(name))
+        changed = False
+        for rel in rels:
+            target = rel.get("Target")
+            if rel.get("TargetMode") == "External" or not target:
+                continue
+            if target.startswith("/"):
+                resolved = target[1:]
+            else:
+                resolved = posixpath.normpath(posixpath.join(base, target))
+            if resolved in replacements:
+                rel.set("Target", posixpath.relpath(replacements[resolved], base or "."))
+                changed = True
+        if changed:
+            entries[name] = etree.tostring(rels, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+    # Medien laufen meist über Default-Einträge (Endung) - eigene Overrides mit entfernen
+    content_types = etree.fromstring(entries[CONTENT_TYPES_NAME])
+    for override in list(content_types):
+        if override.get("PartName", "").lstrip("/") in replacements:
+            content_types.remove(override)
+    entries[CONTENT_TYPES_NAME] = etree.tostring(content_types, xml_declaration=True, encoding="UTF-8",
+                                                 standalone=True)
+    for name in replacements:
+        del entries[name]
+    return len(replacements)
+
+
+def recompress(entries):
+    """Schreibt das ZIP mit abgestimmter Kompression neu (entries: {Name im ZIP: Bytes})."""
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as target:
+        for name, blob in entries.items():
+            stored = os.path.splitext(name)[1].lower() in STORED_EXTENSIONS
+            target.writestr(name, blob, compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+    return output.getvalue()
+
+
+def optimize_pptx(path, output_path=None):
+    """
+    Optimiert eine gespeicherte Präsentation (standardmäßig an Ort und Stelle).
+
+    Returns:
+        dict: bytes_before, bytes_after, bytes_saved, layouts_removed,
+              masters_removed, fonts_removed, media_deduplicated
+    """
+    output_path = output_path or path
+    bytes_before = os.path.getsize(path)
+
+    prs = Presentation(path)
+    layouts_removed, masters_removed = prune_layouts(prs)
+    fonts_removed = prune_embedded_fonts(prs)
+    buffer = BytesIO()
+    prs.save(buffer)
+    entries = read_entries(buffer.getvalue())
+    media_deduplicated = deduplicate_media(entries)
+    data = recompress(entries)
+
+    # Atomar ersetzen - ein abgebrochener Lauf hinterlässt kein halbes Deck
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".pptx.tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+
+    report = {
+        "bytes_before": bytes_before,
+        "bytes_after": len(data),
+        "bytes_saved": bytes_before - len(data),
+        "layouts_removed": layouts_removed,
+        "masters_removed": masters_removed,
+        "fonts_removed": fonts_removed,
+        "media_deduplicated": media_deduplicated,
+    }
+    print(f"  ✓ PPT optimiert: {bytes_before / 1e6:.2f} MB -> {len(data) / 1e6:.2f} MB "
+          f"({layouts_removed} Layouts, {masters_removed} Master, {fonts_removed} Schriften, "
+          f"{media_deduplicated} doppelte Medien entfernt)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unbenutzte Layouts, Master und Medien aus PPTX-Dateien entfernen")
+    parser.add_argument("paths", nargs="+", help="PPTX-Dateien (werden überschrieben)")
+    args = parser.parse_args()
+
+    total_saved = 0
+    for path in args.paths:
+        print(f"--> {path}")
+        total_saved += optimize_pptx(path)["bytes_saved"]
+    print(f"✓ Insgesamt {total_saved / 1e6:.2f} MB gespart")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Gemeinsamer Prompt-Baukasten mit lokaler Token-Zählung und Budget.
+
+Prompts werden aus benannten Abschnitten zusammengesetzt. Übersteigt die Summe
+das Budget, werden zuerst die Abschnitte mit der niedrigsten Priorität gekürzt
+(truncatable) oder ganz weggelassen; Pflichtabschnitte (required) bleiben immer
+erhalten. build() liefert den Prompt, report() die Token pro Abschnitt.
+
+Die Zählung ist eine lokale Näherung an SentencePiece/BPE-Tokenizer (Wortteile
+von max. 4 Zeichen plus Satzzeichen) - ohne Netzwerkaufruf und schnell genug,
+um vor jedem LLM-Aufruf zu zählen.
+"""
+import os
+import re
+from itertools import islice
+
+_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+# Obergrenze für einzelne Prompts (Gemini 2.5 Flash verkraftet deutlich mehr,
+# aber jeder Token kostet Zeit und Geld)
+DEFAULT_MAX_PROMPT_TOKENS = int(os.environ.get("LLM_MAX_PROMPT_TOKENS", 250000))
+TRUNCATION_MARK = "\n[... gekürzt ...]"
+
+
+def count_tokens(text):
+    return sum(1 for _ in _TOKEN_PATTERN.finditer(text or ""))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Schneidet text nach max_tokens Tokens ab (bevorzugt am letzten Zeilen- oder Satzende)."""
+    if max_tokens <= 0:
+        return ""
+    match = next(islice(_TOKEN_PATTERN.finditer(text), max_tokens - 1, None), None)
+    if match is None or match.end() >= len(text.rstrip()):
+        return text
+    cut = match.end()
+    boundary = max(text.rfind("\n", 0, cut), text.rfind(". ", 0, cut) + 1)
+    if boundary > cut * 0.8:
+        cut = boundary
+    return text[:cut].rstrip() + TRUNCATION_MARK
+
+
+class PromptBuilder:
+    def __init__(self, budget_tokens=DEFAULT_MAX_PROMPT_TOKENS):
+        self.budget_tokens = budget_tokens
+        self.sections = []
+
+    def add(self, name, text, priority=0, truncatable=False, required=False):
+        """
+        Args:
+            name: Bezeichnung für report()
+            text: Abschnittstext (wird unverändert übernommen, inkl. Einrückung)
+            priority: höhere Priorität wird später gekürzt
+            truncatable: darf gekürzt statt nur weggelassen werden
+            required: wird nie gekürzt oder weggelassen
+        """
+        self.sections.append({
+            "name": name, "text": text, "priority": priority, "truncatable": truncatable,
+            "required": required, "tokens": count_tokens(text), "kept_tokens": None,
+        })
+        return self
+
+    def build(self):
+        for section in self.sections:
+            section["kept"] = section["text"]
+            section["kept_tokens"] = section["tokens"]
+
+        excess = sum(s["tokens"] for s in self.sections) - self.budget_tokens
+        for section in sorted(self.sections, key=lambda s: s["priority"]):
+            if excess <= 0:
+                break
+            if section["required"]:
+                continue
+            if section["truncatable"] and section["tokens"] > excess:
+                section["kept"] = truncate_to_tokens(section["text"], section["tokens"] - excess)
+                section["kept_tokens"] = count_tokens(section["kept"])
+            else:
+                section["kept"] = ""
+                section["kept_tokens"] = 0
+            excess -= section["tokens"] - section["kept_tokens"]
+
+        dropped = [s["name"] for s in self.sections if s["kept_tokens"] < s["tokens"]]
+        if dropped:
+            print(f"  ⚠ Prompt über Budget ({self.budget_tokens} Tokens) - gekürzt: {', '.join(dropped)}")
+        return "".join(s["kept"] for s in self.sections)
+
+    def report(self):
+        """{name: (tokens_original, tokens_im_prompt)} - nach build() aufrufen."""
+        return {s["name"]: (s["tokens"], s["kept_tokens"]) for s in self.sections}
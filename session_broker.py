@@ -0,0 +1,109 @@
+"""
+Session-Routing für den Scale-out-Modus des MCP Servers.
+
+SseServerTransport hält die Sessions im Prozessspeicher: ein POST auf /messages
+funktioniert nur auf dem Worker, der den SSE-Stream der Session besitzt. Mit
+mehreren uvicorn-Workern oder Replicas landet der POST aber irgendwo.
+
+Der Broker löst das über einen gemeinsamen Speicher:
+- jeder Worker registriert die Sessions, die er besitzt (session_id -> worker_id)
+- ein POST auf einem fremden Worker wird als Nachricht für die Session abgelegt
+- der besitzende Worker holt seine Nachrichten ab (pump) und speist sie in die
+  lokale Session ein
+
+SqliteSessionBroker ist der lokale Stand-in (eine Datei auf einem gemeinsamen
+Volume, reicht für mehrere Worker/Container auf einem Host). Ein Broker auf Basis
+von Redis o.ä. muss nur dieselben Methoden anbieten.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+SESSION_TTL_SECONDS = 120
+
+
+def make_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class SqliteSessionBroker:
+    def __init__(self, path, session_ttl=SESSION_TTL_SECONDS):
+        self.path = path
+        self.session_ttl = session_ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY, worker_id TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,"
+                " body BLOB NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id)")
+
+    def _connect(self):
+        # Eine Verbindung pro Thread (sqlite3-Verbindungen sind nicht thread-safe)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def register(self, session_id, worker_id):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, worker_id, updated) VALUES (?, ?, ?)",
+            (session_id, worker_id, time.time()),
+        )
+
+    def unregister(self, session_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def owner(self, session_id):
+        row = self._connect().execute(
+            "SELECT worker_id FROM sessions WHERE session_id = ? AND updated > ?",
+            (session_id, time.time() - self.session_ttl),
+        ).fetchone()
+        return row[0] if row else None
+
+    def publish(self, session_id, body):
+        self._connect().execute(
+            "INSERT INTO messages (session_id, body, created) VALUES (?, ?, ?)",
+            (session_id, body, time.time()),
+        )
+
+    def take_messages(self, worker_id):
+        """Holt (und löscht) alle Nachrichten für Sessions dieses Workers, in Eingangsreihenfolge."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT m.id, m.session_id, m.body FROM messages m"
+                " JOIN sessions s ON s.session_id = m.session_id"
+                " WHERE s.worker_id = ? ORDER BY m.id",
+                (worker_id,),
+            ).fetchall()
+            if rows:
+                conn.executemany("DELETE FROM messages WHERE id = ?", [(row[0],) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(session_id, body) for _, session_id, body in rows]
+
+    def heartbeat(self, worker_id):
+        """Hält die Sessions dieses Workers frisch und räumt verwaiste Einträge auf."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("UPDATE sessions SET updated = ? WHERE worker_id = ?", (now, worker_id))
+        conn.execute("DELETE FROM sessions WHERE updated < ?", (now - self.session_ttl,))
+        conn.execute("DELETE FROM messages WHERE created < ?", (now - self.session_ttl,))
+
@@ -0,0 +1,55 @@
+"""
+Gemeinsamer Datei-Cache für teure, deterministische Ergebnisse (Template-Analyse,
+PDF-Extraktion). Liegt auf einem Verzeichnis, das sich alle Worker und Replicas
+teilen können, und ist damit unabhängig vom Prozess, der den Eintrag erzeugt hat.
+
+Schlüssel enthalten Pfad, Grösse und mtime der Quelldatei: wird eine Datei
+ersetzt, entsteht automatisch ein neuer Eintrag.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+
+class SharedFileCache:
+    def __init__(self, cache_dir, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+
+    def file_key(self, namespace, file_path, *extra):
+        stat = os.stat(file_path)
+        raw = json.dumps([namespace, os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, *extra])
+        return f"{namespace}-{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Atomar schreiben, damit parallele Worker nie eine halbe Datei lesen
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"  ⚠ Cache-Schreibfehler ({key}): {e}")
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
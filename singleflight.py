@@ -0,0 +1,125 @@
+"""
+Single-Flight: gleichzeitige identische Anfragen teilen sich eine Berechnung.
+
+Caches helfen erst, wenn der erste Aufruf fertig ist. Wählen mehrere Benutzer
+gleichzeitig dasselbe Template oder bringen zwei Slides denselben Bild-Payload
+mit, laufen bei kaltem Cache alle Aufrufe parallel los (Stampede). Mit
+SingleFlight rechnet pro Schlüssel nur der erste Aufrufer ("Leader"); alle,
+die währenddessen mit demselben Schlüssel kommen, warten auf sein Ergebnis
+bzw. bekommen seine Exception. Danach wird der Schlüssel sofort freigegeben -
+Ergebnisse werden nicht gespeichert, dafür sind die Caches zuständig.
+
+Ein Abbruch ist keine Antwort: in ado() läuft die gemeinsame Arbeit als
+abgeschirmter Task weiter, wenn nur der Leader abgebrochen wird (z.B. MCP
+Client getrennt). Wird der Task selbst abgebrochen (Event-Loop des Leaders
+endet), bekommen die Wartenden kein CancelledError, sondern einer von ihnen
+übernimmt und rechnet neu.
+
+do() ist für Threads, ado() für asyncio. Beide teilen sich dieselben
+Einträge (concurrent.futures.Future), ein Thread kann also auf einen Leader
+im Event-Loop warten und umgekehrt. Ein synchroner Aufruf darf aber nicht im
+Event-Loop-Thread auf einen asynchronen Leader desselben Loops warten.
+
+Eingesetzt bei:
+- mcp_server.call_tool (Tool-Name + Argumente)
+- image_providers.get_image_from_gurkli (Payload)
+- ppt_agent: Layout-Typ und Bild-Entscheidung pro Memo-Schlüssel
+- agent_logic.summarize_document (Dokument-Hash)
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import Future
+
+# Ergebnis für Wartende, wenn der Leader abgebrochen wurde: neu anstellen
+_RETRY = object()
+
+
+def make_key(*parts):
+    """Stabiler Schlüssel aus JSON-fähigen Teilen (dicts unabhängig von der Reihenfolge)."""
+    return json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class SingleFlight:
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {"leaders": 0, "shared": 0, "failed": 0, "cancelled": 0}
+
+    def _join(self, key):
+        """Gibt (Future, ist_leader) zurück. Der Leader muss das Future abschliessen."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self._stats["shared"] += 1
+                return future, False
+            future = Future()
+            # RUNNING: ein abgebrochener Wartender kann das gemeinsame Future nicht mehr canceln
+            future.set_running_or_notify_cancel()
+            self._flights[key] = future
+            self._stats["leaders"] += 1
+            return future, True
+
+    def _land(self, key, future, result=None, error=None):
+        cancelled = isinstance(error, asyncio.CancelledError)
+        with self._lock:
+            self._flights.pop(key, None)
+            if cancelled:
+                self._stats["cancelled"] += 1
+            elif error is not None:
+                self._stats["failed"] += 1
+        if cancelled:
+            future.set_result(_RETRY)
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        """Führt fn() aus oder wartet auf den laufenden Aufruf mit demselben Schlüssel."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            result = future.result()
+            if result is not _RETRY:
+                return result
+        try:
+            result = fn()
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+        self._land(key, future, result)
+        return result
+
+    async def ado(self, key, coro_fn):
+        """do() für asyncio: coro_fn() wird nur vom Leader aufgerufen (als eigener Task)."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            result = await asyncio.wrap_future(future)
+            if result is not _RETRY:
+                return result
+        try:
+            task = asyncio.ensure_future(coro_fn())
+        except BaseException as e:
+            self._land(key, future, error=e)
+            raise
+
+        def land(task):
+            if task.cancelled():
+                self._land(key, future, error=asyncio.CancelledError())
+            elif task.exception() is not None:
+                self._land(key, future, error=task.exception())
+            else:
+                self._land(key, future, task.result())
+
+        task.add_done_callback(land)
+        # Ein Abbruch des Leaders trifft nur ihn - die Wartenden bekommen das Ergebnis des Tasks
+        return await asyncio.shield(task)
+
+    def metrics(self):
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights)}
@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import batch_generate
+from data_models import PresentationStructure
+
+PLAN = PresentationStructure.model_validate({"slides": [{"title": "Folie", "bullets": []}]})
+
+
+class TestBatchGenerate(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        upload = patch.object(batch_generate, "UPLOAD_DIR", os.path.join(self.tmp.name, "uploads"))
+        upload.start()
+        self.addCleanup(upload.stop)
+
+    def path(self, name, content=b"%PDF"):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_manifest_defaults_and_validation(self):
+        manifest = self.path("jobs.jsonl", b'# Kommentar\n{"pdfs": ["a.pdf"]}\n\n{"id": "x", "pdfs": ["b.pdf"]}\n')
+        self.assertEqual([j["id"] for j in batch_generate.load_manifest(manifest)], ["job2", "x"])
+        with self.assertRaises(ValueError):
+            batch_generate.load_manifest(self.path("bad.jsonl", b'{"id": "y"}\n'))
+
+    @patch("batch_generate.generate_ppt_with_agent", side_effect=lambda plan, **kw: kw["output_path"])
+    @patch("batch_generate.analyze_pdf_and_plan_ppt")
+    def test_results_record_outputs_timings_and_failures(self, plan_mock, build_mock):
+        def plan(paths, num_slides, language):
+            if "bad" in paths[0]:
+                raise RuntimeError("kaputt")
+            return PLAN
+
+        plan_mock.side_effect = plan
+        jobs = [{"id": "a", "pdfs": [self.path("good.pdf")], "language": "English", "template": "t.pptx"},
+                {"id": "b", "pdfs": [self.path("bad.pdf")]}]
+        results_path = os.path.join(self.tmp.name, "results.jsonl")
+
+        with patch("llm_usage.USAGE_LOG_PATH", ""):
+            batch_generate.run_batch(jobs, results_path, workers=2, output_dir=os.path.join(self.tmp.name, "out"))
+
+        with open(results_path, encoding="utf-8") as f:
+            results = {r["id"]: r for r in map(json.loads, f)}
+        self.assertTrue(results["a"]["ok"])
+        self.assertEqual(results["a"]["output"], os.path.join(self.tmp.name, "out", "a.pptx"))
+        self.assertIn("plan_s", results["a"])
+        self.assertEqual(results["a"]["llm"]["calls"], 0)
+        self.assertFalse(results["b"]["ok"])
+        self.assertEqual(results["b"]["error"], "RuntimeError: kaputt")
+        self.assertEqual(build_mock.call_args.kwargs["template_name"], "t.pptx")
+        self.assertTrue(os.path.exists(os.path.join(batch_generate.UPLOAD_DIR,
+                                                    batch_generate.staged_name(self.path("good.pdf")))))
+
+    def test_same_named_documents_do_not_overwrite_each_other(self):
+        os.makedirs(os.path.join(self.tmp.name, "a"))
+        os.makedirs(os.path.join(self.tmp.name, "b"))
+        first = batch_generate.stage_documents([self.path(os.path.join("a", "paper.pdf"), b"%PDF A")])[0]
+        second = batch_generate.stage_documents([self.path(os.path.join("b", "paper.pdf"), b"%PDF B")])[0]
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.basename(first).endswith("_paper.pdf"))
+        with open(first, "rb") as f:
+            self.assertEqual(f.read(), b"%PDF A")
+
+    def test_builder_does_not_import_streamlit(self):
+        code = "import sys, batch_generate; assert 'streamlit' not in sys.modules"
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                       env=dict(os.environ, GOOGLE_API_KEY="test"), capture_output=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from pptx import Presentation
+
+import ppt_agent
+from color_engine import choose_colors, extract_theme_colors, topic_hue
+from data_models import PresentationStructure
+
+TEMPLATE = os.path.join(os.path.dirname(__file__), "ppt_templates", "Tech Startup Pitch Deck.pptx")
+PALETTE = {"dk1": "#000000", "lt1": "#FFFFFF", "dk2": "#1F497D", "accent1": "#4F81BD",
+           "accent2": "#C0504D", "accent3": "#9BBB59", "accent4": "#EEEEEE", "accent6": "#F79646"}
+
+
+class TestColorEngine(unittest.TestCase):
+
+    def test_theme_colors_are_read_from_slide_master(self):
+        colors = extract_theme_colors(Presentation(TEMPLATE))
+        self.assertEqual(len(colors), 12)
+        self.assertRegex(colors["accent1"], r"^#[0-9A-F]{6}$")
+
+    def test_topic_keywords_pick_matching_accent(self):
+        self.assertEqual(topic_hue("Nachhaltigkeit und Klimaschutz"), 120)
+        colors = choose_colors(PALETTE, "Nachhaltigkeit und Klimaschutz")
+        self.assertEqual(colors["primary"], "#9BBB59")
+        self.assertNotEqual(colors["secondary"], colors["primary"])
+
+    def test_without_keywords_accent1_is_primary(self):
+        self.assertEqual(choose_colors(PALETTE, "Quartalsbericht"), {"primary": "#4F81BD", "secondary": "#C0504D"})
+        self.assertIsNone(choose_colors({"accent1": "#808080", "accent2": "#FFFFFF"}))
+
+
+class TestDecideColors(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = PresentationStructure.model_validate({"slides": [{"title": "Erneuerbare Energie", "bullets": []}]})
+
+    @patch("ppt_agent.invoke_llm")
+    def test_template_palette_skips_llm(self, mock_invoke):
+        colors = ppt_agent.decide_colors_for_presentation(self.plan, {"template_name": "x", "theme_colors": PALETTE})
+        self.assertEqual(colors["primary"], "#9BBB59")
+        mock_invoke.assert_not_called()
+
+    @patch("ppt_agent.invoke_llm")
+    def test_llm_answer_keeps_parsed_secondary(self, mock_invoke):
+        mock_invoke.return_value.content = "primary: #112233\nsecondary: #aabbcc"
+        colors = ppt_agent.decide_colors_for_presentation(self.plan)
+        self.assertEqual(colors, {"primary": "#112233", "secondary": "#AABBCC"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import doc_index
+from doc_index import DocumentIndex, chunk_document, load_chunks, save_chunks
+
+DOC = {
+    "pages": 3,
+    "sections": [
+        {"title": "1. Introduction", "level": 2, "page_start": 1, "page_end": 2,
+         "text": "Anime studies grew quickly.\nManga readers abroad became a research topic.",
+         "page_offsets": [[1, 0], [2, 28]]},
+        {"title": "2. Exports", "level": 2, "page_start": 3, "page_end": 3,
+         "text": "Used automobile exports from Japan rose sharply after 2001.",
+         "page_offsets": [[3, 0]]},
+    ],
+}
+
+
+class TestDocumentIndex(unittest.TestCase):
+
+    def test_chunks_carry_page_numbers(self):
+        chunks = chunk_document(DOC)
+        self.assertEqual([(c["section"], c["page"]) for c in chunks],
+                         [("1. Introduction", 1), ("1. Introduction", 2), ("2. Exports", 3)])
+        self.assertTrue(chunks[1]["text"].startswith("Manga readers"))
+
+    def test_search_ranks_relevant_chunk_first(self):
+        index = DocumentIndex([dict(c, doc="paper.pdf") for c in chunk_document(DOC)])
+        top = index.search("automobile exports Japan", k=2)
+        self.assertEqual((top[0]["doc"], top[0]["page"]), ("paper.pdf", 3))
+        self.assertEqual(index.search("manga readers", k=1)[0]["page"], 2)
+        self.assertEqual(index.search("quantum chromodynamics"), [])
+
+    def test_search_respects_token_budget(self):
+        chunks = [{"section": "", "page": i, "text": "anime " * 400, "terms": {"anime": 400}, "doc": "a.pdf"}
+                  for i in range(5)]
+        self.assertEqual(len(DocumentIndex(chunks).search("anime", k=5, token_budget=700)), 1)
+
+    def test_chunks_are_cached_per_hash(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(doc_index, "INDEX_DIR", tmp):
+            self.assertIsNone(load_chunks("abc"))
+            save_chunks("abc", chunk_document(DOC))
+            self.assertEqual(load_chunks("abc"), chunk_document(DOC))
+            self.assertTrue(os.path.exists(os.path.join(tmp, "abc.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
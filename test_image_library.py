@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from PIL import Image, ImageDraw
+from pptx import Presentation
+
+import ppt_agent
+from data_models import BulletItem, CustomerSlide
+from image_library import ImageLibrary, dhash, hamming
+from shared_cache import SharedFileCache
+
+COLORS = {"primary": "#112233", "secondary": "#445566"}
+
+
+def draw(path, quality=90, flip=False):
+    image = Image.new("RGB", (160, 120))
+    d = ImageDraw.Draw(image)
+    for x in range(160):
+        d.line([x, 0, x, 120], fill=(x, 80, 255 - x))
+    d.ellipse([20, 20, 70, 70] if not flip else [90, 50, 150, 110], fill="white")
+    image.save(path, quality=quality)
+    return path
+
+
+class TestImageLibrary(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.library = ImageLibrary(os.path.join(self.tmp.name, "library"))
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_near_duplicates_have_close_hashes(self):
+        a, b = draw(self.path("a.jpg")), draw(self.path("b.jpg"), quality=25)
+        other = draw(self.path("c.jpg"), flip=True)
+        self.assertLessEqual(hamming(dhash(a), dhash(b)), 6)
+        self.assertGreater(hamming(dhash(a), dhash(other)), 6)
+
+    def test_ingest_maps_near_duplicate_to_existing_image(self):
+        first = self.library.ingest(draw(self.path("a.jpg")), ["tariffs"], "flat", COLORS)
+        second = self.library.ingest(draw(self.path("b.jpg"), quality=25), ["cars"], "flat", COLORS)
+        self.assertEqual(first, second)
+        self.assertFalse(os.path.exists(self.path("b.jpg")))
+        third = self.library.ingest(draw(self.path("c.jpg"), flip=True), ["trade"], "flat", COLORS)
+        self.assertNotEqual(first, third)
+
+    def test_find_match_requires_similar_keywords_style_and_colors(self):
+        stored = self.library.ingest(draw(self.path("a.jpg")), ["automotive", "tariffs", "japan"], "flat", COLORS)
+        self.assertEqual(self.library.find_match(["automotive", "tariffs", "japan", "export"], "flat", COLORS), stored)
+        self.assertIsNone(self.library.find_match(["anime", "manga"], "flat", COLORS))
+        self.assertIsNone(self.library.find_match(["automotive", "tariffs", "japan"], "fine_line", COLORS))
+
+
+class TestSlideImageReuse(unittest.TestCase):
+
+    def test_matching_slide_reuses_library_image(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(ppt_agent, "slide_memo", SharedFileCache(os.path.join(tmp, "memo"))), \
+                patch.object(ppt_agent, "image_library", ImageLibrary(os.path.join(tmp, "library"))), \
+                patch.object(ppt_agent, "get_image_from_gurkli",
+                             side_effect=lambda s: draw(os.path.join(tmp, "img.jpg"))) as fetch:
+            first = CustomerSlide(title="Automotive Tariffs", bullets=[], unsplashSearchTerms=["car tariffs"])
+            second = CustomerSlide(title="Tariffs on Automotive Imports", bullets=[], unsplashSearchTerms=["car tariffs"])
+            a = ppt_agent.decide_slide_image(first, "flat_illustration", "auto", COLORS)
+            b = ppt_agent.decide_slide_image(second, "flat_illustration", "auto", COLORS)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(a["image_path"], b["image_path"])
+
+
+class TestRepeatedImages(unittest.TestCase):
+
+    def test_repeated_image_shares_one_part(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            image = draw(os.path.join(tmp, "placeholder.jpg"))
+            prs = Presentation()
+            decision = {"layout_index": 1, "image_path": image}
+            for i in range(4):
+                slide = CustomerSlide(title=f"Folie {i}", bullets=[BulletItem(bullet="Punkt")])
+                ppt_agent.build_slide(prs, slide, decision, is_title_slide=False)
+            out = os.path.join(tmp, "deck.pptx")
+            prs.save(out)
+
+            with zipfile.ZipFile(out) as z:
+                media = [n for n in z.namelist() if n.startswith("ppt/media/")]
+            self.assertEqual(len(media), 1)
+            self.assertEqual(sum(1 for s in Presentation(out).slides for sh in s.shapes if sh.shape_type == 13), 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import agent_logic
+from data_models import PresentationStructure, CustomerSlide, BulletItem
+from doc_index import DocumentIndex
+
+
+def make_plan(*titles):
+    return PresentationStructure(slides=[CustomerSlide(title=t, bullets=[BulletItem(bullet=t)]) for t in titles])
+
+
+class TestIncrementalPlanning(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = []
+        for name, content in (("a.pdf", b"first"), ("b.pdf", b"second")):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            self.paths.append(path)
+        chunks = [{"doc": "b.pdf", "section": "Intro", "page": 4, "text": "Anime exports", "terms": {"anime": 1, "exports": 1}}]
+        patcher = patch("agent_logic.abuild_document_index", return_value=DocumentIndex(chunks))
+        self.build_index = patcher.start()
+        self.addCleanup(patcher.stop)
+        index_dir = patch("doc_index.INDEX_DIR", os.path.join(self.tmp.name, ".index"))
+        index_dir.start()
+        self.addCleanup(index_dir.stop)
+        usage_log = patch("llm_usage.USAGE_LOG_PATH", os.path.join(self.tmp.name, "llm_usage.jsonl"))
+        usage_log.start()
+        self.addCleanup(usage_log.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch("agent_logic.get_llm")
+    def test_unchanged_documents_reuse_previous_plan(self, mock_get_llm):
+        mock_llm = mock_get_llm.return_value
+        previous = make_plan("A", "B", "C")
+        docs = agent_logic.document_fingerprints(self.paths)
+
+        plan, new_docs = agent_logic.update_plan_incrementally(previous, docs, self.paths, 3, "Deutsch", "Deutsch")
+
+        self.assertIs(plan, previous)
+        self.assertEqual(new_docs, docs)
+        mock_llm.invoke.assert_not_called()
+        mock_llm.ainvoke.assert_not_called()
+        self.build_index.assert_not_called()
+
+    @patch("agent_logic.get_llm")
+    def test_only_added_document_is_summarized_and_merged(self, mock_get_llm):
+        mock_llm = mock_get_llm.return_value
+        previous = make_plan("A", "B", "C")
+        docs = agent_logic.document_fingerprints(self.paths[:1])
+        mock_llm.ainvoke = AsyncMock(return_value=MagicMock(content="- Anime exports [S. 4]"))
+        merged = make_plan("A", "Anime exports", "C")
+        mock_llm.with_structured_output.return_value.ainvoke = AsyncMock(return_value=merged)
+
+        plan, new_docs = agent_logic.update_plan_incrementally(previous, docs, self.paths, 3, "Deutsch", "Deutsch")
+
+        self.assertEqual(len(new_docs), 2)
+        mock_llm.ainvoke.assert_called_once()
+        self.assertIn("DOKUMENT b.pdf", mock_llm.ainvoke.call_args[0][0])
+        merge_prompt = mock_llm.with_structured_output.return_value.ainvoke.call_args[0][0]
+        self.assertIn("Anime exports [S. 4]", merge_prompt)
+        self.assertEqual(plan.slides[1].sources[0].pageNumber, "4")
+
+        # Die Zusammenfassung ist pro Dokument-Hash gecacht
+        agent_logic.update_plan_incrementally(previous, docs, self.paths, 3, "Deutsch", "Deutsch")
+        mock_llm.ainvoke.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
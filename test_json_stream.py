@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import agent_logic
+import llm_usage
+from data_models import PresentationStructure
+from json_stream import IncrementalArrayParser
+
+PLAN = {"slides": [
+    {"title": "Titel mit } und [", "bullets": [{"bullet": "Zitat \"a\"", "sub": ["{x}"]}]},
+    {"title": "Zweite Folie", "bullets": []},
+]}
+
+
+class TestIncrementalArrayParser(unittest.TestCase):
+
+    def test_objects_are_emitted_as_soon_as_complete(self):
+        text = "```json\n" + json.dumps(PLAN) + "\n```"
+        first_end = text.index("}]}") + 3  # Ende der ersten Folie
+        parser = IncrementalArrayParser("slides")
+
+        self.assertEqual(parser.feed(text[:first_end - 1]), [])
+        self.assertEqual(parser.feed(text[first_end - 1:first_end]), [PLAN["slides"][0]])
+        self.assertEqual(parser.feed(text[first_end:]), [PLAN["slides"][1]])
+        self.assertTrue(parser.done)
+
+    def test_single_character_chunks(self):
+        parser = IncrementalArrayParser("slides")
+        objects = [obj for char in json.dumps(PLAN) for obj in parser.feed(char)]
+        self.assertEqual(objects, PLAN["slides"])
+
+
+class TestStreamPlanSlides(unittest.TestCase):
+
+    @patch("agent_logic.get_llm")
+    @patch("agent_logic._prepare_plan_prompt", return_value=("prompt", None))
+    def test_slides_are_yielded_from_stream(self, _prepare, mock_get_llm):
+        mock_llm = mock_get_llm.return_value
+        text = json.dumps(PLAN)
+        mock_llm.stream.return_value = [MagicMock(content=text[i:i + 7], usage_metadata=None)
+                                        for i in range(0, len(text), 7)]
+
+        with patch("llm_usage.USAGE_LOG_PATH", ""):
+            slides = list(agent_logic.stream_plan_slides(["a.pdf"], 2, "Deutsch"))
+
+        self.assertEqual([s.title for s in slides], ["Titel mit } und [", "Zweite Folie"])
+        mock_llm.with_structured_output.assert_not_called()
+
+    @patch("agent_logic.get_llm")
+    @patch("agent_logic._prepare_plan_prompt", return_value=("prompt", None))
+    def test_stream_and_fallback_are_logged_under_plan_job(self, _prepare, mock_get_llm):
+        mock_llm = mock_get_llm.return_value
+        mock_llm.stream.return_value = [MagicMock(content="Kein JSON", usage_metadata=None)]
+        fallback = PresentationStructure.model_validate(PLAN)
+        mock_llm.with_structured_output.return_value.ainvoke = AsyncMock(return_value=fallback)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "usage.jsonl")
+            with patch("llm_usage.USAGE_LOG_PATH", log_path):
+                # Wie generate_ppt_from_stream: der Verbraucher läuft in seinem eigenen Job
+                with llm_usage.usage_job("build") as build:
+                    slides = []
+                    for slide in agent_logic.stream_plan_slides(["a.pdf"], 2, "Deutsch"):
+                        self.assertIs(llm_usage._current_job.get(), build)
+                        slides.append(slide)
+            with open(log_path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual(len(slides), 2)
+        calls = {r["call"]: r["job"] for r in records if r["type"] == "call"}
+        self.assertEqual(calls, {"plan_stream": "plan", "plan": "plan"})
+        jobs = {r["job"]: r["calls"] for r in records if r["type"] == "job"}
+        self.assertEqual(jobs, {"plan": 2, "build": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import llm_usage
+from llm_scheduler import LLMScheduler, PRIORITY_BATCH, TokenBucket, llm_priority, priority_for
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_refills_at_rate_and_allows_debt(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, capacity=2, clock=clock)
+        bucket.take(2)
+        self.assertAlmostEqual(bucket.wait_time(1), 1.0)
+        clock.now = 0.5
+        self.assertAlmostEqual(bucket.wait_time(1), 0.5)
+        bucket.take(3)  # Nachverrechnung echter Tokens darf ins Minus gehen
+        self.assertAlmostEqual(bucket.wait_time(1), 3.5)
+        clock.now = 100
+        self.assertEqual(bucket.available(), 2)
+
+
+class TestLLMScheduler(unittest.TestCase):
+
+    def test_requests_per_minute_are_enforced(self):
+        scheduler = LLMScheduler(rpm=600, tpm=10**6, burst=2)  # 10 Requests/s nach 2er-Burst
+        start = time.monotonic()
+        for _ in range(4):
+            scheduler.acquire(0, 10)
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+        self.assertEqual(scheduler.metrics()["admitted"], 4)
+
+    def test_waiting_calls_are_served_by_priority(self):
+        scheduler = LLMScheduler(rpm=600, tpm=10**6, burst=1)
+        scheduler.acquire(0, 1)  # Bucket leer: alle weiteren müssen warten
+        order = []
+
+        def call(priority, name):
+            scheduler.acquire(priority, 1)
+            order.append(name)
+
+        threads = [threading.Thread(target=call, args=(PRIORITY_BATCH, f"batch{i}")) for i in range(2)]
+        threads.append(threading.Thread(target=call, args=(0, "interactive")))
+        for t in threads:
+            t.start()
+            time.sleep(0.01)
+        self.assertEqual(scheduler.metrics()["waiting"], {"interactive": 1, "default": 0, "batch": 2})
+        for t in threads:
+            t.join()
+        self.assertEqual(order, ["interactive", "batch0", "batch1"])
+
+    def test_batch_context_lowers_priority(self):
+        self.assertEqual(priority_for("plan"), 0)
+        self.assertEqual(priority_for("layout"), 1)
+        with llm_priority(PRIORITY_BATCH):
+            self.assertEqual(priority_for("plan"), PRIORITY_BATCH)
+
+    @patch("llm_scheduler.BACKOFF_BASE_SECONDS", 0.01)
+    def test_quota_errors_are_retried_with_backoff(self):
+        scheduler = LLMScheduler(max_retries=3)
+        fn = MagicMock(side_effect=[Exception("429 RESOURCE_EXHAUSTED"), Exception("429 RESOURCE_EXHAUSTED"), "ok"])
+        info = {}
+        self.assertEqual(scheduler.run("layout", 10, fn, info=info), "ok")
+        self.assertEqual((fn.call_count, info["retries"]), (3, 2))
+
+        other = MagicMock(side_effect=ValueError("kaputt"))
+        with self.assertRaises(ValueError):
+            scheduler.run("layout", 10, other)
+        self.assertEqual(other.call_count, 1)
+
+
+class TestInvokeThroughScheduler(unittest.TestCase):
+
+    @patch("llm_scheduler.BACKOFF_BASE_SECONDS", 0.01)
+    def test_invoke_llm_retries_and_logs_queue_metrics(self):
+        llm = MagicMock()
+        llm.invoke.side_effect = [Exception("429 Too Many Requests"),
+                                  MagicMock(content="ok", usage_metadata={"input_tokens": 50, "output_tokens": 3})]
+        scheduler = LLMScheduler(max_retries=2)
+        with patch.object(llm_usage, "scheduler", scheduler), patch.object(llm_usage, "_write") as write:
+            self.assertEqual(llm_usage.invoke_llm(llm, "prompt", call="layout").content, "ok")
+
+        record = write.call_args[0][0]
+        self.assertEqual((record["retries"], record["input_tokens"], record["ok"]), (1, 50, True))
+        self.assertIn("queue_ms", record)
+        self.assertEqual(scheduler.metrics()["retries"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+import mcp_client
+
+
+def mock_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestMcpClient(unittest.TestCase):
+
+    def setUp(self):
+        reset = patch.multiple(mcp_client, _http_available=False, _http_probe_failed_at=None)
+        reset.start()
+        self.addCleanup(reset.stop)
+
+    def probe(self, handler):
+        async def run():
+            async with mock_client(handler) as client:
+                return await mcp_client._probe_http(client)
+        return asyncio.run(run())
+
+    def test_failed_probe_is_retried_after_ttl(self):
+        server_up = {"value": False}
+
+        def handler(request):
+            if not server_up["value"]:
+                return httpx.Response(503)
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": {"tools": []}})
+
+        self.assertFalse(self.probe(handler))
+        server_up["value"] = True
+        self.assertFalse(self.probe(handler))  # innerhalb der TTL gilt der Fehlschlag noch
+
+        with patch.object(mcp_client, "MCP_PROBE_RETRY_SECONDS", 0):
+            self.assertTrue(self.probe(handler))
+        server_up["value"] = False
+        self.assertTrue(self.probe(handler))  # Erfolg bleibt gemerkt
+
+    def test_tool_error_result_raises(self):
+        def handler(request):
+            return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": {
+                "content": [{"type": "text", "text": "Unbekanntes Tool: foo"}], "isError": True}})
+
+        async def run():
+            async with mock_client(handler) as client:
+                return await mcp_client.HttpToolSession(client, "http://mcp/mcp").call_tool("foo", {})
+
+        with self.assertRaises(mcp_client.McpToolError) as ctx:
+            asyncio.run(run())
+        self.assertIn("Unbekanntes Tool", str(ctx.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import llm_clients
+import llm_usage
+import ppt_agent
+from data_models import BulletItem, CustomerSlide
+from shared_cache import SharedFileCache
+
+
+def answering(text):
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content=text, usage_metadata=None)
+    llm.ainvoke = AsyncMock(return_value=llm.invoke.return_value)
+    return llm
+
+
+class TestModelRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        memo = patch.object(ppt_agent, "slide_memo", SharedFileCache(self.tmp.name))
+        memo.start()
+        self.addCleanup(memo.stop)
+        usage_log = patch("llm_usage.USAGE_LOG_PATH", os.path.join(self.tmp.name, "llm_usage.jsonl"))
+        usage_log.start()
+        self.addCleanup(usage_log.stop)
+        self.slide = CustomerSlide(title="Vergleich", bullets=[BulletItem(bullet="A gegen B")])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_profile_model_can_be_overridden(self):
+        with patch.dict(os.environ, {"LLM_MODEL_CLASSIFIER": "gemini-2.5-flash"}):
+            self.assertEqual(llm_clients.profile_params("classifier")["model"], "gemini-2.5-flash")
+        self.assertEqual(llm_clients.profile_params("classifier")["max_output_tokens"], 16)
+
+    def test_valid_answer_stays_on_fast_tier(self):
+        clients = {"classifier": answering("'Photorealistic'"), "builder": answering("fine_line")}
+        with patch.object(ppt_agent, "get_llm", side_effect=clients.get) as get_llm:
+            self.assertEqual(ppt_agent.decide_image_style_for_slide(self.slide), "photorealistic")
+        self.assertEqual([c.args[0] for c in get_llm.call_args_list], ["classifier"])
+
+    def test_invalid_answer_escalates_to_stronger_tier(self):
+        clients = {"classifier": answering("Vergleichsfolie"), "builder": answering("Two Content")}
+        with patch.object(ppt_agent, "get_llm", side_effect=clients.get) as get_llm:
+            self.assertEqual(ppt_agent.decide_layout_category(self.slide, 1, 3), "Two Content")
+        self.assertEqual([c.args[0] for c in get_llm.call_args_list], ["classifier", "builder"])
+
+        clients["builder"] = answering("weiss nicht")
+        with patch.object(ppt_agent, "get_llm", side_effect=clients.get):
+            self.assertEqual(ppt_agent.decide_image_style_for_slide(self.slide), "flat_illustration")
+
+    def test_usage_is_aggregated_per_tier(self):
+        fast, strong = answering("x"), answering("y")
+        profiles = {id(fast): "classifier", id(strong): "builder"}
+        with patch.dict(llm_clients._client_profiles, profiles), patch.object(llm_usage, "_write") as write:
+            with llm_usage.usage_job("test") as job:
+                llm_usage.invoke_llm(fast, "a", call="layout")
+                llm_usage.invoke_llm(fast, "b", call="layout")
+                llm_usage.invoke_llm(strong, "c", call="layout")
+
+        self.assertEqual({t: s["calls"] for t, s in job["tiers"].items()}, {"classifier": 2, "builder": 1})
+        self.assertEqual(write.call_args_list[0][0][0]["tier"], "classifier")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from PIL import Image
+from pptx import Presentation
+
+import agent_logic
+import ppt_agent
+from data_models import BulletItem, CustomerSlide, PresentationStructure, SlideText, SlideTextBatch, Source
+from image_library import ImageLibrary
+from shared_cache import SharedFileCache
+
+COLORS = {"primary": "#112233", "secondary": "#445566"}
+
+
+def make_plan():
+    return PresentationStructure(slides=[
+        CustomerSlide(title=f"Folie {i}", bullets=[BulletItem(bullet=f"Punkt {i}", sub=["Detail"])],
+                      sources=[Source(documentId="a.pdf", pageNumber=str(i))], unsplashSearchTerms=[f"topic{i}"])
+        for i in range(1, 4)
+    ])
+
+
+def fake_translation(prompt):
+    """Antwort des Modells: alle Texte in Grossbuchstaben."""
+    batch = SlideTextBatch.model_validate_json(prompt[prompt.index("{\"slides\""):].strip())
+    return SlideTextBatch(slides=[
+        SlideText(title=s.title.upper(), bullets=[BulletItem(bullet=b.bullet.upper(), sub=[x.upper() for x in b.sub])
+                                                  for b in s.bullets])
+        for s in batch.slides
+    ])
+
+
+class TestTranslatePlan(unittest.TestCase):
+
+    @patch("agent_logic.TRANSLATION_BATCH_SLIDES", 2)
+    @patch("agent_logic.get_llm")
+    def test_batches_per_language_keep_language_independent_fields(self, mock_get_llm):
+        structured = mock_get_llm.return_value.with_structured_output.return_value
+        structured.ainvoke = AsyncMock(side_effect=fake_translation)
+
+        with patch("llm_usage.USAGE_LOG_PATH", ""):
+            plans = agent_logic.translate_plan(make_plan(), "Deutsch", ["English", "Deutsch", "Français"])
+
+        self.assertEqual(list(plans), ["English", "Français"])
+        self.assertEqual(structured.ainvoke.call_count, 4)  # 2 Sprachen x 2 Gruppen
+        slide = plans["English"].slides[2]
+        self.assertEqual((slide.title, slide.bullets[0].sub), ("FOLIE 3", ["DETAIL"]))
+        self.assertEqual((slide.sources[0].pageNumber, slide.unsplashSearchTerms), ("3", ["topic3"]))
+
+
+class TestGenerateVariants(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs("storage")
+        for name, value in [("slide_memo", SharedFileCache("memo")), ("image_library", ImageLibrary("library"))]:
+            patcher = patch.object(ppt_agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_variants_reuse_images_and_layouts(self):
+        def fetch(slide_data):
+            path = os.path.join("storage", f"{slide_data.title}.png")
+            Image.new("RGB", (16, 16), (len(slide_data.title) * 20, 0, 0)).save(path)
+            return path
+
+        plan = make_plan()
+        english = PresentationStructure(slides=[s.model_copy(update={"title": f"Slide {i}"})
+                                                for i, s in enumerate(plan.slides, 1)])
+        with patch.object(ppt_agent, "get_image_from_gurkli", side_effect=fetch) as gurkli:
+            paths = ppt_agent.generate_ppt_variants(plan, "Deutsch", {"English": english},
+                                                    image_style="photorealistic", image_colors=COLORS)
+
+        self.assertEqual(gurkli.call_count, 3)
+        self.assertEqual(list(paths), ["Deutsch", "English"])
+        titles = [s.shapes.title.text for s in Presentation(paths["English"]).slides]
+        self.assertEqual(titles, ["Slide 1", "Slide 2", "Slide 3"])
+        base, variant = ppt_agent.load_manifest(paths["Deutsch"]), ppt_agent.load_manifest(paths["English"])
+        self.assertEqual(base["slides"], variant["slides"])
+        self.assertEqual(variant["language"], "English")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+from fpdf import FPDF
+
+from pdf_structure import extract_structured, render_structured
+
+BODY = "Anime has become a global medium with a large audience and many studies. " * 6
+
+
+def make_paper(path):
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=False)
+    sections = ["1. Introduction", "2. Method", "3. Results"]
+    for page, title in enumerate(sections, start=1):
+        pdf.add_page()
+        pdf.set_font("Helvetica", size=8)
+        pdf.cell(0, 5, "Journal of Comparative Cultures, Vol. 12", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", style="B", size=14)
+        pdf.cell(0, 10, title, new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", size=11)
+        pdf.multi_cell(0, 5, BODY)
+        if title == "3. Results":
+            for row in ("Japan 120 45 12%", "Germany 80 30 9%", "France 60 20 7%"):
+                pdf.cell(0, 5, row, new_x="LMARGIN", new_y="NEXT")
+        pdf.set_y(-20)
+        pdf.set_font("Helvetica", size=8)
+        pdf.cell(0, 5, str(page), new_x="LMARGIN", new_y="NEXT")
+
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=8)
+    pdf.cell(0, 5, "Journal of Comparative Cultures, Vol. 12", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", style="B", size=14)
+    pdf.cell(0, 10, "References", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=11)
+    for i in range(8):
+        pdf.cell(0, 5, f"Author{chr(65 + i)}, J. (20{10 + i}) Some title about anime {i}.", new_x="LMARGIN", new_y="NEXT")
+    pdf.output(path)
+
+
+def make_paper_with_grouped_bibliography(path):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", style="B", size=14)
+    pdf.cell(0, 10, "1. Introduction", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=11)
+    pdf.multi_cell(0, 5, BODY)
+    pdf.set_font("Helvetica", style="B", size=14)
+    pdf.cell(0, 10, "Bibliography", new_x="LMARGIN", new_y="NEXT")
+    for group, authors in (("A. Journal articles", "ABC"), ("B. Books", "DE")):
+        pdf.set_font("Helvetica", style="B", size=11)
+        pdf.cell(0, 6, group, new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", size=11)
+        for author in authors:
+            pdf.cell(0, 5, f"Author{author}, J. (2015) Some title about anime.", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", style="B", size=14)
+    pdf.cell(0, 10, "Appendix", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Helvetica", size=11)
+    pdf.multi_cell(0, 5, BODY)
+    pdf.output(path)
+
+
+class TestPdfStructure(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, "paper.pdf")
+        make_paper(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_sections_with_page_spans(self):
+        doc = extract_structured(self.path)
+        titles = [(s["title"], s["page_start"]) for s in doc["sections"]]
+        self.assertEqual(titles, [("1. Introduction", 1), ("2. Method", 2), ("3. Results", 3)])
+        self.assertEqual(doc["pages"], 4)
+
+    def test_headers_page_numbers_and_references_removed(self):
+        doc = extract_structured(self.path)
+        text = render_structured("paper.pdf", doc)
+        self.assertNotIn("Journal of Comparative Cultures", text)
+        self.assertNotIn("AuthorA", text)
+        self.assertEqual(doc["references"]["entries"], 8)
+        self.assertIn("[References ausgelassen: ~8 Einträge, S. 4-4]", text)
+
+    def test_condensed_references_and_tables(self):
+        doc = extract_structured(self.path, references="condense")
+        self.assertEqual(len(doc["references"]["sample"]), 5)
+        results = doc["sections"][-1]["text"]
+        self.assertIn("[Tabelle]\nJapan | 120 | 45 | 12%", results)
+
+    def test_sub_headed_bibliography_is_dropped_as_a_whole(self):
+        path = os.path.join(self.tmp.name, "grouped.pdf")
+        make_paper_with_grouped_bibliography(path)
+        doc = extract_structured(path)
+
+        self.assertEqual([s["title"] for s in doc["sections"]], ["1. Introduction", "Appendix"])
+        self.assertEqual(doc["references"]["entries"], 5)
+        self.assertNotIn("Journal articles", render_structured("grouped.pdf", doc))
+
+
+if __name__ == "__main__":
+    unittest.main()
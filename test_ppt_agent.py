@@ -24,8 +24,9 @@ class TestPptAgent(unittest.TestCase):
             unsplashSearchTerms=[]
         )
 
-    @patch('ppt_agent.llm')
-    def test_decide_layout_for_slide_chooses_correct_layout(self, mock_llm):
+    @patch('ppt_agent.get_llm')
+    def test_decide_layout_for_slide_chooses_correct_layout(self, mock_get_llm):
+        mock_llm = mock_get_llm.return_value
         # Mock the LLM response
         mock_llm.invoke.return_value.content = "Title and Content"
 
@@ -41,8 +42,9 @@ class TestPptAgent(unittest.TestCase):
         # Assert that the correct layout was chosen
         self.assertEqual(layout_index, 1)
 
-    @patch('ppt_agent.llm')
-    def test_decide_layout_for_slide_fallback_mechanism(self, mock_llm):
+    @patch('ppt_agent.get_llm')
+    def test_decide_layout_for_slide_fallback_mechanism(self, mock_get_llm):
+        mock_llm = mock_get_llm.return_value
         # Mock the LLM response to be something that doesn't exist
         mock_llm.invoke.return_value.content = "Non-existent Layout"
 
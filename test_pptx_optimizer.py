@@ -0,0 +1,140 @@
+import os
+import posixpath
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from lxml import etree
+from PIL import Image
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.util import Inches
+
+import ppt_agent
+from data_models import BulletItem, CustomerSlide, PresentationStructure
+from pptx_optimizer import optimize_pptx
+from shared_cache import SharedFileCache
+from test_template_previews import aload_template, answer_layouts, load_template
+
+COLORS = {"primary": "#112233", "secondary": "#445566"}
+TEMPLATE = "Tech Startup Pitch Deck.pptx"
+
+
+def make_plan():
+    return PresentationStructure(slides=[
+        CustomerSlide(title=f"Folie {i}", bullets=[BulletItem(bullet=f"Punkt {i}")]) for i in range(1, 4)
+    ])
+
+
+def picture_targets(path):
+    """Bild-Ziele aller Folien, aufgelöst zu Namen im ZIP, und alle Namen im ZIP."""
+    with zipfile.ZipFile(path) as z:
+        names = z.namelist()
+        targets = [posixpath.normpath(posixpath.join("ppt/slides", rel.get("Target")))
+                   for name in sorted(names) if name.startswith("ppt/slides/_rels/")
+                   for rel in etree.fromstring(z.read(name)) if rel.get("Type") == RT.IMAGE]
+    return targets, names
+
+
+def duplicate_picture_part(path, rels_name):
+    """Gibt der Folie eine byte-gleiche Kopie ihres Bildes (wie bei Bildern aus dem Template)."""
+    with zipfile.ZipFile(path) as z:
+        entries = {name: z.read(name) for name in z.namelist()}
+    rels = etree.fromstring(entries[rels_name])
+    rel = next(r for r in rels if r.get("Type") == RT.IMAGE)
+    entries["ppt/media/kopie.png"] = entries[posixpath.normpath(posixpath.join("ppt/slides", rel.get("Target")))]
+    rel.set("Target", "../media/kopie.png")
+    entries[rels_name] = etree.tostring(rels, xml_declaration=True, encoding="UTF-8", standalone=True)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for name, blob in entries.items():
+            z.writestr(name, blob)
+
+
+class TestOptimizePptx(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "deck.pptx")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_prunes_unused_parts_and_deduplicates_media(self):
+        image_path = os.path.join(self.tmp.name, "bild.png")
+        Image.new("RGB", (64, 64), (200, 30, 30)).save(image_path)
+        prs = ppt_agent._new_presentation(load_template(TEMPLATE)[0])
+        slide = prs.slides.add_slide(prs.slide_layouts[0])
+        slide.shapes.add_picture(image_path, Inches(1), Inches(1))
+        other = prs.slides.add_slide(prs.slide_layouts[0])
+        other.shapes.add_picture(image_path, Inches(1), Inches(1))
+        prs.save(self.path)
+        duplicate_picture_part(self.path, "ppt/slides/_rels/slide2.xml.rels")
+        targets, names = picture_targets(self.path)
+        self.assertEqual(len(set(targets)), 2)
+
+        report = optimize_pptx(self.path)
+
+        self.assertGreater(report["layouts_removed"], 0)
+        self.assertGreater(report["fonts_removed"], 0)
+        self.assertEqual(report["media_deduplicated"], 1)
+        self.assertEqual(report["bytes_saved"], report["bytes_before"] - os.path.getsize(self.path))
+        optimized = Presentation(self.path)
+        self.assertEqual(len(optimized.slides), 2)
+        self.assertEqual(len(optimized.slide_layouts), 1)
+        self.assertEqual(len({shape.image.sha1 for slide in optimized.slides for shape in slide.shapes
+                              if shape.shape_type == 13}), 1)
+        # Beide Bild-Verweise zeigen auf denselben, vorhandenen Media-Part
+        targets, names = picture_targets(self.path)
+        self.assertEqual(len(targets), 2)
+        self.assertEqual(len(set(targets)), 1)
+        self.assertIn(targets[0], names)
+        self.assertFalse(any(n.startswith("ppt/fonts/") for n in names))
+        self.assertEqual(len([n for n in names if n.startswith("ppt/media/")]), 1)
+
+
+class TestOptimizedBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs("storage")
+        for name, value in [("slide_memo", SharedFileCache("memo")), ("_aload_template", aload_template)]:
+            patcher = patch.object(ppt_agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("llm_usage.USAGE_LOG_PATH", "")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    @patch("ppt_agent.get_llm")
+    def test_regenerate_rebuilds_optimized_deck_from_template(self, mock_get_llm):
+        answer_layouts(mock_get_llm, "Title and Content")
+
+        ppt_path = ppt_agent.generate_ppt_with_agent(make_plan(), template_name=TEMPLATE,
+                                                     image_colors=COLORS, optimize=True)
+        self.assertTrue(ppt_agent.load_manifest(ppt_path)["optimized"])
+
+        plan = make_plan()
+        plan.slides[1].title = "Geänderter Titel"
+        answer_layouts(mock_get_llm, "Title Only")
+        ppt_agent.regenerate_slides(ppt_path, [1], plan)
+
+        slides = Presentation(ppt_path).slides
+        self.assertEqual([s.shapes.title.text for s in slides], ["Folie 1", "Geänderter Titel", "Folie 3"])
+        manifest = ppt_agent.load_manifest(ppt_path)
+        self.assertTrue(manifest["optimized"])
+        template_layouts = load_template(TEMPLATE)[1]["layouts"]
+        self.assertEqual([s.slide_layout.name for s in slides],
+                         [template_layouts[d["layout_index"]]["name"] for d in manifest["slides"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
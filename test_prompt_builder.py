@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from prompt_builder import PromptBuilder, count_tokens, truncate_to_tokens
+from llm_usage import invoke_llm, usage_job
+
+
+class TestPromptBuilder(unittest.TestCase):
+
+    def test_count_tokens(self):
+        self.assertEqual(count_tokens(""), 0)
+        self.assertEqual(count_tokens("Hallo Welt."), 4)  # Hall, o, Welt, .
+        self.assertGreater(count_tokens("Präsentation " * 100), count_tokens("Folie " * 100))
+
+    def test_truncate_to_tokens(self):
+        text = "Satz eins. Satz zwei. Satz drei."
+        self.assertEqual(truncate_to_tokens(text, 100), text)
+        cut = truncate_to_tokens(text, 5)
+        self.assertTrue(cut.startswith("Satz eins."))
+        self.assertIn("gekürzt", cut)
+
+    def test_lowest_priority_is_truncated_first_and_required_kept(self):
+        builder = PromptBuilder(budget_tokens=70)
+        builder.add("instructions", "Regeln: kurz bleiben. ", required=True)
+        builder.add("context", "Wichtiger Kontext. " * 10, priority=1, truncatable=True)
+        builder.add("appendix", "Anhang " * 50, priority=0)
+        prompt = builder.build()
+
+        report = builder.report()
+        self.assertTrue(prompt.startswith("Regeln: kurz bleiben."))
+        self.assertEqual(report["appendix"][1], 0)
+        self.assertEqual(report["context"][0], report["context"][1])
+        self.assertLessEqual(count_tokens(prompt), 70)
+
+
+class TestUsageLog(unittest.TestCase):
+
+    def test_calls_and_job_are_logged(self):
+        llm = MagicMock()
+        llm.model = "gemini-test"
+        llm.invoke.return_value = MagicMock(content="ok", usage_metadata={"input_tokens": 12, "output_tokens": 3})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "usage.jsonl")
+            with patch("llm_usage.USAGE_LOG_PATH", log_path):
+                with usage_job("test") as job:
+                    invoke_llm(llm, "Hallo Welt", call="layout")
+                    invoke_llm(llm, "Hallo Welt", call="layout")
+            with open(log_path) as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual([r["type"] for r in records], ["call", "call", "job"])
+        self.assertEqual(records[0]["model"], "gemini-test")
+        self.assertEqual(records[0]["input_tokens"], 12)
+        self.assertEqual(records[0]["job_id"], job["job_id"])
+        self.assertEqual(records[2]["calls"], 2)
+        self.assertEqual(records[2]["output_tokens"], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
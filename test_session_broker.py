@@ -0,0 +1,72 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from session_broker import SqliteSessionBroker
+
+
+class TestSessionBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.broker = SqliteSessionBroker(os.path.join(self.tmp.name, "broker.sqlite"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_messages_are_routed_to_owning_worker(self):
+        self.broker.register("s1", "worker-a")
+        self.broker.register("s2", "worker-b")
+        self.broker.publish("s1", b'{"n": 1}')
+        self.broker.publish("s2", b'{"n": 2}')
+        self.broker.publish("s1", b'{"n": 3}')
+
+        self.assertEqual(self.broker.owner("s1"), "worker-a")
+        self.assertEqual(self.broker.take_messages("worker-a"), [("s1", b'{"n": 1}'), ("s1", b'{"n": 3}')])
+        # Nachrichten werden nur einmal ausgeliefert
+        self.assertEqual(self.broker.take_messages("worker-a"), [])
+        self.assertEqual(self.broker.take_messages("worker-b"), [("s2", b'{"n": 2}')])
+
+    def test_sse_sessions_are_registered_and_fed_by_the_owner(self):
+        import mcp_server
+        from starlette.requests import Request
+
+        scope = {"type": "http", "method": "GET", "path": "/sse", "root_path": "", "query_string": b"",
+                 "headers": [(b"host", b"localhost")]}
+
+        async def run():
+            endpoint_sent = asyncio.Event()
+
+            async def send(message):
+                if b"session_id=" in message.get("body", b""):
+                    endpoint_sent.set()
+
+            async def receive():
+                await endpoint_sent.wait()
+                await asyncio.sleep(0.05)
+                return {"type": "http.disconnect"}
+
+            app = await mcp_server.handle_sse(Request(scope))
+            stream = asyncio.create_task(app(scope, receive, send))
+            await endpoint_sent.wait()
+            session_id = next(iter(mcp_server.local_sessions))
+            owner = self.broker.owner(session_id)
+            accepted = await mcp_server.deliver_locally(
+                session_id, b'{"jsonrpc": "2.0", "method": "notifications/initialized"}')
+            await asyncio.wait_for(stream, 5)
+            return session_id, owner, accepted
+
+        with patch.object(mcp_server, "broker", self.broker), patch.object(mcp_server, "WORKER_ID", "worker-a"):
+            session_id, owner, accepted = asyncio.run(run())
+
+        self.assertEqual(owner, "worker-a")
+        self.assertTrue(accepted)
+        # Nach dem Verbindungsende ist die Session lokal und beim Broker abgemeldet
+        self.assertNotIn(session_id, mcp_server.local_sessions)
+        self.assertIsNone(self.broker.owner(session_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
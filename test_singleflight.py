@@ -0,0 +1,177 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from data_models import BulletItem, CustomerSlide
+from singleflight import SingleFlight, make_key
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_threads_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return "ergebnis"
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(flight.do, "template.pptx", compute) for _ in range(4)]
+            while flight.metrics()["shared"] < 3:
+                threading.Event().wait(0.01)
+            release.set()
+            results = [f.result() for f in futures]
+
+        self.assertEqual(results, ["ergebnis"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.metrics(), {"leaders": 1, "shared": 3, "failed": 0, "cancelled": 0,
+                                            "in_flight": 0})
+
+    def test_error_reaches_waiters_and_releases_key(self):
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+        async def run_both():
+            return await asyncio.gather(flight.ado("k", failing), flight.ado("k", failing),
+                                        return_exceptions=True)
+
+        errors = asyncio.run(run_both())
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+        self.assertEqual(flight.metrics()["failed"], 1)
+        # Kein Negativ-Cache: der nächste Aufruf rechnet neu
+        self.assertEqual(flight.do("k", lambda: "ok"), "ok")
+
+    def test_cancelled_leader_does_not_cancel_waiters(self):
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.1)
+            return "template"
+
+        async def run():
+            leader = asyncio.create_task(flight.ado("k", slow))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(flight.ado("k", slow))
+            await asyncio.sleep(0.01)
+            leader.cancel()  # z.B. MCP Client getrennt
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        self.assertEqual(asyncio.run(run()), "template")
+        self.assertEqual(flight.metrics()["leaders"], 1)
+
+    def test_waiter_takes_over_when_shared_work_is_cancelled(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            if len(calls) == 1:
+                raise asyncio.CancelledError()
+            return "neu gerechnet"
+
+        async def run():
+            return await asyncio.gather(flight.ado("k", work), flight.ado("k", work), return_exceptions=True)
+
+        first, second = asyncio.run(run())
+        self.assertIsInstance(first, asyncio.CancelledError)
+        self.assertEqual(second, "neu gerechnet")
+        self.assertEqual((len(calls), flight.metrics()["cancelled"]), (2, 1))
+
+    def test_thread_waits_for_leader_in_event_loop(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.1)
+            return 42
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            leader = pool.submit(asyncio.run, flight.ado("k", slow))
+            started.wait(5)
+            self.assertEqual(flight.do("k", lambda: 0), 42)
+            self.assertEqual(leader.result(), 42)
+
+    def test_make_key_ignores_dict_order(self):
+        self.assertEqual(make_key("analyze_template", {"a": 1, "b": 2}),
+                         make_key("analyze_template", {"b": 2, "a": 1}))
+
+
+class TestCoalescedImageRequests(unittest.TestCase):
+
+    def test_identical_payloads_share_one_request_but_not_the_file(self):
+        import image_providers
+
+        release = threading.Event()
+
+        def post(*args, **kwargs):
+            release.wait(5)
+            return MagicMock(status_code=200, json=lambda: {"url": "https://img/1.jpg"})
+
+        slide = CustomerSlide(title="Bild", bullets=[BulletItem(bullet="Punkt")], ImageKeywords=["robot arm"])
+        shared_before = image_providers.gurkli_flight.metrics()["shared"]
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(image_providers, "IMAGE_DIR", tmp), \
+                patch("image_providers.requests") as requests_mock, \
+                ThreadPoolExecutor(max_workers=2) as pool:
+            requests_mock.post.side_effect = post
+            requests_mock.get.return_value = MagicMock(status_code=200, content=b"jpeg")
+            futures = [pool.submit(image_providers.get_image_from_gurkli, slide.model_copy()) for _ in range(2)]
+            while image_providers.gurkli_flight.metrics()["shared"] < shared_before + 1:
+                threading.Event().wait(0.01)
+            release.set()
+            paths = [f.result() for f in futures]
+
+            # Jeder Aufrufer bekommt eine eigene Datei - die Bild-Bibliothek darf sie verschieben
+            self.assertNotEqual(paths[0], paths[1])
+            for path in paths:
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), b"jpeg")
+        self.assertEqual(requests_mock.post.call_count, 1)
+
+
+class TestCoalescedLayoutDecisions(unittest.TestCase):
+
+    def test_identical_slides_cost_one_llm_call(self):
+        import ppt_agent
+
+        release = threading.Event()
+
+        async def classify(prompt, call, options):
+            release.wait(5)
+            return "Title and Content"
+
+        shared_before = ppt_agent.decision_flight.metrics()["shared"]
+        slide = CustomerSlide(title="Gleiche Folie", bullets=[BulletItem(bullet="Punkt", sub=[])],
+                              unsplashSearchTerms=[], sources=[])
+        with patch.object(ppt_agent.slide_memo, "get", return_value=None), \
+                patch.object(ppt_agent.slide_memo, "set"), \
+                patch("ppt_agent.aclassify_with_llm", side_effect=classify) as mock_classify, \
+                ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(ppt_agent.decide_layout_category, slide.model_copy(), 1, 5) for _ in range(3)]
+            while ppt_agent.decision_flight.metrics()["shared"] < shared_before + 2:
+                threading.Event().wait(0.01)
+            release.set()
+            categories = [f.result() for f in futures]
+
+        self.assertEqual(categories, ["Title and Content"] * 3)
+        self.assertEqual(mock_classify.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from PIL import Image
+from pptx import Presentation
+
+import ppt_agent
+from build_control import BuildCancelled, CancelToken
+from data_models import PresentationStructure, CustomerSlide, BulletItem
+from shared_cache import SharedFileCache
+
+COLORS = {"primary": "#112233", "secondary": "#445566"}
+
+
+def make_plan():
+    return PresentationStructure(slides=[
+        CustomerSlide(title=f"Folie {i}", bullets=[BulletItem(bullet=f"Punkt {i}")]) for i in range(1, 4)
+    ])
+
+
+class TestSlideRegeneration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs("storage")
+        memo = patch.object(ppt_agent, "slide_memo", SharedFileCache(os.path.join(self.tmp.name, "memo")))
+        memo.start()
+        self.addCleanup(memo.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_unchanged_slide_decisions_are_memoized(self):
+        analysis = {"template_name": "t.pptx", "layouts": []}
+        slide = make_plan().slides[1]
+        with patch.object(ppt_agent, "decide_layout_for_slide", return_value=3) as decide_layout:
+            first = ppt_agent.decide_slide(analysis, slide, 1, 3, "auto", "auto", COLORS, template_name="t.pptx")
+            second = ppt_agent.decide_slide(analysis, slide, 1, 3, "auto", "auto", COLORS, template_name="t.pptx")
+            slide.title = "Neuer Titel"
+            ppt_agent.decide_slide(analysis, slide, 1, 3, "auto", "auto", COLORS, template_name="t.pptx")
+
+        self.assertEqual(first, second)
+        self.assertEqual(decide_layout.call_count, 2)
+
+    def test_regenerate_replaces_only_selected_slide(self):
+        ppt_path = ppt_agent.generate_ppt_with_agent(make_plan(), image_colors=COLORS)
+        self.assertTrue(os.path.exists(ppt_agent.manifest_path_for(ppt_path)))
+
+        plan = make_plan()
+        plan.slides[1].title = "Geänderter Titel"
+        ppt_agent.regenerate_slides(ppt_path, [1], plan)
+
+        titles = [s.shapes.title.text for s in Presentation(ppt_path).slides]
+        self.assertEqual(titles, ["Folie 1", "Geänderter Titel", "Folie 3"])
+        self.assertEqual(ppt_agent.load_manifest(ppt_path)["plan"]["slides"][1]["title"], "Geänderter Titel")
+
+    def test_generations_in_same_language_do_not_share_a_file(self):
+        first_path = ppt_agent.generate_ppt_with_agent(make_plan(), image_colors=COLORS)
+        other_plan = make_plan()
+        other_plan.slides[0].title = "Andere Session"
+        second_path = ppt_agent.generate_ppt_with_agent(other_plan, image_colors=COLORS)
+        self.assertNotEqual(os.path.dirname(first_path), os.path.dirname(second_path))
+
+        plan = make_plan()
+        plan.slides[2].title = "Nur im ersten Deck"
+        ppt_agent.regenerate_slides(first_path, [2], plan)
+
+        first_titles = [s.shapes.title.text for s in Presentation(first_path).slides]
+        second_titles = [s.shapes.title.text for s in Presentation(second_path).slides]
+        self.assertEqual(first_titles, ["Folie 1", "Folie 2", "Nur im ersten Deck"])
+        self.assertEqual(second_titles, ["Andere Session", "Folie 2", "Folie 3"])
+        self.assertEqual(ppt_agent.load_manifest(second_path)["plan"]["slides"][2]["title"], "Folie 3")
+
+    def test_images_are_prefetched_in_parallel(self):
+        plan = make_plan()
+        for slide in plan.slides:
+            slide.unsplashSearchTerms = ["anime"]
+        threads = set()
+
+        def slow_image(slide_data):
+            threads.add(threading.current_thread().name)
+            time.sleep(0.3)
+            path = os.path.join("storage", f"{slide_data.title}.png")
+            Image.new("RGB", (8, 8)).save(path)
+            return path
+
+        start = time.perf_counter()
+        with patch.object(ppt_agent, "get_image_from_gurkli", side_effect=slow_image):
+            ppt_path = ppt_agent.generate_ppt_with_agent(plan, image_style="photorealistic", image_colors=COLORS)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.8)
+        self.assertTrue(all(name.startswith("image-prefetch") for name in threads))
+        pictures = [s for slide in Presentation(ppt_path).slides for s in slide.shapes if s.shape_type == 13]
+        self.assertEqual(len(pictures), 3)
+
+    def test_stream_pipeline_overlaps_planning_and_images(self):
+        def slide_stream():
+            for slide in make_plan().slides:
+                time.sleep(0.2)  # Plan-Stream liefert langsam
+                slide.unsplashSearchTerms = ["anime"]
+                yield slide
+
+        def slow_image(slide_data):
+            time.sleep(0.3)
+            path = os.path.join("storage", f"{slide_data.title}.png")
+            Image.new("RGB", (8, 8)).save(path)
+            return path
+
+        start = time.perf_counter()
+        with patch.object(ppt_agent, "get_image_from_gurkli", side_effect=slow_image):
+            ppt_path = ppt_agent.generate_ppt_from_stream(
+                slide_stream(), image_style="photorealistic", image_colors=COLORS, expected_slides=3)
+        elapsed = time.perf_counter() - start
+
+        # Seriell wären es 0.6 s Plan + 0.9 s Bilder
+        self.assertLess(elapsed, 1.2)
+        titles = [s.shapes.title.text for s in Presentation(ppt_path).slides]
+        self.assertEqual(titles, ["Folie 1", "Folie 2", "Folie 3"])
+
+    def test_progress_and_cancellation_via_token(self):
+        events = []
+        token = CancelToken()
+
+        def progress(stage, done, total, message):
+            events.append((stage, done, total))
+            if stage == "slides" and done == 2:
+                token.cancel()
+
+        with self.assertRaises(BuildCancelled):
+            ppt_agent.generate_ppt_with_agent(make_plan(), image_colors=COLORS, cancel_token=token, progress=progress)
+        self.assertEqual(events, [("slides", 1, 3), ("slides", 2, 3)])
+
+        events.clear()
+        ppt_agent.generate_ppt_with_agent(make_plan(), image_colors=COLORS, progress=progress)
+        self.assertEqual(events[-1][0], "saved")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from PIL import Image
+from pptx import Presentation
+
+import ppt_agent
+from data_models import BulletItem, CustomerSlide, PresentationStructure, Source
+from image_library import ImageLibrary
+from mcp_server import analyze_template_file
+from shared_cache import SharedFileCache
+
+COLORS = {"primary": "#112233", "secondary": "#445566"}
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ppt_templates")
+TEMPLATES = ["Modern Corporate Presentation.pptx", "Tech Startup Pitch Deck.pptx"]
+MCP_ALOAD_TEMPLATE = ppt_agent._aload_template
+
+
+def make_plan():
+    return PresentationStructure(slides=[
+        CustomerSlide(title=f"Folie {i}", bullets=[BulletItem(bullet=f"Punkt {i}", sub=[])],
+                      sources=[Source(documentId="a.pdf", pageNumber=str(i))], unsplashSearchTerms=[f"topic{i}"])
+        for i in range(1, 4)
+    ])
+
+
+def load_template(name):
+    path = os.path.join(TEMPLATE_DIR, name)
+    with open(path, "rb") as f:
+        return BytesIO(f.read()), analyze_template_file(path, name)
+
+
+async def aload_template(name):
+    return load_template(name)
+
+
+def answer_layouts(mock_get_llm, category):
+    response = MagicMock(content=category, usage_metadata=None)
+    mock_get_llm.return_value.invoke.return_value = response
+    mock_get_llm.return_value.ainvoke = AsyncMock(return_value=response)
+    return mock_get_llm.return_value
+
+
+class TestTemplatePreviews(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs("storage")
+        for name, value in [("slide_memo", SharedFileCache("memo")), ("image_library", ImageLibrary("library")),
+                            ("_aload_template", aload_template)]:
+            patcher = patch.object(ppt_agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("llm_usage.USAGE_LOG_PATH", "")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def fetch(self, slide_data):
+        path = os.path.join("storage", f"{slide_data.title}.png")
+        Image.new("RGB", (16, 16), (len(slide_data.title) * 20, 0, 0)).save(path)
+        return path
+
+    @patch("ppt_agent.get_llm")
+    def test_images_and_layout_types_are_decided_once_for_all_templates(self, mock_get_llm):
+        llm = answer_layouts(mock_get_llm, "Title and Content")
+
+        with patch.object(ppt_agent, "get_image_from_gurkli", side_effect=self.fetch) as gurkli:
+            paths = ppt_agent.generate_template_previews(make_plan(), TEMPLATES, image_style="photorealistic",
+                                                         image_colors=COLORS, output_dir="previews")
+
+        self.assertEqual(list(paths), TEMPLATES)
+        self.assertEqual(gurkli.call_count, 3)
+        self.assertEqual(llm.ainvoke.call_count, 3)  # ein Layout-Typ pro Slide, alle in einem Event-Loop
+        for name, path in paths.items():
+            self.assertEqual(len(Presentation(path).slides), 3)
+            self.assertEqual(ppt_agent.load_manifest(path)["template_name"], name)
+        first, second = (ppt_agent.load_manifest(p)["slides"] for p in paths.values())
+        self.assertEqual([d["image_path"] for d in first], [d["image_path"] for d in second])
+
+    @patch("ppt_agent.get_llm")
+    def test_chosen_preview_builds_without_llm_or_image_calls(self, mock_get_llm):
+        llm = answer_layouts(mock_get_llm, "Title and Content")
+        plan = make_plan()
+
+        with patch.object(ppt_agent, "get_image_from_gurkli", side_effect=self.fetch) as gurkli:
+            ppt_agent.generate_template_previews(plan, TEMPLATES, image_style="photorealistic",
+                                                 image_colors=COLORS, output_dir="previews")
+            llm.ainvoke.reset_mock()
+            gurkli.reset_mock()
+            ppt_agent.generate_ppt_with_agent(plan, template_name=TEMPLATES[1], image_style="photorealistic",
+                                              image_colors=COLORS, output_path=os.path.join("storage", "final.pptx"))
+
+        self.assertEqual(gurkli.call_count, 0)
+        self.assertEqual((llm.invoke.call_count, llm.ainvoke.call_count), (0, 0))
+
+    @patch("ppt_agent.get_llm")
+    def test_color_choice_and_deck_share_one_template_analysis(self, mock_get_llm):
+        answer_layouts(mock_get_llm, "Title and Content")
+        template_file, analysis = load_template(TEMPLATES[0])
+
+        with patch.object(ppt_agent, "_aload_template", MCP_ALOAD_TEMPLATE), \
+                patch.object(ppt_agent, "analyze_template_via_mcp", AsyncMock(return_value=analysis)) as analyze, \
+                patch.object(ppt_agent, "get_template_file_from_mcp", AsyncMock(return_value=template_file)), \
+                patch.object(ppt_agent, "decide_colors_for_presentation", return_value=COLORS) as decide_colors, \
+                patch.object(ppt_agent, "get_image_from_gurkli", side_effect=self.fetch):
+            ppt_path = ppt_agent.generate_ppt_with_agent(make_plan(), template_name=TEMPLATES[0],
+                                                         image_style="photorealistic")
+
+        self.assertEqual(analyze.await_count, 1)
+        self.assertIs(decide_colors.call_args.args[1], analysis)
+        self.assertEqual(len(Presentation(ppt_path).slides), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
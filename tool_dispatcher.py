@@ -0,0 +1,125 @@
+"""
+Dispatcher für MCP Tool-Aufrufe.
+
+Blockierende Tool-Arbeit darf nicht im Event Loop laufen, sonst stehen alle
+SSE-Streams still, solange ein grosses PDF geparst wird. Der Dispatcher
+klassifiziert jedes Tool als CPU-lastig (Prozess-Pool, umgeht das GIL) oder
+I/O-lastig (Thread-Pool), begrenzt die Parallelität pro Tool und führt Buch
+über Warteschlangen, damit /metrics die Auslastung zeigen kann.
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+@dataclass
+class ToolPolicy:
+    kind: str = "io"  # "cpu" -> Prozess-Pool, "io" -> Thread-Pool
+    max_concurrency: int = 8
+
+
+def parse_tool_limits(spec):
+    """Parst "tool=n,tool2=m" zu {"tool": n, "tool2": m}."""
+    limits = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class _ToolStats:
+    def __init__(self):
+        self.running = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+
+class ToolDispatcher:
+    def __init__(self, policies, cpu_workers=2, io_workers=16, limit_overrides=None, default_policy=None):
+        self.policies = dict(policies)
+        for name, limit in (limit_overrides or {}).items():
+            policy = self.policies.get(name, ToolPolicy())
+            self.policies[name] = ToolPolicy(kind=policy.kind, max_concurrency=limit)
+        self.default_policy = default_policy or ToolPolicy()
+        self.cpu_workers = cpu_workers
+        self.io_workers = io_workers
+        self._process_pool = None
+        self._thread_pool = None
+        self._semaphores = {}
+        self._stats = {}
+
+    def _policy(self, name):
+        return self.policies.get(name, self.default_policy)
+
+    def _executor(self, kind):
+        # Pools werden erst beim ersten Aufruf erzeugt - Importe (Benchmarks, Tests) bleiben billig
+        if kind == "cpu":
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.cpu_workers)
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="mcp-io")
+        return self._thread_pool
+
+    async def run(self, name, fn, *args):
+        """Führt fn(*args) im passenden Executor aus, sobald das Tool-Limit es erlaubt."""
+        policy = self._policy(name)
+        semaphore = self._semaphores.setdefault(name, asyncio.Semaphore(policy.max_concurrency))
+        stats = self._stats.setdefault(name, _ToolStats())
+
+        queued_at = time.perf_counter()
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        async with semaphore:
+            stats.waiting -= 1
+            stats.running += 1
+            started_at = time.perf_counter()
+            stats.total_wait += started_at - queued_at
+            try:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._executor(policy.kind), fn, *args)
+                stats.completed += 1
+                return result
+            except Exception:
+                stats.failed += 1
+                raise
+            finally:
+                stats.running -= 1
+                stats.total_run += time.perf_counter() - started_at
+
+    def snapshot(self):
+        """Queue-Tiefe und Laufzeiten pro Tool für /metrics."""
+        tools = {}
+        for name, stats in sorted(self._stats.items()):
+            policy = self._policy(name)
+            finished = stats.completed + stats.failed
+            tools[name] = {
+                "kind": policy.kind,
+                "limit": policy.max_concurrency,
+                "running": stats.running,
+                "queued": stats.waiting,
+                "max_queued": stats.max_waiting,
+                "completed": stats.completed,
+                "failed": stats.failed,
+                "avg_wait_ms": round(stats.total_wait / finished * 1000, 1) if finished else 0.0,
+                "avg_run_ms": round(stats.total_run / finished * 1000, 1) if finished else 0.0,
+            }
+        return tools
+
+    def reset_peaks(self):
+        for stats in self._stats.values():
+            stats.max_waiting = stats.waiting
+
+    def shutdown(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None